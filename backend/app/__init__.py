@@ -1,8 +1,10 @@
-from flask import Flask, request
+from flask import Flask, Response, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 from flask_migrate import Migrate
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
 from flasgger import Swagger
 from app.config import Config
 
@@ -10,6 +12,7 @@ db = SQLAlchemy()
 jwt = JWTManager()
 socketio = SocketIO(cors_allowed_origins="*")
 migrate = Migrate()
+limiter = Limiter(key_func=get_remote_address)
 
 def create_app():
     app = Flask(__name__, template_folder='templates')
@@ -18,8 +21,18 @@ def create_app():
     # Initialisation des extensions
     db.init_app(app)
     jwt.init_app(app)
-    socketio.init_app(app, async_mode='eventlet', cors_allowed_origins="*")
+    from app.services.compact_events import SCHEMA_VERSION, compact_events, socketio_serializer
+    serializer = socketio_serializer(app)
+    socketio.init_app(
+        app,
+        async_mode='eventlet',
+        cors_allowed_origins="*",
+        message_queue=app.config["SOCKETIO_MESSAGE_QUEUE"],
+        channel=app.config["SOCKETIO_CHANNEL"],
+        serializer=serializer
+    )
     migrate.init_app(app, db)
+    limiter.init_app(app)
 
     # Configuration de Flasgger avec support Bearer Token
     app.config['SWAGGER'] = {
@@ -53,55 +66,90 @@ def create_app():
     app.register_blueprint(streaming_bp, url_prefix='/sessions')
     app.register_blueprint(quiz_bp, url_prefix='/sessions')
 
-    # Enregistrement des événements WebSocket
-    with app.app_context():
-        from app.models.session import Session
-        from flask_jwt_extended import decode_token
-        from flask_socketio import join_room, emit
-        from datetime import datetime
+    from app.services.redis_pool import redis_pool
+    from app.services.active_sessions import active_sessions
+    from app.services.broadcast import broadcast
+    from app.services.chat_limiter import chat_limiter
+    from app.services.device_pairing import device_pairing
+    from app.services.hand_queue import hand_queue
+    from app.services.hls_edge import hls_edge
+    from app.services.identity_cache import identity_cache
+    from app.services.media_server import media_server
+    from app.services.metrics import metrics
+    from app.services.passwords import passwords
+    from app.services.presence import presence
+    from app.services.quiz_tally import quiz_tally
+    from app.services.session_cache import session_cache
+    from app.services.session_journal import session_journal
+    from app.services.signaling import signaling
+    from app.services.socket_auth import socket_auth
+    from app.services.stream_state import stream_state
+    from app.services.token_blocklist import token_blocklist
+    from app.services.write_behind import comment_buffer, quiz_response_buffer
+    # Le pool Redis est partagé par les services suivants : il est initialisé en premier
+    redis_pool.init_app(app)
+    # Avant l'enregistrement des gestionnaires Socket.IO, qu'il enveloppe
+    metrics.init_app(app, socketio)
+    active_sessions.init_app(app)
+    broadcast.init_app(app)
+    chat_limiter.init_app(app)
+    compact_events.init_app(app)
+    device_pairing.init_app(app)
+    hand_queue.init_app(app)
+    hls_edge.init_app(app)
+    identity_cache.init_app(app)
+    media_server.init_app(app)
+    passwords.init_app(app)
+    presence.init_app(app)
+    quiz_tally.init_app(app)
+    session_cache.init_app(app)
+    session_journal.init_app(app)
+    signaling.init_app(app)
+    socket_auth.init_app(app)
+    stream_state.init_app(app)
+    token_blocklist.init_app(app)
+    comment_buffer.init_app(app)
+    quiz_response_buffer.init_app(app)
 
-        @socketio.on("connect")
-        def handle_connect(auth):
-            if not auth or 'token' not in auth:
-                raise ConnectionRefusedError("Missing token")
-            token = auth['token']
-            if token.startswith("Bearer "):
-                token = token[7:]
-            try:
-                decode_token(token)
-                # Stocker le token dans l'environnement de la session Socket.IO
-                socketio.server.environ[request.sid] = {'token': token}
-            except Exception as e:
-                raise ConnectionRefusedError("Invalid token")
+    @app.route("/health", methods=["GET"])
+    def health():
+        """État des dépendances pour les sondes du répartiteur de charge (503 si Redis est injoignable)."""
+        redis_ok, redis_details = redis_pool.health()
+        return jsonify({"status": "ok" if redis_ok else "degraded", "redis": redis_details}), 200 if redis_ok else 503
 
-        @socketio.on("join_session")
-        def handle_join_session(data):
-            session_id = data.get("session_id")
-            if not session_id:
-                raise ConnectionRefusedError("Missing session_id")
-            # Récupérer le token depuis l'environnement Socket.IO
-            environ = socketio.server.environ.get(request.sid, {})
-            token = environ.get('token')
-            if not token:
-                raise ConnectionRefusedError("Missing token")
-            try:
-                decode_token(token)
-                join_room(str(session_id))
-                session_obj = Session.query.get(session_id)
-                if session_obj and session_obj.stream_url:
-                    emit("session_joined", {"stream_url": session_obj.stream_url}, to=str(session_id))
-            except Exception as e:
-                raise ConnectionRefusedError("Invalid token")
+    @app.route("/socket-config", methods=["GET"])
+    def socket_config():
+        """Négociation côté client : sérialiseur des paquets et schémas d'événements proposés."""
+        schemas = ["full", "compact"] if compact_events.enabled else ["full"]
+        return jsonify({
+            "serializer": "msgpack" if serializer == "msgpack" else "json",
+            "schemas": schemas,
+            "compact_version": SCHEMA_VERSION
+        }), 200
 
-        @socketio.on("post_comment")
-        def handle_comment(data):
-            session_id = data.get("session_id")
-            content = data.get("content")
-            if session_id and content:
-                emit("new_comment", {
-                    "user_name": "Utilisateur",  # À remplacer par le nom réel
-                    "content": content,
-                    "created_at": datetime.utcnow().isoformat()
-                }, room=str(session_id))
+    @app.context_processor
+    def socketio_client():
+        # Le client msgpack de Socket.IO embarque le décodeur assorti au sérialiseur du serveur
+        build = "socket.io.msgpack.min.js" if serializer == "msgpack" else "socket.io.min.js"
+        return {"socketio_client_url": f"https://cdn.socket.io/4.5.0/{build}"}
 
-    return app
\ No newline at end of file
+    metrics.gauge("socketio_connected_clients", lambda: len(socketio.server.environ), "Connexions Socket.IO de ce worker")
+    metrics.gauge("socketio_authenticated_clients", lambda: socket_auth.stats()["connections"], "Connexions authentifiées")
+    metrics.gauge("presence_viewers", lambda: presence.stats()["connections"], "Spectateurs présents (connexions locales)")
+    metrics.gauge("broadcast_pending_rooms", lambda: broadcast.stats()["pending_rooms"], "Salles avec des événements en attente")
+    metrics.gauge("write_behind_pending_rows", lambda: comment_buffer.pending + quiz_response_buffer.pending,
+                  "Lignes en attente d'écriture en base")
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        """Métriques au format texte de Prometheus (404 si `METRICS_ENABLED=0`)."""
+        if not metrics.enabled:
+            return jsonify({"message": "Métriques désactivées"}), 404
+        if metrics.token and request.headers.get("Authorization") != f"Bearer {metrics.token}":
+            return jsonify({"message": "Jeton de métriques invalide"}), 401
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    # Enregistrement des événements WebSocket, après `metrics.init_app` qui enveloppe `socketio.on`
+    from app.sockets import events  # noqa: F401
+
+    return app
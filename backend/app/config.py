@@ -8,4 +8,135 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-    REDIS_URL = os.getenv("REDIS_URL")
\ No newline at end of file
+    # Durées de validité en secondes : jeton d'accès court, rafraîchi sans mot de passe par /auth/refresh
+    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 900))
+    JWT_REFRESH_TOKEN_EXPIRES = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES", 30 * 86400))
+    REDIS_URL = os.getenv("REDIS_URL")
+
+    # Pool Redis partagé par tous les services (sans REDIS_URL, un client en mémoire est utilisé)
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+    REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+    STREAM_STATE_TTL = int(os.getenv("STREAM_STATE_TTL", 3600))
+
+    # Mode multi-nœuds : les workers Socket.IO relaient leurs émissions via Redis (pub/sub)
+    SOCKETIO_MULTI_NODE = os.getenv("SOCKETIO_MULTI_NODE", "0") == "1"
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", REDIS_URL if SOCKETIO_MULTI_NODE else None)
+    SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "flask-socketio")
+
+    # Paquets Socket.IO en "json" ou "msgpack" (dépendance optionnelle, tous les clients doivent suivre)
+    # et schéma d'événements compact proposé aux clients qui le demandent à la connexion
+    SOCKETIO_SERIALIZER = os.getenv("SOCKETIO_SERIALIZER", "json")
+    SOCKETIO_COMPACT_SCHEMA = os.getenv("SOCKETIO_COMPACT_SCHEMA", "1") == "1"
+
+    # Écriture différée des commentaires postés via Socket.IO
+    COMMENT_FLUSH_INTERVAL_MS = int(os.getenv("COMMENT_FLUSH_INTERVAL_MS", 200))
+    COMMENT_FLUSH_BATCH_SIZE = int(os.getenv("COMMENT_FLUSH_BATCH_SIZE", 500))
+    COMMENT_QUEUE_MAXSIZE = int(os.getenv("COMMENT_QUEUE_MAXSIZE", 10000))
+
+    # Écriture différée des réponses aux quiz (pics de réponses simultanées)
+    QUIZ_RESPONSE_FLUSH_INTERVAL_MS = int(os.getenv("QUIZ_RESPONSE_FLUSH_INTERVAL_MS", 200))
+    QUIZ_RESPONSE_FLUSH_BATCH_SIZE = int(os.getenv("QUIZ_RESPONSE_FLUSH_BATCH_SIZE", 1000))
+    QUIZ_RESPONSE_QUEUE_MAXSIZE = int(os.getenv("QUIZ_RESPONSE_QUEUE_MAXSIZE", 20000))
+
+    # Cache de l'état des sessions (statut, professeur) : "memory" ou "redis"
+    SESSION_CACHE_BACKEND = os.getenv("SESSION_CACHE_BACKEND", "memory")
+    SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", 30))
+    SESSION_CACHE_LOCAL_TTL = int(os.getenv("SESSION_CACHE_LOCAL_TTL", 2))
+
+    # Nombre maximal d'identités (nom, rôle) gardées en mémoire pour les diffusions
+    IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+
+    # Liste des sessions actives interrogée en boucle par les téléviseurs HbbTV
+    ACTIVE_SESSIONS_SNAPSHOT_TTL = int(os.getenv("ACTIVE_SESSIONS_SNAPSHOT_TTL", 10))
+    ACTIVE_SESSIONS_MAX_AGE = int(os.getenv("ACTIVE_SESSIONS_MAX_AGE", 5))
+
+    # Pagination par curseur de l'historique des commentaires
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", 100))
+    COMMENTS_PAGE_MAX = int(os.getenv("COMMENTS_PAGE_MAX", 500))
+
+    # Agrégation des réponses aux quiz : "memory" ou "redis", instantanés envoyés au professeur
+    QUIZ_TALLY_BACKEND = os.getenv("QUIZ_TALLY_BACKEND", "memory")
+    QUIZ_SNAPSHOT_INTERVAL_MS = int(os.getenv("QUIZ_SNAPSHOT_INTERVAL_MS", 250))
+
+    # File des mains levées : "memory" ou "redis" ; la table hand_requests est alimentée en différé
+    HAND_QUEUE_BACKEND = os.getenv("HAND_QUEUE_BACKEND", "memory")
+    HAND_AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("HAND_AUDIT_FLUSH_INTERVAL_MS", 500))
+    HAND_AUDIT_FLUSH_BATCH_SIZE = int(os.getenv("HAND_AUDIT_FLUSH_BATCH_SIZE", 200))
+    HAND_AUDIT_QUEUE_MAXSIZE = int(os.getenv("HAND_AUDIT_QUEUE_MAXSIZE", 10000))
+
+    # Principal Socket.IO établi à la connexion : prévenir le client N secondes avant l'expiration du jeton
+    SOCKET_AUTH_REFRESH_MARGIN = int(os.getenv("SOCKET_AUTH_REFRESH_MARGIN", 60))
+
+    # Présence des spectateurs par session : "memory" ou "redis" (partagée entre les workers)
+    PRESENCE_BACKEND = os.getenv("PRESENCE_BACKEND", "memory")
+    PRESENCE_UPDATE_INTERVAL_MS = int(os.getenv("PRESENCE_UPDATE_INTERVAL_MS", 1000))
+    PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv("PRESENCE_HEARTBEAT_INTERVAL", 15))
+    PRESENCE_TIMEOUT = int(os.getenv("PRESENCE_TIMEOUT", 45))
+    PRESENCE_MEMBERS_LIMIT = int(os.getenv("PRESENCE_MEMBERS_LIMIT", 500))
+
+    # Regroupement des diffusions par salle : intervalle en ms (0 = envoi immédiat) et taille maximale d'un lot
+    BROADCAST_TICK_MS = int(os.getenv("BROADCAST_TICK_MS", 100))
+    BROADCAST_MAX_BATCH = int(os.getenv("BROADCAST_MAX_BATCH", 200))
+
+    # Signalisation WebRTC : nombre maximal de candidats ICE par message groupé
+    SIGNALING_MAX_CANDIDATES = int(os.getenv("SIGNALING_MAX_CANDIDATES", 50))
+
+    # Hachage des mots de passe : coût bcrypt et pool de threads (eventlet.tpool) hors de la boucle.
+    # bcrypt est lié au processeur : plus de threads que de cœurs n'accélère rien et prive la
+    # boucle eventlet de temps processeur
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_OFFLOAD = os.getenv("PASSWORD_HASH_OFFLOAD", "1") == "1"
+    PASSWORD_HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS", os.cpu_count() or 1))
+
+    # Appairage des téléviseurs par code (durée de vie du code, intervalle d'interrogation, validité du jeton de rafraîchissement)
+    DEVICE_CODE_TTL = int(os.getenv("DEVICE_CODE_TTL", 600))
+    DEVICE_POLL_INTERVAL = int(os.getenv("DEVICE_POLL_INTERVAL", 5))
+    DEVICE_REFRESH_TOKEN_EXPIRES = int(os.getenv("DEVICE_REFRESH_TOKEN_EXPIRES", 86400))
+
+    # Journal des événements de session pour la relecture (répertoire relatif au dossier instance/)
+    JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "1") == "1"
+    JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+    JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", 1 << 20))
+    JOURNAL_INDEX_INTERVAL_MS = int(os.getenv("JOURNAL_INDEX_INTERVAL_MS", 5000))
+    # Écritures groupées hors de `broadcast.emit` : intervalle de vidage et taille maximale de la file
+    JOURNAL_FLUSH_INTERVAL_MS = int(os.getenv("JOURNAL_FLUSH_INTERVAL_MS", 200))
+    JOURNAL_QUEUE_MAXSIZE = int(os.getenv("JOURNAL_QUEUE_MAXSIZE", 10000))
+    JOURNAL_PAGE_SIZE = int(os.getenv("JOURNAL_PAGE_SIZE", 500))
+    JOURNAL_PAGE_MAX = int(os.getenv("JOURNAL_PAGE_MAX", 5000))
+
+    # Métriques Prometheus sur /metrics (jeton Bearer exigé si METRICS_TOKEN est défini)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Limitation du chat : seau de jetons par utilisateur, budget global par session et mode lent automatique
+    CHAT_LIMIT_BACKEND = os.getenv("CHAT_LIMIT_BACKEND", "memory")
+    CHAT_USER_BURST = int(os.getenv("CHAT_USER_BURST", 5))
+    CHAT_USER_RATE = float(os.getenv("CHAT_USER_RATE", 1.0))
+    CHAT_SESSION_BUDGET = int(os.getenv("CHAT_SESSION_BUDGET", 50))
+    CHAT_SLOW_MODE_THRESHOLD = int(os.getenv("CHAT_SLOW_MODE_THRESHOLD", 30))
+    CHAT_SLOW_MODE_INTERVAL = int(os.getenv("CHAT_SLOW_MODE_INTERVAL", 10))
+    CHAT_SLOW_MODE_DURATION = int(os.getenv("CHAT_SLOW_MODE_DURATION", 60))
+
+    # Flask-Limiter (routes HTTP) : compteurs partagés dans Redis en production
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "moving-window")
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+    COMMENT_RATE_LIMIT = os.getenv("COMMENT_RATE_LIMIT", "20 per minute")
+
+    # Origine HLS (SRS) et relais des playlists : une requête à l'origine par intervalle de segment
+    HLS_ORIGIN_URL = os.getenv("HLS_ORIGIN_URL", "http://localhost:8080/hls").rstrip("/")
+    HLS_EDGE_ENABLED = os.getenv("HLS_EDGE_ENABLED", "0") == "1"
+    HLS_CDN_PREFIX = os.getenv("HLS_CDN_PREFIX")
+    HLS_PLAYLIST_TTL = float(os.getenv("HLS_PLAYLIST_TTL", 0))  # 0 : durée cible lue dans la playlist
+    HLS_ORIGIN_TIMEOUT = float(os.getenv("HLS_ORIGIN_TIMEOUT", 2))
+    HLS_STALE_MAX_AGE = float(os.getenv("HLS_STALE_MAX_AGE", 10))
+
+    # API HTTP de SRS : pool keep-alive, délai par appel et nouvelles tentatives des requêtes idempotentes
+    MEDIA_SERVER_URL = os.getenv("MEDIA_SERVER_URL", "http://localhost:1985").rstrip("/")
+    MEDIA_SERVER_TIMEOUT = float(os.getenv("MEDIA_SERVER_TIMEOUT", 2))
+    MEDIA_SERVER_RETRIES = int(os.getenv("MEDIA_SERVER_RETRIES", 2))
+    MEDIA_SERVER_POOL_SIZE = int(os.getenv("MEDIA_SERVER_POOL_SIZE", 10))
+    MEDIA_SERVER_VERIFY = os.getenv("MEDIA_SERVER_VERIFY", "1") == "1"  # 0 : démarrer sans interroger SRS
@@ -3,7 +3,10 @@ from datetime import datetime
 
 class Comment(db.Model):
     __tablename__ = "comments"
-    
+    __table_args__ = (
+        db.Index("ix_comments_session_id_id", "session_id", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey("sessions.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
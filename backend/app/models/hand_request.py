@@ -9,7 +9,11 @@ class HandStatus(enum.Enum):
 
 class HandRequest(db.Model):
     __tablename__ = "hand_requests"
-    
+    __table_args__ = (
+        db.Index("ix_hand_requests_session_status", "session_id", "status"),
+        db.Index("ix_hand_requests_session_user_status", "session_id", "user_id", "status"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey("sessions.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
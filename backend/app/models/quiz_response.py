@@ -3,7 +3,11 @@ from datetime import datetime
 
 class QuizResponse(db.Model):
     __tablename__ = "quiz_responses"
-    
+    __table_args__ = (
+        db.UniqueConstraint("quiz_id", "user_id", name="uq_quiz_responses_quiz_user"),
+        db.Index("ix_quiz_responses_quiz_answer", "quiz_id", "answer"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey("quizzes.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -9,6 +9,10 @@ class SessionStatus(enum.Enum):
 
 class Session(db.Model):
     __tablename__ = "sessions"
+    __table_args__ = (
+        db.Index("ix_sessions_status", "status"),
+        db.Index("ix_sessions_professor_status", "professor_id", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -1,12 +1,30 @@
 from flask import Blueprint, request, jsonify, render_template, session, redirect, url_for
 from app import db
 from app.models.user import User, UserRole
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from app.services.device_pairing import PairingError, device_pairing
+from app.services.identity_cache import identity_cache
+from app.services.passwords import passwords
+from app.services.token_blocklist import token_blocklist
+from datetime import timedelta
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 from flasgger import swag_from
-import bcrypt
 
 auth_bp = Blueprint("auth", __name__)
 
+
+def issue_tokens(user_id, name, role, email, refresh_expires=None):
+    """Jeton d'accès et jeton de rafraîchissement portant l'identité complète (aucun accès base ensuite)."""
+    claims = {"role": role, "name": name, "email": email}
+    return {
+        "access_token": create_access_token(identity=str(user_id), additional_claims=claims),
+        "refresh_token": create_refresh_token(
+            identity=str(user_id),
+            additional_claims=claims,
+            expires_delta=timedelta(seconds=refresh_expires) if refresh_expires else None
+        )
+    }
+
+
 @auth_bp.route("/register", methods=["POST"])
 @swag_from({
     "tags": ["Authentication"],
@@ -40,10 +58,9 @@ def register():
     if User.query.filter_by(email=data["email"]).first():
         return jsonify({"message": "Email already exists"}), 400
     
-    hashed_password = bcrypt.hashpw(data["password"].encode("utf-8"), bcrypt.gensalt())
     user = User(
         email=data["email"],
-        password=hashed_password.decode("utf-8"),
+        password=passwords.hash(data["password"]),
         name=data["name"],
         role=UserRole(data["role"])
     )
@@ -87,7 +104,8 @@ def login_page():
             "schema": {
                 "type": "object",
                 "properties": {
-                    "access_token": {"type": "string"}
+                    "access_token": {"type": "string"},
+                    "refresh_token": {"type": "string"}
                 }
             }
         },
@@ -97,22 +115,72 @@ def login_page():
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data["email"]).first()
+    # Rendre la connexion au pool avant bcrypt : une tempête de connexions épuiserait sinon le
+    # pool SQLAlchemy pendant que les hachages attendent leur tour
+    db.session.close()
 
-    if not user or not bcrypt.checkpw(data["password"].encode("utf-8"), user.password.encode("utf-8")):
+    if not user or not passwords.verify(data["password"], user.password):
         return jsonify({"message": "Invalid credentials"}), 401
 
+    # Le mot de passe en clair n'est disponible qu'ici : mettre le hachage au coût courant
+    if passwords.needs_rehash(user.password):
+        User.query.filter_by(id=user.id).update({"password": passwords.hash(data["password"])})
+        db.session.commit()
+        passwords.rehashed += 1
+
     session["user_id"] = user.id
     session["role"] = user.role.value
+    identity_cache.put(user.id, user.name, user.role)
+    return jsonify(issue_tokens(user.id, user.name, user.role.value, user.email)), 200
+
+@auth_bp.route("/refresh", methods=["POST"])
+@jwt_required(refresh=True)
+@swag_from({
+    "tags": ["Authentication"],
+    "security": [{"Bearer": []}],
+    "description": "Nouveau jeton d'accès à partir du jeton de rafraîchissement (en-tête Bearer), sans mot de passe",
+    "responses": {
+        "200": {
+            "description": "Access token refreshed",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "access_token": {"type": "string"}
+                }
+            }
+        },
+        "401": {"description": "Missing, expired or non-refresh token"}
+    }
+})
+def refresh():
+    claims = get_jwt()
     access_token = create_access_token(
-        identity=str(user.id),
-        additional_claims={"role": user.role.value}
+        identity=get_jwt_identity(),
+        additional_claims={key: claims[key] for key in ("role", "name", "email") if key in claims}
     )
     return jsonify({"access_token": access_token}), 200
 
-@auth_bp.route("/logout", methods=["GET"])
+@auth_bp.route("/logout", methods=["GET", "POST"])
+@jwt_required(refresh=True, optional=True)
+@swag_from({
+    "tags": ["Authentication"],
+    "security": [{"Bearer": []}],
+    "description": "Fermer la session web ; en POST avec le jeton de rafraîchissement (en-tête Bearer), "
+                   "le révoquer jusqu'à son expiration",
+    "responses": {
+        "200": {"description": "Logged out, refresh token revoked"},
+        "302": {"description": "Logged out (GET), redirect to the login page"},
+        "401": {"description": "Invalid, expired or already revoked refresh token"}
+    }
+})
 def logout():
     session.pop("user_id", None)
     session.pop("role", None)
+    claims = get_jwt()
+    if claims:
+        token_blocklist.revoke(claims)
+    if request.method == "POST":
+        return jsonify({"message": "Logged out successfully"}), 200
     return redirect(url_for("auth.login_page"))
 
 @auth_bp.route("/profile", methods=["GET"])
@@ -136,11 +204,141 @@ def logout():
     }
 })
 def get_profile():
-    current_user_id = get_jwt_identity()
+    # Profil lu dans les claims du jeton : appelé à chaque lancement de l'application TV
     claims = get_jwt()
-    user = User.query.get(int(current_user_id))
+    email = claims.get("email")
+    name = claims.get("name")
+    if email is None or name is None:
+        # Jeton émis avant l'ajout de ces claims
+        row = db.session.query(User.email, User.name).filter_by(id=int(get_jwt_identity())).first()
+        if row is None:
+            return jsonify({"message": "User not found"}), 404
+        email, name = row.email, row.name
     return jsonify({
-        "email": user.email,
-        "name": user.name,
+        "email": email,
+        "name": name,
         "role": claims["role"]
     }), 200
+
+
+@auth_bp.route("/device", methods=["GET"])
+def device_page():
+    return render_template("device.html")
+
+@auth_bp.route("/device/code", methods=["POST"])
+@swag_from({
+    "tags": ["Authentication"],
+    "description": "Appairage d'un téléviseur : code à afficher, à saisir par l'utilisateur sur /auth/device",
+    "responses": {
+        "200": {
+            "description": "Pairing request created",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "device_code": {"type": "string"},
+                    "user_code": {"type": "string", "example": "BCDF-GHJK"},
+                    "verification_uri": {"type": "string"},
+                    "expires_in": {"type": "integer"},
+                    "interval": {"type": "integer"}
+                }
+            }
+        }
+    }
+})
+def device_code():
+    device_code, user_code = device_pairing.start()
+    return jsonify({
+        "device_code": device_code,
+        "user_code": user_code,
+        "verification_uri": url_for("auth.device_page", _external=True),
+        "expires_in": device_pairing.code_ttl,
+        "interval": device_pairing.poll_interval
+    }), 200
+
+@auth_bp.route("/device/approve", methods=["POST"])
+@jwt_required()
+@swag_from({
+    "tags": ["Authentication"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "body",
+            "in": "body",
+            "required": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "user_code": {"type": "string", "example": "BCDF-GHJK"}
+                },
+                "required": ["user_code"]
+            }
+        }
+    ],
+    "responses": {
+        "200": {"description": "Device approved"},
+        "400": {"description": "Missing user_code"},
+        "401": {"description": "Unauthorized"},
+        "404": {"description": "Unknown or expired code"}
+    }
+})
+def device_approve():
+    data = request.get_json() or {}
+    if not data.get("user_code"):
+        return jsonify({"message": "Missing user_code"}), 400
+    claims = get_jwt()
+    identity = {"id": int(get_jwt_identity()), "name": claims.get("name"), "role": claims["role"], "email": claims.get("email")}
+    if identity["name"] is None or identity["email"] is None:
+        # Jeton émis avant l'ajout de ces claims
+        row = db.session.query(User.email, User.name).filter_by(id=identity["id"]).first()
+        if row is None:
+            return jsonify({"message": "User not found"}), 404
+        identity.update(email=row.email, name=row.name)
+    try:
+        device_pairing.approve(data["user_code"], identity)
+    except PairingError as e:
+        return jsonify({"error": e.code, "message": e.message}), e.status
+    return jsonify({"message": "Device approved"}), 200
+
+@auth_bp.route("/device/token", methods=["POST"])
+@swag_from({
+    "tags": ["Authentication"],
+    "description": "Interrogé par le téléviseur toutes les `interval` secondes jusqu'à l'approbation",
+    "parameters": [
+        {
+            "name": "body",
+            "in": "body",
+            "required": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "device_code": {"type": "string"}
+                },
+                "required": ["device_code"]
+            }
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Device paired",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "access_token": {"type": "string"},
+                    "refresh_token": {"type": "string"}
+                }
+            }
+        },
+        "400": {"description": "authorization_pending, slow_down or expired_token"}
+    }
+})
+def device_token():
+    data = request.get_json() or {}
+    if not data.get("device_code"):
+        return jsonify({"error": "invalid_request", "message": "Missing device_code"}), 400
+    try:
+        identity = device_pairing.poll(data["device_code"])
+    except PairingError as e:
+        return jsonify({"error": e.code, "message": e.message}), e.status
+    identity_cache.put(identity["id"], identity["name"], UserRole(identity["role"]))
+    return jsonify(issue_tokens(identity["id"], identity["name"], identity["role"], identity["email"],
+                                refresh_expires=device_pairing.refresh_expires)), 200
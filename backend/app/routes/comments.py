@@ -1,8 +1,14 @@
+import json
+from urllib.parse import urlencode
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db
+from app import db, limiter
 from app.models.session import Session, SessionStatus
+from app.services.chat_limiter import chat_limiter, user_rate_limit_key
+from app.services.identity_cache import identity_cache
+from app.services.session_cache import session_cache
+from app.services.write_behind import comment_buffer
 from app.models.user import User, UserRole
 from app.models.comment import Comment
 from flasgger import swag_from
@@ -10,6 +16,7 @@ from flasgger import swag_from
 comments_bp = Blueprint("comments", __name__)
 
 @comments_bp.route("/<int:session_id>/comments", methods=["POST"])
+@limiter.limit(lambda: current_app.config["COMMENT_RATE_LIMIT"], key_func=user_rate_limit_key)
 @jwt_required()
 @swag_from({
     "tags": ["Comments"],
@@ -49,22 +56,30 @@ comments_bp = Blueprint("comments", __name__)
             }
         },
         "400": {"description": "Invalid request"},
-        "404": {"description": "Session not found"}
+        "404": {"description": "Session not found"},
+        "429": {"description": "Too many messages (user bucket, session budget or slow mode)"}
     }
 })
 def post_comment(session_id):
-    current_user = get_jwt_identity()
-    user = User.query.get(current_user["id"])
-    session = Session.query.get_or_404(session_id)
+    user = identity_cache.current()
+    session = session_cache.get_or_404(session_id)
 
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session is not active"}), 400
+    if user.id != session.professor_id:
+        rejected = chat_limiter.check(session_id, user.id)
+        if rejected:
+            response = jsonify({"message": "Too many messages", "reason": rejected})
+            response.headers["Retry-After"] = str(chat_limiter.retry_after(session_id))
+            return response, 429
 
     data = request.get_json()
     if "content" not in data or not data["content"]:
         return jsonify({"message": "Content is required"}), 400
 
+    # Même séquence que les commentaires du websocket, insérés en différé avec leur id
     comment = Comment(
+        id=comment_buffer.reserve_id(),
         session_id=session_id,
         user_id=user.id,
         content=data["content"]
@@ -91,11 +106,40 @@ def post_comment(session_id):
             "type": "integer",
             "required": True,
             "description": "ID of the session"
+        },
+        {
+            "name": "after_id",
+            "in": "query",
+            "type": "integer",
+            "required": False,
+            "description": "Return only comments with an ID greater than this cursor"
+        },
+        {
+            "name": "limit",
+            "in": "query",
+            "type": "integer",
+            "required": False,
+            "description": "Page size (default 100, capped by COMMENTS_PAGE_MAX)"
+        },
+        {
+            "name": "since",
+            "in": "query",
+            "type": "string",
+            "required": False,
+            "description": "ISO timestamp: only comments created or hidden after it (reconnecting clients)"
+        },
+        {
+            "name": "format",
+            "in": "query",
+            "type": "string",
+            "enum": ["json", "ndjson"],
+            "required": False,
+            "description": "ndjson streams every matching comment, one per line (exports)"
         }
     ],
     "responses": {
         "200": {
-            "description": "List of comments for the session",
+            "description": "Page of comments for the session, the next cursor is in the X-Next-After-Id header",
             "schema": {
                 "type": "array",
                 "items": {
@@ -110,24 +154,56 @@ def post_comment(session_id):
                 }
             }
         },
+        "400": {"description": "Invalid cursor, limit or timestamp"},
         "404": {"description": "Session not found"}
     }
 })
 def get_comments(session_id):
-    Session.query.get_or_404(session_id)
+    session_cache.get_or_404(session_id)
 
-    comments = Comment.query.filter_by(session_id=session_id).all()
-    result = [
-        {
-            "id": comment.id,
-            "content": comment.content,
-            "user_name": comment.user.name,
-            "created_at": comment.created_at.isoformat(),
-            "is_hidden": comment.is_hidden
-        }
-        for comment in comments
-    ]
-    return jsonify(result), 200
+    after_id = request.args.get("after_id", 0, type=int)
+    limit = request.args.get("limit", current_app.config["COMMENTS_PAGE_SIZE"], type=int)
+    if limit <= 0:
+        return jsonify({"message": "Limit must be positive"}), 400
+    limit = min(limit, current_app.config["COMMENTS_PAGE_MAX"])
+
+    # Jointure sur l'auteur : une seule requête au lieu d'un chargement paresseux par commentaire
+    query = db.session.query(
+        Comment.id, Comment.content, Comment.created_at, Comment.is_hidden, User.name
+    ).join(User, Comment.user_id == User.id).filter(
+        Comment.session_id == session_id,
+        Comment.id > after_id
+    )
+    if "since" in request.args:
+        try:
+            since = datetime.fromisoformat(request.args["since"])
+        except ValueError:
+            return jsonify({"message": "Invalid since timestamp"}), 400
+        query = query.filter(Comment.created_at > since)
+    query = query.order_by(Comment.id)
+
+    if request.args.get("format") == "ndjson":
+        def generate():
+            for row in query.yield_per(1000):
+                yield json.dumps(_serialize_comment(row)) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    rows = query.limit(limit).all()
+    response = jsonify([_serialize_comment(row) for row in rows])
+    if len(rows) == limit:
+        next_args = dict(request.args, after_id=rows[-1].id, limit=limit)
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response, 200
+
+def _serialize_comment(row):
+    return {
+        "id": row.id,
+        "content": row.content,
+        "user_name": row.name,
+        "created_at": row.created_at.isoformat(),
+        "is_hidden": row.is_hidden
+    }
 
 @comments_bp.route("/<int:session_id>/comments/<int:comment_id>/hide", methods=["PUT"])
 @jwt_required()
@@ -158,7 +234,7 @@ def get_comments(session_id):
 })
 def hide_comment(session_id, comment_id):
     current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
     comment = Comment.query.get_or_404(comment_id)
 
     if session.professor_id != current_user["id"]:
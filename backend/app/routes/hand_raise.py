@@ -1,37 +1,54 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app import db
-from app.models.session import Session, SessionStatus
-from app.models.user import User, UserRole
+from app.models.session import SessionStatus
 from app.models.hand_request import HandRequest, HandStatus
+from app.models.user import User
+from app.services.broadcast import broadcast
+from app.services.hand_queue import hand_queue
+from app.services.identity_cache import identity_cache
+from app.services.session_cache import session_cache
+from app.services.stream_state import stream_state
 from flasgger import swag_from
-from datetime import datetime
 
 hand_raise_bp = Blueprint("hand_raise", __name__)
 
+SESSION_ID_PARAMETER = {
+    "name": "session_id",
+    "in": "path",
+    "type": "integer",
+    "required": True,
+    "description": "ID of the session"
+}
+
+TARGET_BODY_PARAMETER = {
+    "name": "body",
+    "in": "body",
+    "required": False,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "user_id": {"type": "integer", "example": 2},
+            "request_id": {"type": "integer", "example": 1, "description": "Legacy: ID of a hand_requests row"}
+        }
+    }
+}
+
 @hand_raise_bp.route("/<int:session_id>/hand-raise", methods=["POST"])
 @jwt_required()
 @swag_from({
     "tags": ["Hand Raise"],
     "security": [{"Bearer": []}],
-    "parameters": [
-        {
-            "name": "session_id",
-            "in": "path",
-            "type": "integer",
-            "required": True,
-            "description": "ID of the session"
-        }
-    ],
+    "parameters": [SESSION_ID_PARAMETER],
     "responses": {
         "201": {
-            "description": "Hand raise request created",
+            "description": "Hand raise request queued",
             "schema": {
                 "type": "object",
                 "properties": {
-                    "id": {"type": "integer"},
                     "user_id": {"type": "integer"},
-                    "status": {"type": "string"}
+                    "status": {"type": "string"},
+                    "position": {"type": "integer"}
                 }
             }
         },
@@ -40,47 +57,61 @@ hand_raise_bp = Blueprint("hand_raise", __name__)
     }
 })
 def raise_hand(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    user_id = int(get_jwt_identity())
+    session = session_cache.get_or_404(session_id)
 
-    if current_user["role"] == "professor":
+    if get_jwt().get("role") == "professor":
         return jsonify({"message": "Professors cannot raise their hand"}), 400
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session is not active"}), 400
-    if HandRequest.query.filter_by(session_id=session_id, user_id=current_user["id"], status=HandStatus.PENDING).first():
-        return jsonify({"message": "You already have a pending hand raise request"}), 400
 
-    hand_request = HandRequest(
-        session_id=session_id,
-        user_id=current_user["id"],
-        status=HandStatus.PENDING
-    )
-    db.session.add(hand_request)
-    db.session.commit()
+    added, position = hand_queue.enqueue(session_id, user_id)
+    if not added:
+        return jsonify({"message": "You already have a pending hand raise request", "position": position}), 400
 
     return jsonify({
-        "id": hand_request.id,
-        "user_id": hand_request.user_id,
-        "status": hand_request.status.value
+        "user_id": user_id,
+        "status": "pending",
+        "position": position
     }), 201
 
+@hand_raise_bp.route("/<int:session_id>/hand-raise/position", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Hand Raise"],
+    "security": [{"Bearer": []}],
+    "parameters": [SESSION_ID_PARAMETER],
+    "responses": {
+        "200": {
+            "description": "Position of the current user (0 when the hand is granted)",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "position": {"type": "integer"},
+                    "waiting": {"type": "integer"}
+                }
+            }
+        },
+        "404": {"description": "Session or request not found"}
+    }
+})
+def get_hand_position(session_id):
+    session_cache.get_or_404(session_id)
+    position = hand_queue.position(session_id, get_jwt_identity())
+    if position is None:
+        return jsonify({"message": "No hand raise request"}), 404
+    return jsonify({"position": position, "waiting": len(hand_queue.pending(session_id))}), 200
+
 @hand_raise_bp.route("/<int:session_id>/hand-requests", methods=["GET"])
 @jwt_required()
 @swag_from({
     "tags": ["Hand Raise"],
     "security": [{"Bearer": []}],
-    "parameters": [
-        {
-            "name": "session_id",
-            "in": "path",
-            "type": "integer",
-            "required": True,
-            "description": "ID of the session"
-        }
-    ],
+    "parameters": [SESSION_ID_PARAMETER],
     "responses": {
         "200": {
-            "description": "List of hand raise requests",
+            "description": "All hand raise requests of the session, including revoked ones. "
+                           "`position` is 0 for the granted hand and the rank in the queue for pending requests",
             "schema": {
                 "type": "array",
                 "items": {
@@ -90,7 +121,8 @@ def raise_hand(session_id):
                         "user_id": {"type": "integer"},
                         "user_name": {"type": "string"},
                         "status": {"type": "string"},
-                        "requested_at": {"type": "string"}
+                        "requested_at": {"type": "string"},
+                        "position": {"type": "integer"}
                     }
                 }
             }
@@ -100,23 +132,35 @@ def raise_hand(session_id):
     }
 })
 def get_hand_requests(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
-    if session.professor_id != current_user["id"]:
+    if session.professor_id != int(get_jwt_identity()):
         return jsonify({"message": "Only the professor can view hand requests"}), 403
 
-    requests = HandRequest.query.filter_by(session_id=session_id).all()
-    result = [
-        {
-            "id": req.id,
-            "user_id": req.user_id,
-            "user_name": req.user.name,
-            "status": req.status.value,
-            "requested_at": req.requested_at.isoformat()
+    # Historique complet depuis la table : les opérations encore en file d'écriture y sont appliquées d'abord
+    hand_queue.audit.flush()
+    rows = db.session.query(
+        HandRequest.id, HandRequest.user_id, User.name, HandRequest.status, HandRequest.requested_at
+    ).join(User, HandRequest.user_id == User.id).filter(HandRequest.session_id == session_id) \
+        .order_by(HandRequest.id).all()
+
+    # Position dans la file (Redis ou mémoire), qui fait foi pour l'ordre de passage
+    positions = {user_id: position for position, (user_id, _) in enumerate(hand_queue.pending(session_id), start=1)}
+    granted = hand_queue.granted(session_id)
+    result = []
+    for row in rows:
+        item = {
+            "id": row.id,
+            "user_id": row.user_id,
+            "user_name": row.name,
+            "status": row.status.value,
+            "requested_at": row.requested_at.isoformat()
         }
-        for req in requests
-    ]
+        if row.status == HandStatus.GRANTED and row.user_id == granted:
+            item["position"] = 0
+        elif row.status == HandStatus.PENDING and row.user_id in positions:
+            item["position"] = positions[row.user_id]
+        result.append(item)
     return jsonify(result), 200
 
 @hand_raise_bp.route("/<int:session_id>/hand-grant", methods=["PUT"])
@@ -124,27 +168,9 @@ def get_hand_requests(session_id):
 @swag_from({
     "tags": ["Hand Raise"],
     "security": [{"Bearer": []}],
-    "parameters": [
-        {
-            "name": "session_id",
-            "in": "path",
-            "type": "integer",
-            "required": True,
-            "description": "ID of the session"
-        },
-        {
-            "name": "body",
-            "in": "body",
-            "required": True,
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "request_id": {"type": "integer", "example": 1}
-                },
-                "required": ["request_id"]
-            }
-        }
-    ],
+    "description": "Grant the hand to `user_id`, or to the next user in line when no target is given. "
+                   "The currently granted hand is revoked in the same operation.",
+    "parameters": [SESSION_ID_PARAMETER, TARGET_BODY_PARAMETER],
     "responses": {
         "200": {"description": "Hand granted successfully"},
         "400": {"description": "Invalid request"},
@@ -153,60 +179,39 @@ def get_hand_requests(session_id):
     }
 })
 def grant_hand(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
-    if session.professor_id != current_user["id"]:
+    if session.professor_id != int(get_jwt_identity()):
         return jsonify({"message": "Only the professor can grant the hand"}), 403
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session is not active"}), 400
 
-    data = request.get_json()
-    if "request_id" not in data:
-        return jsonify({"message": "Request ID is required"}), 400
-
-    hand_request = HandRequest.query.filter_by(id=data["request_id"], session_id=session_id).first_or_404()
-
-    if hand_request.status != HandStatus.PENDING:
-        return jsonify({"message": "Request is not pending"}), 400
-
-    current_granted = HandRequest.query.filter_by(session_id=session_id, status=HandStatus.GRANTED).first()
-    if current_granted:
-        current_granted.status = HandStatus.REVOKED
-        db.session.commit()
-
-    hand_request.status = HandStatus.GRANTED
-    hand_request.granted_at = datetime.utcnow()
-    db.session.commit()
-
-    return jsonify({"message": "Hand granted successfully"}), 200
+    user_id = hand_queue.requested_user(session_id, request.get_json(silent=True) or {})
+    granted, previous = hand_queue.grant(session_id, user_id)
+    if granted is None:
+        return jsonify({"message": "No pending request for this user"}), 404
+
+    # Même séquence que l'événement Socket.IO `grant_hand` ; le journal enregistre les diffusions
+    stream_state.set_speaker(session_id, granted)
+    if previous is not None:
+        broadcast.emit("stream_switch", {"user_id": session.professor_id, "message": "Retour au flux du professeur"}, str(session_id))
+    broadcast.emit("hand_granted", {
+        "user_id": granted,
+        "user_name": identity_cache.name(granted)
+    }, str(session_id))
+    broadcast.emit("stream_switch", {
+        "user_id": granted,
+        "message": "Basculement vers le flux du spectateur"
+    }, str(session_id))
+
+    return jsonify({"message": "Hand granted successfully", "user_id": granted, "revoked_user_id": previous}), 200
 
 @hand_raise_bp.route("/<int:session_id>/hand-revoke", methods=["PUT"])
 @jwt_required()
 @swag_from({
     "tags": ["Hand Raise"],
     "security": [{"Bearer": []}],
-    "parameters": [
-        {
-            "name": "session_id",
-            "in": "path",
-            "type": "integer",
-            "required": True,
-            "description": "ID of the session"
-        },
-        {
-            "name": "body",
-            "in": "body",
-            "required": True,
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "request_id": {"type": "integer", "example": 1}
-                },
-                "required": ["request_id"]
-            }
-        }
-    ],
+    "parameters": [SESSION_ID_PARAMETER, TARGET_BODY_PARAMETER],
     "responses": {
         "200": {"description": "Hand revoked successfully"},
         "400": {"description": "Invalid request"},
@@ -215,24 +220,26 @@ def grant_hand(session_id):
     }
 })
 def revoke_hand(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
-    if session.professor_id != current_user["id"]:
+    if session.professor_id != int(get_jwt_identity()):
         return jsonify({"message": "Only the professor can revoke the hand"}), 403
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session is not active"}), 400
 
-    data = request.get_json()
-    if "request_id" not in data:
-        return jsonify({"message": "Request ID is required"}), 400
-
-    hand_request = HandRequest.query.filter_by(id=data["request_id"], session_id=session_id).first_or_404()
-
-    if hand_request.status != HandStatus.GRANTED:
+    user_id = hand_queue.requested_user(session_id, request.get_json(silent=True) or {})
+    revoked = hand_queue.revoke(session_id, user_id)
+    if revoked is None:
         return jsonify({"message": "Request is not currently granted"}), 400
 
-    hand_request.status = HandStatus.REVOKED
-    db.session.commit()
-
-    return jsonify({"message": "Hand revoked successfully"}), 200
\ No newline at end of file
+    stream_state.set_speaker(session_id, session.professor_id)
+    broadcast.emit("hand_revoked", {
+        "user_id": revoked,
+        "user_name": identity_cache.name(revoked)
+    }, str(session_id))
+    broadcast.emit("stream_switch", {
+        "user_id": session.professor_id,
+        "message": "Retour au flux du professeur"
+    }, str(session_id))
+
+    return jsonify({"message": "Hand revoked successfully", "user_id": revoked}), 200
@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db, socketio
+from app import db
 from app.models.quiz import Quiz
 from app.models.quiz_response import QuizResponse
 from app.models.session import Session, SessionStatus
+from app.services.broadcast import broadcast
+from app.services.identity_cache import identity_cache
+from app.services.quiz_tally import quiz_tally
+from app.services.session_cache import session_cache
+from app.services.write_behind import quiz_response_buffer
 from app.models.user import User, UserRole
 from flasgger import swag_from
 from datetime import datetime
@@ -51,7 +56,7 @@ quiz_bp = Blueprint("quiz", __name__)
 })
 def create_quiz(session_id):
     current_user_id = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
     if session.professor_id != int(current_user_id):
         return jsonify({"message": "Seul le professeur peut créer un quiz"}), 403
@@ -72,21 +77,70 @@ def create_quiz(session_id):
     )
     db.session.add(quiz)
     db.session.commit()
+    quiz_tally.register(quiz, session.professor_id)
 
-    socketio.emit("new_quiz", {
+    broadcast.emit("new_quiz", {
         "quiz_id": quiz.id,
         "session_id": session_id,
         "question": quiz.question,
         "options": quiz.options,
         "created_at": quiz.created_at.isoformat()
-    }, room=str(session_id))
+    }, str(session_id))
 
     return jsonify({"message": "Quiz créé avec succès", "quiz_id": quiz.id}), 201
 
 @quiz_bp.route("/<int:session_id>/<int:quiz_id>/respond", methods=["POST"])
+@jwt_required()
+@swag_from({
+    "tags": ["Quiz"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID de la session"
+        },
+        {
+            "name": "quiz_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID du quiz"
+        },
+        {
+            "name": "Idempotency-Key",
+            "in": "header",
+            "type": "string",
+            "required": False,
+            "description": "Clé réutilisée par le client lors d'un nouvel essai de la même réponse"
+        },
+        {
+            "name": "body",
+            "in": "body",
+            "required": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "answer": {"type": "string", "example": "Paris"}
+                },
+                "required": ["answer"]
+            }
+        }
+    ],
+    "responses": {
+        "200": {"description": "Réponse déjà acceptée avec cette clé d'idempotence"},
+        "202": {"description": "Réponse acceptée, écriture en base différée"},
+        "400": {"description": "Requête invalide, réponse hors des options ou session non active"},
+        "404": {"description": "Session ou quiz non trouvé"},
+        "409": {"description": "Réponse déjà enregistrée pour ce quiz"},
+        "503": {"description": "File d'écriture saturée, réessayer"}
+    }
+})
 def respond_quiz(session_id, quiz_id):
-    session = Session.query.get_or_404(session_id)
-    quiz = Quiz.query.get_or_404(quiz_id)
+    session = session_cache.get_or_404(session_id)
+    meta = quiz_tally.get_or_404(session_id, quiz_id)
 
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session non active"}), 400
@@ -94,23 +148,80 @@ def respond_quiz(session_id, quiz_id):
     data = request.get_json()
     if "answer" not in data:
         return jsonify({"message": "Réponse manquante"}), 400
+    # Avant la réservation : une réponse hors des options ne doit ni bloquer une nouvelle tentative ni fausser le décompte
+    if data["answer"] not in meta.options:
+        return jsonify({"message": "Réponse invalide pour ce quiz"}), 400
 
-    user_id = get_jwt_identity() if request.headers.get("Authorization") else None
-    response = QuizResponse(
-        quiz_id=quiz_id,
-        user_id=int(user_id) if user_id else None,
-        answer=data["answer"],
-        submitted_at=datetime.utcnow()
-    )
-    db.session.add(response)
-    db.session.commit()
+    user_id = int(get_jwt_identity())
+    idempotency_key = request.headers.get("Idempotency-Key", "")
+    claim = quiz_tally.claim(quiz_id, user_id, idempotency_key)
+    if claim == "replay":
+        return jsonify({"message": "Réponse enregistrée avec succès"}), 200
+    if claim == "duplicate":
+        return jsonify({"message": "Réponse déjà enregistrée pour ce quiz"}), 409
 
-    socketio.emit("quiz_response", {
+    # Écriture groupée en arrière-plan ; la contrainte unique (quiz_id, user_id) protège la base
+    if not quiz_response_buffer.submit({
         "quiz_id": quiz_id,
         "user_id": user_id,
-        "user_name": User.query.get(int(user_id)).name if user_id else "Anonyme",
-        "answer": response.answer,
-        "submitted_at": response.submitted_at.isoformat()
-    }, room=str(session.professor_id))
+        "answer": data["answer"],
+        "submitted_at": datetime.utcnow()
+    }):
+        quiz_tally.release(quiz_id, user_id)
+        return jsonify({"message": "Trop de réponses simultanées, veuillez réessayer"}), 503
+
+    # Le professeur reçoit des instantanés agrégés plutôt qu'un événement par réponse
+    quiz_tally.record(quiz_id, data["answer"])
+
+    return jsonify({"message": "Réponse enregistrée avec succès"}), 202
+
+@quiz_bp.route("/<int:session_id>/<int:quiz_id>/results", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Quiz"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID de la session"
+        },
+        {
+            "name": "quiz_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID du quiz"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Résultats agrégés du quiz",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "quiz_id": {"type": "integer"},
+                    "counts": {"type": "object"},
+                    "total": {"type": "integer"},
+                    "correct": {"type": "integer"},
+                    "percent_correct": {"type": "number"},
+                    "audience": {"type": "integer"},
+                    "response_rate": {"type": "number"}
+                }
+            }
+        },
+        "403": {"description": "Seul le professeur peut consulter les résultats"},
+        "404": {"description": "Session ou quiz non trouvé"}
+    }
+})
+def get_quiz_results(session_id, quiz_id):
+    current_user_id = get_jwt_identity()
+    session = session_cache.get_or_404(session_id)
+
+    if session.professor_id != int(current_user_id):
+        return jsonify({"message": "Seul le professeur peut consulter les résultats"}), 403
 
-    return jsonify({"message": "Réponse enregistrée avec succès"}), 201
\ No newline at end of file
+    quiz_tally.get_or_404(session_id, quiz_id)
+    return jsonify(quiz_tally.snapshot(quiz_id)), 200
\ No newline at end of file
@@ -1,8 +1,20 @@
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session
+import json
+import math
+from urllib.parse import urlencode
+from flask import Blueprint, Response, current_app, request, jsonify, render_template, redirect, url_for, session, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.session import Session, SessionStatus
 from app.models.user import User, UserRole
+from app.services.active_sessions import active_sessions
+from app.services.broadcast import broadcast
+from app.services.hand_queue import hand_queue
+from app.services.identity_cache import identity_cache
+from app.services.presence import presence
+from app.services.session_cache import session_cache
+from app.services.session_journal import parse_position, session_journal
+from app.services.stream_state import stream_state
+from app.services.write_behind import comment_buffer, quiz_response_buffer
 from flasgger import swag_from
 from datetime import datetime
 
@@ -42,6 +54,13 @@ def viewer_page():
 
 @sessions_bp.route("/active", methods=["GET"])
 def select_session_page():
+    # Même URL que la route JSON ci-dessous : seuls les navigateurs, qui nomment text/html, reçoivent la page.
+    # `*/*` (curl, clients HTTP des téléviseurs HbbTV) et `?format=json` reçoivent du JSON.
+    accept = request.accept_mimetypes
+    wants_html = any(mimetype == "text/html" for mimetype, _ in accept) \
+        and accept.best_match(["text/html", "application/json"]) == "text/html"
+    if request.args.get("format") == "json" or not wants_html:
+        return get_active_sessions()
     if not session.get("user_id"):
         return redirect("/auth/login")
     sessions = Session.query.filter_by(status=SessionStatus.ACTIVE).all()
@@ -102,6 +121,7 @@ def create_session():
     )
     db.session.add(session_obj)
     db.session.commit()
+    active_sessions.invalidate()
 
     return jsonify({
         "id": session_obj.id,
@@ -114,7 +134,7 @@ def create_session():
     "tags": ["Sessions"],
     "responses": {
         "200": {
-            "description": "List of active sessions",
+            "description": "List of active sessions (ETag / If-None-Match supported)",
             "schema": {
                 "type": "array",
                 "items": {
@@ -128,22 +148,20 @@ def create_session():
                     }
                 }
             }
-        }
+        },
+        "304": {"description": "The list has not changed since the ETag sent in If-None-Match"}
     }
 })
 def get_active_sessions():
-    sessions = Session.query.filter_by(status=SessionStatus.ACTIVE).all()
-    result = [
-        {
-            "id": session.id,
-            "title": session.title,
-            "description": session.description,
-            "professor_name": session.professor.name,
-            "start_time": session.start_time.isoformat()
-        }
-        for session in sessions
-    ]
-    return jsonify(result), 200
+    # Les téléviseurs interrogent cette route en boucle : réponse pré-sérialisée, 304 si inchangée
+    body, etag = active_sessions.get()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={active_sessions.max_age}"
+    return response
 
 @sessions_bp.route("/<int:session_id>", methods=["GET"])
 @jwt_required()
@@ -237,12 +255,25 @@ def update_session(session_id):
         session_obj.title = data["title"]
     if "description" in data:
         session_obj.description = data["description"]
+    # La clôture (file des mains, flux, journal) n'a lieu qu'au passage à ENDED, pas à chaque mise à jour
+    ended = False
     if "status" in data:
-        session_obj.status = SessionStatus(data["status"])
-        if session_obj.status == SessionStatus.ENDED:
+        status = SessionStatus(data["status"])
+        ended = status == SessionStatus.ENDED and session_obj.status != SessionStatus.ENDED
+        session_obj.status = status
+        if ended:
+            comment_buffer.flush()
+            quiz_response_buffer.flush()
             session_obj.end_time = datetime.utcnow()
 
     db.session.commit()
+    session_cache.invalidate(session_id)
+    active_sessions.invalidate()
+    if ended:
+        hand_queue.clear(session_id)
+        stream_state.stop(session_id)
+        session_journal.append(session_id, "session_ended", {"session_id": session_id, "title": session_obj.title})
+        session_journal.close(session_id)
     return jsonify({"message": "Session updated successfully"}), 200
 
 @sessions_bp.route("/<int:session_id>/end", methods=["POST"])
@@ -276,8 +307,235 @@ def end_session(session_id):
     if session_obj.status == SessionStatus.ENDED:
         return jsonify({"message": "Session already ended"}), 400
 
+    # Garantir que tous les commentaires et réponses de la session sont persistés avant la clôture
+    comment_buffer.flush()
+    quiz_response_buffer.flush()
+
     session_obj.status = SessionStatus.ENDED
     session_obj.end_time = datetime.utcnow()
     db.session.commit()
+    session_cache.invalidate(session_id)
+    active_sessions.invalidate()
+    hand_queue.clear(session_id)
+    stream_state.stop(session_id)
+    session_journal.append(session_id, "session_ended", {"session_id": session_id, "title": session_obj.title})
+    session_journal.close(session_id)
+
+    return jsonify({"message": "Session ended successfully"}), 200
+
+@sessions_bp.route("/cache-stats", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Sessions"],
+    "security": [{"Bearer": []}],
+    "responses": {
+        "200": {
+            "description": "Session state cache counters",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "hits": {"type": "integer"},
+                    "redis_hits": {"type": "integer"},
+                    "misses": {"type": "integer"},
+                    "invalidations": {"type": "integer"},
+                    "hit_ratio": {"type": "number"},
+                    "size": {"type": "integer"},
+                    "backend": {"type": "string"}
+                }
+            }
+        },
+        "401": {"description": "Unauthorized"}
+    }
+})
+def get_cache_stats():
+    return jsonify(session_cache.stats()), 200
+
+@sessions_bp.route("/<int:session_id>/presence", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Sessions"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID of the session"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Viewers currently connected to the session",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "session_id": {"type": "integer"},
+                    "viewers": {"type": "integer"},
+                    "members": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "user_id": {"type": "integer"},
+                                "user_name": {"type": "string"}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        "403": {"description": "Only the professor can view the audience"},
+        "404": {"description": "Session not found"}
+    }
+})
+def get_presence(session_id):
+    state = session_cache.get_or_404(session_id)
+    if state.professor_id != int(get_jwt_identity()):
+        return jsonify({"message": "Only the professor can view the audience"}), 403
+
+    members = []
+    for user_id in presence.members(session_id):
+        members.append({"user_id": user_id, "user_name": identity_cache.name(user_id)})
+    return jsonify({
+        "session_id": session_id,
+        "viewers": presence.count(session_id),
+        "members": members
+    }), 200
+
+@sessions_bp.route("/broadcast-stats", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Sessions"],
+    "security": [{"Bearer": []}],
+    "responses": {
+        "200": {
+            "description": "Room broadcast scheduler counters",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "immediate": {"type": "integer"},
+                    "batched_events": {"type": "integer"},
+                    "batched_frames": {"type": "integer"},
+                    "frames_saved": {"type": "integer"},
+                    "avg_added_latency_ms": {"type": "number"},
+                    "max_added_latency_ms": {"type": "number"},
+                    "pending_rooms": {"type": "integer"}
+                }
+            }
+        },
+        "401": {"description": "Unauthorized"}
+    }
+})
+def get_broadcast_stats():
+    return jsonify(broadcast.stats()), 200
+
+@sessions_bp.route("/<int:session_id>/replay", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Sessions"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID of the session"
+        },
+        {
+            "name": "from",
+            "in": "query",
+            "type": "number",
+            "required": False,
+            "description": "Seconds since the session start_time to seek to (e.g. 2520 for minute 42)"
+        },
+        {
+            "name": "after",
+            "in": "query",
+            "type": "string",
+            "required": False,
+            "description": "Position of the last event received (X-Next-After header), overrides from"
+        },
+        {
+            "name": "limit",
+            "in": "query",
+            "type": "integer",
+            "required": False,
+            "description": "Page size (default 500, capped by JOURNAL_PAGE_MAX)"
+        },
+        {
+            "name": "format",
+            "in": "query",
+            "type": "string",
+            "enum": ["json", "ndjson"],
+            "required": False,
+            "description": "ndjson streams every event from the position, one per line"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Journal events in time order, the next cursor is in the X-Next-After header",
+            "schema": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "position": {"type": "string", "example": "2520000-0"},
+                        "offset_ms": {"type": "integer"},
+                        "event": {"type": "string"},
+                        "data": {"type": "object"}
+                    }
+                }
+            }
+        },
+        "400": {"description": "Invalid position or limit"},
+        "401": {"description": "Unauthorized"},
+        "404": {"description": "Session not found or without journal"}
+    }
+})
+def replay_session(session_id):
+    session_cache.get_or_404(session_id)
+    if not session_journal.exists(session_id):
+        return jsonify({"message": "No journal for this session"}), 404
+
+    try:
+        start_ms = float(request.args.get("from", 0)) * 1000
+        if not math.isfinite(start_ms):
+            # `inf` (ou un décalage qui déborde une fois converti en ms) : int() lèverait OverflowError
+            raise ValueError(request.args["from"])
+        start_ms = int(start_ms)
+        after = request.args.get("after")
+        if after is not None:
+            parse_position(after)
+    except ValueError:
+        return jsonify({"message": "Invalid position"}), 400
+    limit = request.args.get("limit", current_app.config["JOURNAL_PAGE_SIZE"], type=int)
+    if limit <= 0:
+        return jsonify({"message": "Limit must be positive"}), 400
+    limit = min(limit, current_app.config["JOURNAL_PAGE_MAX"])
+
+    # Recherche dans l'index puis lecture séquentielle : le coût ne dépend pas de la position demandée
+    events = session_journal.replay(session_id, max(start_ms, 0), after)
+    if request.args.get("format") == "ndjson":
+        def generate():
+            for position, offset, event, data in events:
+                yield json.dumps(_serialize_event(position, offset, event, data)) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    page = []
+    for position, offset, event, data in events:
+        page.append(_serialize_event(position, offset, event, data))
+        if len(page) == limit:
+            break
+    events.close()
+    response = jsonify(page)
+    if len(page) == limit:
+        next_args = dict(request.args, after=page[-1]["position"], limit=limit)
+        next_args.pop("from", None)
+        response.headers["X-Next-After"] = page[-1]["position"]
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response, 200
 
-    return jsonify({"message": "Session ended successfully"}), 200
\ No newline at end of file
+def _serialize_event(position, offset, event, data):
+    return {"position": position, "offset_ms": offset, "event": event, "data": data}
@@ -1,14 +1,18 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db, socketio
+from app import db
 from app.models.session import Session, SessionStatus
+from app.services.broadcast import broadcast
+from app.services.hls_edge import OriginError, hls_edge
+from app.services.identity_cache import identity_cache
+from app.services.media_server import MediaServerError, media_server
+from app.services.session_cache import session_cache
+from app.services.signaling import SignalingError, signaling
 from app.models.user import User, UserRole
+from app.services.stream_state import stream_state
 from flasgger import swag_from
-import redis
-from app.config import Config
 
 streaming_bp = Blueprint("streaming", __name__)
-redis_client = redis.from_url(Config.REDIS_URL)
 
 @streaming_bp.route("/<int:session_id>/start", methods=["POST"])
 @jwt_required()
@@ -28,12 +32,13 @@ redis_client = redis.from_url(Config.REDIS_URL)
         "200": {"description": "Streaming démarré, fichier M3U8 généré"},
         "400": {"description": "Session non active ou requête invalide"},
         "403": {"description": "Seul le professeur peut démarrer le streaming"},
-        "404": {"description": "Session non trouvée"}
+        "404": {"description": "Session non trouvée"},
+        "503": {"description": "Serveur média (SRS) injoignable"}
     }
 })
 def start_streaming(session_id):
     current_user_id = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
     if session.professor_id != int(current_user_id):
         return jsonify({"message": "Seul le professeur peut démarrer le streaming"}), 403
@@ -41,20 +46,29 @@ def start_streaming(session_id):
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session non active"}), 400
 
-    stream_key = f"live/session_{session_id}"
-    webrtc_url = f"http://localhost:1985/rtc/v1/publish/"
-    m3u8_url = f"http://localhost:8080/hls/{stream_key}.m3u8"
+    # Le professeur publie après cet appel : on vérifie seulement que SRS pourra recevoir le flux
+    if media_server.verify:
+        available, details = media_server.ping()
+        if not available:
+            return jsonify({"message": "Serveur média indisponible", "error": details["error"]}), 503
+
+    webrtc_url = media_server.publish_url
+    # Avec le relais activé, les spectateurs lisent la playlist via l'application plutôt qu'à l'origine
+    if hls_edge.enabled:
+        m3u8_url = url_for("streaming.get_playlist", session_id=session_id, _external=True)
+    else:
+        m3u8_url = hls_edge.origin_url(session_id)
 
-    # Stocker l'état du streaming dans Redis
-    redis_client.setex(f"stream:{session_id}", 3600, m3u8_url)  # Expire après 1 heure
-    session.stream_url = m3u8_url
+    # Redis porte l'état du direct lu par les clients ; la colonne n'en garde qu'une trace durable
+    stream_state.start(session_id, m3u8_url, webrtc_url, session.professor_id)
+    Session.query.filter_by(id=session_id).update({"stream_url": m3u8_url})
     db.session.commit()
 
-    socketio.emit("stream_started", {
+    broadcast.emit("stream_started", {
         "session_id": session_id,
         "webrtc_url": webrtc_url,
         "m3u8_url": m3u8_url
-    }, room=str(session_id))
+    }, str(session_id))
 
     return jsonify({
         "message": "Streaming démarré",
@@ -85,7 +99,7 @@ def start_streaming(session_id):
 })
 def stop_streaming(session_id):
     current_user_id = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    session = session_cache.get_or_404(session_id)
 
     if session.professor_id != int(current_user_id):
         return jsonify({"message": "Seul le professeur peut arrêter le streaming"}), 403
@@ -93,18 +107,154 @@ def stop_streaming(session_id):
     if session.status != SessionStatus.ACTIVE:
         return jsonify({"message": "Session non active"}), 400
 
-    # Supprimer l'état du streaming de Redis
-    redis_client.delete(f"stream:{session_id}")
-    session.stream_url = None
+    if media_server.verify:
+        # Couper aussi la publication côté SRS, sans bloquer l'arrêt si SRS ne répond pas
+        try:
+            live = media_server.stream(session_id)
+            if live and live["publishing"] and live["publisher_cid"]:
+                media_server.kick(live["publisher_cid"])
+        except MediaServerError as e:
+            current_app.logger.warning("Arrêt de la publication SRS de la session %s impossible : %s", session_id, e)
+
+    stream_state.stop(session_id)
+    hls_edge.evict(session_id)
+    Session.query.filter_by(id=session_id).update({"stream_url": None})
     db.session.commit()
+    session_cache.invalidate(session_id)
 
-    socketio.emit("stream_stopped", {
+    broadcast.emit("stream_stopped", {
         "session_id": session_id,
         "message": "Streaming arrêté"
-    }, room=str(session_id))
+    }, str(session_id))
 
     return jsonify({"message": "Streaming arrêté"}), 200
 
+@streaming_bp.route("/<int:session_id>/stream", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Streaming"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID de la session"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "État du direct (lu dans Redis)",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "session_id": {"type": "integer"},
+                    "stream_url": {"type": "string"},
+                    "m3u8_url": {"type": "string"},
+                    "webrtc_url": {"type": "string"},
+                    "publisher_id": {"type": "integer"},
+                    "speaker_id": {"type": "integer"},
+                    "started_at": {"type": "number"}
+                }
+            }
+        },
+        "404": {"description": "Aucun flux en direct pour cette session"}
+    }
+})
+def get_stream(session_id):
+    live = stream_state.get(session_id)
+    if live is None:
+        return jsonify({"message": "Aucun flux en direct"}), 404
+    return jsonify(live.to_dict()), 200
+
+@streaming_bp.route("/<int:session_id>/stream/stats", methods=["GET"])
+@jwt_required()
+@swag_from({
+    "tags": ["Streaming"],
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID de la session"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Statistiques du flux côté SRS",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "publishing": {"type": "boolean"},
+                    "clients": {"type": "integer"},
+                    "recv_kbps": {"type": "integer"},
+                    "send_kbps": {"type": "integer"},
+                    "video": {"type": "object"},
+                    "audio": {"type": "object"}
+                }
+            }
+        },
+        "403": {"description": "Réservé au professeur de la session"},
+        "404": {"description": "Flux inconnu de SRS"},
+        "503": {"description": "Serveur média indisponible"}
+    }
+})
+def get_stream_stats(session_id):
+    session = session_cache.get_or_404(session_id)
+    if session.professor_id != int(get_jwt_identity()):
+        return jsonify({"message": "Réservé au professeur de la session"}), 403
+
+    try:
+        stats = media_server.stream(session_id)
+    except MediaServerError as e:
+        return jsonify({"message": "Serveur média indisponible", "error": str(e)}), 503
+    if stats is None:
+        return jsonify({"message": "Flux inconnu du serveur média"}), 404
+    return jsonify(stats), 200
+
+@streaming_bp.route("/<int:session_id>/playlist.m3u8", methods=["GET"])
+@swag_from({
+    "tags": ["Streaming"],
+    "parameters": [
+        {
+            "name": "session_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "ID de la session"
+        }
+    ],
+    "responses": {
+        "200": {"description": "Playlist HLS relayée, URI des segments réécrites vers le CDN"},
+        "304": {"description": "Playlist inchangée (If-None-Match)"},
+        "404": {"description": "Relais désactivé ou session non active"},
+        "502": {"description": "Origine HLS indisponible"}
+    }
+})
+def get_playlist(session_id):
+    # Même accès public que l'origine : les lecteurs HLS des téléviseurs n'envoient pas de jeton
+    if not hls_edge.enabled:
+        return jsonify({"message": "Relais HLS désactivé"}), 404
+    session = session_cache.get_or_404(session_id)
+    if session.status != SessionStatus.ACTIVE:
+        return jsonify({"message": "Session non active"}), 404
+
+    try:
+        body, etag, max_age = hls_edge.get(session_id)
+    except OriginError:
+        return jsonify({"message": "Playlist indisponible"}), 502
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/vnd.apple.mpegurl")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={int(max_age)}" if max_age >= 1 else "no-cache"
+    return response
+
 @streaming_bp.route("/<int:session_id>/offer", methods=["POST"])
 @jwt_required()
 @swag_from({
@@ -135,32 +285,18 @@ def stop_streaming(session_id):
     "responses": {
         "200": {"description": "Offre WebRTC enregistrée"},
         "400": {"description": "Requête invalide ou session non active"},
+        "401": {"description": "Utilisateur non trouvé"},
         "403": {"description": "Non autorisé à diffuser"},
-        "404": {"description": "Session non trouvée"}
+        "404": {"description": "Session ou destinataire non trouvé"},
+        "503": {"description": "Redis injoignable"}
     }
 })
 def register_offer(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
-
-    if session.status != SessionStatus.ACTIVE:
-        return jsonify({"message": "Session non active"}), 400
-
-    is_professor = int(current_user) == session.professor_id
-    if not is_professor:
-        return jsonify({"message": "Seul le professeur peut diffuser via WebRTC"}), 403
-
-    data = request.get_json()
-    if "sdp" not in data or "type" not in data or data["type"] != "offer":
-        return jsonify({"message": "Offre SDP invalide"}), 400
-
-    socketio.emit("stream_offer", {
-        "user_id": current_user,
-        "user_name": User.query.get(current_user).name,
-        "sdp": data["sdp"],
-        "type": data["type"]
-    }, room=str(session_id))
-
+    # Même relais que l'événement Socket.IO `signal_offer`, préférable pour les clients connectés
+    try:
+        signaling.relay("offer", session_id, identity_cache.current(), request.get_json(silent=True))
+    except SignalingError as e:
+        return jsonify({"message": e.message}), e.status
     return jsonify({"message": "Offre enregistrée, en attente de réponse"}), 200
 
 @streaming_bp.route("/<int:session_id>/answer", methods=["POST"])
@@ -194,26 +330,16 @@ def register_offer(session_id):
     "responses": {
         "200": {"description": "Réponse envoyée avec succès"},
         "400": {"description": "Requête invalide"},
-        "404": {"description": "Session non trouvée"}
+        "401": {"description": "Utilisateur non trouvé"},
+        "404": {"description": "Session ou destinataire non trouvé"},
+        "503": {"description": "Redis injoignable"}
     }
 })
 def send_answer(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
-
-    if session.status != SessionStatus.ACTIVE:
-        return jsonify({"message": "Session non active"}), 400
-
-    data = request.get_json()
-    if "sdp" not in data or "type" not in data or data["type"] != "answer" or "to_user_id" not in data:
-        return jsonify({"message": "Réponse SDP invalide"}), 400
-
-    socketio.emit("stream_answer", {
-        "user_id": current_user,
-        "sdp": data["sdp"],
-        "type": data["type"]
-    }, room=str(data["to_user_id"]))
-
+    try:
+        signaling.relay("answer", session_id, identity_cache.current(), request.get_json(silent=True))
+    except SignalingError as e:
+        return jsonify({"message": e.message}), e.status
     return jsonify({"message": "Réponse envoyée avec succès"}), 200
 
 @streaming_bp.route("/<int:session_id>/ice-candidate", methods=["POST"])
@@ -237,32 +363,24 @@ def send_answer(session_id):
                 "type": "object",
                 "properties": {
                     "candidate": {"type": "string", "example": "candidate:1 1 UDP ..."},
+                    "candidates": {"type": "array", "items": {"type": "string"}, "description": "Plusieurs candidats en un seul appel"},
                     "to_user_id": {"type": "integer", "example": 1}
                 },
-                "required": ["candidate", "to_user_id"]
+                "required": ["to_user_id"]
             }
         }
     ],
     "responses": {
         "200": {"description": "Candidat ICE envoyé avec succès"},
         "400": {"description": "Requête invalide"},
-        "404": {"description": "Session non trouvée"}
+        "401": {"description": "Utilisateur non trouvé"},
+        "404": {"description": "Session ou destinataire non trouvé"},
+        "503": {"description": "Redis injoignable"}
     }
 })
 def send_ice_candidate(session_id):
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
-
-    if session.status != SessionStatus.ACTIVE:
-        return jsonify({"message": "Session non active"}), 400
-
-    data = request.get_json()
-    if "candidate" not in data or "to_user_id" not in data:
-        return jsonify({"message": "Candidat ICE invalide"}), 400
-
-    socketio.emit("ice_candidate", {
-        "user_id": current_user,
-        "candidate": data["candidate"]
-    }, room=str(data["to_user_id"]))
-
-    return jsonify({"message": "Candidat ICE envoyé avec succès"}), 200
\ No newline at end of file
+    try:
+        signaling.relay("ice", session_id, identity_cache.current(), request.get_json(silent=True))
+    except SignalingError as e:
+        return jsonify({"message": e.message}), e.status
+    return jsonify({"message": "Candidat ICE envoyé avec succès"}), 200
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import threading
+import time
+from app import db
+from app.models.session import Session, SessionStatus
+from app.models.user import User
+
+
+class ActiveSessionsSnapshot:
+    """Liste des sessions actives pré-sérialisée et versionnée, servie avec un ETag.
+
+    Le JSON est reconstruit au premier appel suivant une création, modification ou fin
+    de session (`invalidate`). `ACTIVE_SESSIONS_SNAPSHOT_TTL` borne la durée pendant
+    laquelle un worker peut servir une liste modifiée par un autre worker.
+    """
+
+    def __init__(self):
+        self.ttl = 10
+        self.max_age = 5
+        self.version = 0
+        self._body = None
+        self._etag = None
+        self._expires = 0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def init_app(self, app):
+        self.ttl = app.config["ACTIVE_SESSIONS_SNAPSHOT_TTL"]
+        self.max_age = app.config["ACTIVE_SESSIONS_MAX_AGE"]
+
+    def get(self):
+        """Retourner le couple (corps JSON, ETag) courant, reconstruit si nécessaire."""
+        if self._body is None or time.monotonic() >= self._expires:
+            with self._lock:
+                if self._body is None or time.monotonic() >= self._expires:
+                    self._rebuild()
+        return self._body, self._etag
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._body = None
+
+    def _rebuild(self):
+        rows = db.session.query(
+            Session.id, Session.title, Session.description, Session.start_time, User.name
+        ).join(User, Session.professor_id == User.id).filter(
+            Session.status == SessionStatus.ACTIVE
+        ).order_by(Session.id).all()
+        body = json.dumps([
+            {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "professor_name": row.name,
+                "start_time": row.start_time.isoformat()
+            }
+            for row in rows
+        ]).encode("utf-8")
+        self._body = body
+        self._etag = hashlib.sha1(body).hexdigest()
+        self._expires = time.monotonic() + self.ttl
+        self.rebuilds += 1
+
+
+active_sessions = ActiveSessionsSnapshot()
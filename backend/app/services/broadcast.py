@@ -0,0 +1,116 @@
+import threading
+import time
+from app import socketio
+from app.services.compact_events import compact_events, encode_batch, encode_event
+
+# Événements de contrôle : jamais retardés, ils vident d'abord la file de la salle pour préserver l'ordre
+CONTROL_EVENTS = frozenset({
+    "stream_switch", "hand_granted", "hand_revoked", "session_ended",
+    "stream_started", "stream_stopped", "new_quiz", "slow_mode"
+})
+
+
+class BroadcastScheduler:
+    """Diffusion par salle regroupant les événements fréquents en une seule trame `batch`.
+
+    Les événements de la voie normale (`new_comment`, `new_hand_request`, `presence_update`…)
+    sont mis en file par salle et envoyés toutes les `BROADCAST_TICK_MS` millisecondes :
+    un seul événement part tel quel, plusieurs partent dans `batch` ({"events": [{event, data}]}).
+    Les événements de `CONTROL_EVENTS` passent immédiatement. Les fonctions de `listeners`
+    reçoivent chaque événement (événement, données, salle) au moment de l'appel. Les salles
+    `compact:<session>` reçoivent la même diffusion au schéma compact (`compact_events`).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.tick = 0.1
+        self.max_batch = 200
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._task_started = False
+        self.listeners = []
+        self.immediate = 0
+        self.batched_events = 0
+        self.batched_frames = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.tick = app.config["BROADCAST_TICK_MS"] / 1000
+        self.max_batch = app.config["BROADCAST_MAX_BATCH"]
+
+    def emit(self, event, data, room, priority=None):
+        """Diffuser `event` à la salle ; `priority="control"` ou `"normal"` force la voie."""
+        for listener in self.listeners:
+            listener(event, data, room)
+        control = event in CONTROL_EVENTS if priority is None else priority == "control"
+        self._emit(event, data, room, control)
+        mirror = compact_events.mirror(room)
+        if mirror is not None:
+            compact_events.encoded += 1
+            self._emit(event, encode_event(data), mirror, control)
+
+    def _emit(self, event, data, room, control):
+        if control or self.tick <= 0:
+            self.flush(room)
+            self.immediate += 1
+            socketio.emit(event, data, to=room)
+            return
+        with self._lock:
+            queue = self._pending.setdefault(room, [])
+            queue.append((event, data, time.monotonic()))
+            full = len(queue) >= self.max_batch
+            start_task = not self._task_started
+            self._task_started = True
+        if start_task:
+            socketio.start_background_task(self._run)
+        if full:
+            self.flush(room)
+
+    def flush(self, room=None):
+        """Envoyer les événements en attente d'une salle (ou de toutes les salles)."""
+        with self._lock:
+            if room is None:
+                pending, self._pending = self._pending, {}
+            else:
+                queue = self._pending.pop(room, None)
+                pending = {room: queue} if queue else {}
+        now = time.monotonic()
+        for target, queue in pending.items():
+            self.batched_events += len(queue)
+            self.batched_frames += 1
+            oldest = now - queue[0][2]
+            self.latency_total += sum(now - queued_at for _, _, queued_at in queue)
+            self.latency_max = max(self.latency_max, oldest)
+            if len(queue) == 1:
+                event, data, _ = queue[0]
+                socketio.emit(event, data, to=target)
+            elif target.startswith("compact:"):
+                socketio.emit("batch", encode_batch([(event, data) for event, data, _ in queue]), to=target)
+            else:
+                socketio.emit("batch", {"events": [{"event": event, "data": data} for event, data, _ in queue]},
+                              to=target)
+
+    def stats(self):
+        return {
+            "immediate": self.immediate,
+            "batched_events": self.batched_events,
+            "batched_frames": self.batched_frames,
+            "frames_saved": self.batched_events - self.batched_frames,
+            "avg_added_latency_ms": round(1000 * self.latency_total / self.batched_events, 2) if self.batched_events else 0.0,
+            "max_added_latency_ms": round(1000 * self.latency_max, 2),
+            "pending_rooms": len(self._pending)
+        }
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception:
+                # Les lots suivants partent malgré une erreur ponctuelle
+                self.app.logger.exception("Échec de l'envoi des événements groupés")
+
+
+broadcast = BroadcastScheduler()
@@ -0,0 +1,182 @@
+import threading
+import time
+from flask import request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from app.services.broadcast import broadcast
+from app.services.redis_pool import redis_pool
+
+# Un seul aller-retour Redis par message : mode lent, seau de l'utilisateur, fenêtre d'une seconde de la session.
+# KEYS : seau, compteur de la seconde courante, drapeau du mode lent
+# ARGV : capacité, débit, capacité et débit en mode lent, maintenant, budget, seuil, durée du mode lent
+# Retourne {verdict, mode lent actif}
+CHECK_SCRIPT = """
+local slow = redis.call('EXISTS', KEYS[3])
+local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+if slow == 1 then capacity, rate = tonumber(ARGV[3]), tonumber(ARGV[4]) end
+local now = tonumber(ARGV[5])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(capacity, (tonumber(bucket[1]) or capacity) + (now - (tonumber(bucket[2]) or now)) * rate)
+if tokens < 1 then return {'user', slow} end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+local count = redis.call('INCR', KEYS[2])
+if count == 1 then redis.call('EXPIRE', KEYS[2], 2) end
+if count > tonumber(ARGV[7]) and slow == 0 then
+    redis.call('SET', KEYS[3], 1, 'EX', ARGV[8])
+    slow = 1
+end
+if count > tonumber(ARGV[6]) then return {'session', slow} end
+return {'ok', slow}
+"""
+
+
+class _Bucket:
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, tokens, ts):
+        self.tokens = tokens
+        self.ts = ts
+
+
+class ChatLimiter:
+    """Limitation des messages du chat avant l'écriture en base et la diffusion.
+
+    - seau de jetons par utilisateur et par session (`CHAT_USER_BURST`, `CHAT_USER_RATE`/s) ;
+    - budget global par session (`CHAT_SESSION_BUDGET` messages par seconde), l'excédent est abandonné ;
+    - mode lent automatique : au-delà de `CHAT_SLOW_MODE_THRESHOLD` messages/s, chaque spectateur
+      est limité à un message toutes les `CHAT_SLOW_MODE_INTERVAL` secondes pendant
+      `CHAT_SLOW_MODE_DURATION` secondes ; la salle est prévenue par l'événement `slow_mode`.
+
+    Avec `CHAT_LIMIT_BACKEND=redis`, tous les compteurs sont dans Redis et valent pour l'ensemble des workers.
+    """
+
+    def __init__(self):
+        self.burst = 5
+        self.rate = 1.0
+        self.budget = 50
+        self.slow_threshold = 30
+        self.slow_interval = 10
+        self.slow_duration = 60
+        self.redis_url = None
+        self._redis = None
+        self._check = None
+        self._buckets = {}
+        self._windows = {}
+        self._slow_until = {}
+        self._slow_state = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0
+        self.accepted = 0
+        self.rejected = {"user": 0, "session": 0}
+
+    def init_app(self, app):
+        self.burst = app.config["CHAT_USER_BURST"]
+        self.rate = app.config["CHAT_USER_RATE"]
+        self.budget = app.config["CHAT_SESSION_BUDGET"]
+        self.slow_threshold = app.config["CHAT_SLOW_MODE_THRESHOLD"]
+        self.slow_interval = app.config["CHAT_SLOW_MODE_INTERVAL"]
+        self.slow_duration = app.config["CHAT_SLOW_MODE_DURATION"]
+        if app.config["CHAT_LIMIT_BACKEND"] == "redis":
+            self.redis_url = app.config["REDIS_URL"]
+
+    @property
+    def redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = redis_pool.client
+            self._check = self._redis.register_script(CHECK_SCRIPT)
+        return self._redis
+
+    def check(self, session_id, user_id):
+        """Consommer un message. Retourne None s'il est accepté, sinon la raison du refus ("user" ou "session")."""
+        session_id, user_id = int(session_id), int(user_id)
+        now = time.time()
+        if self.redis is not None:
+            second = int(now)
+            verdict, slow = self._check(
+                keys=[f"chat:{session_id}:bucket:{user_id}", f"chat:{session_id}:rate:{second}", f"chat:{session_id}:slow"],
+                args=[self.burst, self.rate, 1, 1 / self.slow_interval, now,
+                      self.budget, self.slow_threshold, self.slow_duration]
+            )
+            verdict = verdict.decode() if isinstance(verdict, bytes) else verdict
+            slow = bool(slow)
+        else:
+            with self._lock:
+                verdict, slow = self._check_local(session_id, user_id, now)
+        self._notify(session_id, slow)
+        if verdict == "ok":
+            self.accepted += 1
+            return None
+        self.rejected[verdict] += 1
+        return verdict
+
+    def retry_after(self, session_id):
+        """Délai conseillé avant un nouvel essai, en secondes."""
+        return self.slow_interval if self._slow_state.get(int(session_id)) else max(1, round(1 / self.rate))
+
+    def slow_mode(self, session_id):
+        return bool(self._slow_state.get(int(session_id)))
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected_user": self.rejected["user"],
+            "rejected_session": self.rejected["session"],
+            "slow_sessions": sum(1 for slow in self._slow_state.values() if slow)
+        }
+
+    def _check_local(self, session_id, user_id, now):
+        if now >= self._next_prune:
+            self._prune(now)
+        slow = self._slow_until.get(session_id, 0) > now
+        capacity, rate = (1, 1 / self.slow_interval) if slow else (self.burst, self.rate)
+        bucket = self._buckets.get((session_id, user_id))
+        if bucket is None:
+            bucket = self._buckets[(session_id, user_id)] = _Bucket(capacity, now)
+        bucket.tokens = min(capacity, bucket.tokens + (now - bucket.ts) * rate)
+        bucket.ts = now
+        if bucket.tokens < 1:
+            return "user", slow
+        bucket.tokens -= 1
+
+        second = int(now)
+        window = self._windows.get(session_id)
+        if window is None or window[0] != second:
+            window = self._windows[session_id] = [second, 0]
+        window[1] += 1
+        if window[1] > self.slow_threshold and not slow:
+            self._slow_until[session_id] = now + self.slow_duration
+            slow = True
+        if window[1] > self.budget:
+            return "session", slow
+        return "ok", slow
+
+    def _prune(self, now):
+        # Un seau redevenu plein n'a plus d'effet : l'oublier borne la mémoire au nombre de participants actifs
+        horizon = now - max(self.burst / self.rate, self.slow_interval)
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket.ts > horizon}
+        self._windows = {key: window for key, window in self._windows.items() if window[0] >= int(now) - 1}
+        self._slow_until = {key: until for key, until in self._slow_until.items() if until > now}
+        self._next_prune = now + 10
+
+    def _notify(self, session_id, slow):
+        if self._slow_state.get(session_id, False) == slow:
+            return
+        if slow:
+            self._slow_state[session_id] = True
+        else:
+            self._slow_state.pop(session_id, None)
+        broadcast.emit("slow_mode", {"session_id": session_id, "enabled": slow, "interval": self.slow_interval},
+                       str(session_id))
+
+
+def user_rate_limit_key():
+    """Clé Flask-Limiter : l'utilisateur du JWT s'il y en a un, sinon l'adresse IP."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return f"user:{identity}" if identity else request.remote_addr or "127.0.0.1"
+
+
+chat_limiter = ChatLimiter()
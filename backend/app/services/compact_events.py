@@ -0,0 +1,160 @@
+import threading
+from datetime import datetime, timezone
+from app import socketio
+
+try:
+    import msgpack
+except ImportError:  # dépendance optionnelle : sérialisation binaire des paquets Socket.IO
+    msgpack = None
+
+SCHEMA_VERSION = 1
+
+# Clés courtes du schéma compact ; une clé absente de la table est transmise telle quelle
+SHORT_KEYS = {
+    "user_id": "u",
+    "user_name": "n",
+    "content": "c",
+    "created_at": "t",
+    "started_at": "st",
+    "quiz_id": "q",
+    "question": "k",
+    "options": "o",
+    "message": "m",
+    "viewers": "v",
+    "enabled": "e",
+    "interval": "i",
+    "webrtc_url": "w",
+    "m3u8_url": "h",
+    "title": "ti",
+    "revoked_user_id": "r",
+    "publisher_id": "p",
+    "speaker_id": "sp",
+    "reason": "re",
+    "retry_after": "ra"
+}
+# Redondants dans une salle de session : le client connaît sa session, `stream_url` vaut `m3u8_url`
+DROPPED_KEYS = frozenset({"session_id", "stream_url"})
+TIMESTAMP_KEYS = frozenset({"created_at", "started_at", "requested_at", "granted_at", "submitted_at"})
+
+
+def compact_room(room):
+    """Salle des clients au schéma compact, parallèle à la salle d'une session."""
+    return f"compact:{room}"
+
+
+def to_millis(value):
+    """Horodatage ISO (UTC implicite) ou epoch en secondes -> millisecondes entières."""
+    if isinstance(value, str):
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+    if isinstance(value, (int, float)):
+        return int(value * 1000)
+    return value
+
+
+def encode_event(data):
+    """Charge utile d'un événement au schéma compact."""
+    if not isinstance(data, dict):
+        return data
+    compact = {}
+    for key, value in data.items():
+        if key in DROPPED_KEYS:
+            continue
+        if key in TIMESTAMP_KEYS and value is not None:
+            value = to_millis(value)
+        compact[SHORT_KEYS.get(key, key)] = value
+    return compact
+
+
+def encode_batch(events):
+    """Lot compact : noms d'événements et d'utilisateurs internés une fois par trame.
+
+    `events` est une liste de (événement, charge compacte). La trame vaut
+    {"v": [événements], "n": [noms], "e": [[indice dans v, charge]]} ; dans chaque charge,
+    `n` est un indice dans la table des noms.
+    """
+    names, name_index = [], {}
+    kinds, kind_index = [], {}
+    frame = []
+    for event, data in events:
+        position = kind_index.get(event)
+        if position is None:
+            position = kind_index[event] = len(kinds)
+            kinds.append(event)
+        if isinstance(data, dict) and isinstance(data.get("n"), str):
+            name = data["n"]
+            index = name_index.get(name)
+            if index is None:
+                index = name_index[name] = len(names)
+                names.append(name)
+            data = dict(data, n=index)
+        frame.append([position, data])
+    return {"v": kinds, "n": names, "e": frame}
+
+
+def socketio_serializer(app):
+    """Sérialiseur des paquets Socket.IO demandé par `SOCKETIO_SERIALIZER`, si disponible."""
+    if app.config["SOCKETIO_SERIALIZER"] == "msgpack":
+        if msgpack is not None:
+            return "msgpack"
+        app.logger.warning("SOCKETIO_SERIALIZER=msgpack mais msgpack n'est pas installé : JSON utilisé")
+    return "default"
+
+
+class CompactEvents:
+    """Schéma d'événements compact, négocié à la connexion (`auth: {schema: "compact"}`).
+
+    Les clients au schéma compact (téléviseurs HbbTV peu puissants) rejoignent
+    `compact:<session>` au lieu de la salle de la session. `broadcast` y recopie chaque
+    événement encodé une seule fois par salle : clés courtes, horodatages en millisecondes
+    entières, sans `session_id`, et dans les lots, noms d'utilisateurs et d'événements internés.
+    Hors mode multi-nœuds, la recopie est omise tant que la salle compacte est vide.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.multi_node = False
+        self._sids = set()
+        self._lock = threading.Lock()
+        self.encoded = 0
+
+    def init_app(self, app):
+        self.enabled = app.config["SOCKETIO_COMPACT_SCHEMA"]
+        self.multi_node = app.config["SOCKETIO_MULTI_NODE"]
+
+    def negotiate(self, sid, auth):
+        """Enregistrer le schéma demandé par le client ; retourne le schéma retenu."""
+        if self.enabled and (auth or {}).get("schema") == "compact":
+            with self._lock:
+                self._sids.add(sid)
+            return "compact"
+        return "full"
+
+    def is_compact(self, sid):
+        return sid in self._sids
+
+    def forget(self, sid):
+        with self._lock:
+            self._sids.discard(sid)
+
+    def session_room(self, sid, session_id):
+        """Salle de diffusion à rejoindre pour une session selon le schéma du client."""
+        return compact_room(session_id) if sid in self._sids else str(session_id)
+
+    def mirror(self, room):
+        """Salle compacte à alimenter pour `room`, ou None (salle hors session, vide ou schéma désactivé)."""
+        if not self.enabled or not str(room).isdigit():
+            return None
+        target = compact_room(room)
+        if self.multi_node:
+            return target
+        rooms = socketio.server.manager.rooms.get("/", {}) if socketio.server else {}
+        return target if rooms.get(target) else None
+
+    def stats(self):
+        return {"clients": len(self._sids), "encoded": self.encoded}
+
+
+compact_events = CompactEvents()
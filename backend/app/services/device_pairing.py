@@ -0,0 +1,110 @@
+import json
+import secrets
+from app.services.redis_pool import redis_pool
+
+# Sans voyelles ni caractères ambigus : un code saisi à la télécommande ou au téléphone
+USER_CODE_ALPHABET = "BCDFGHJKLMNPQRSTVWXZ"
+
+
+class PairingError(Exception):
+    """Erreur du flux d'appairage ; `code` reprend les erreurs de la RFC 8628."""
+
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class DevicePairing:
+    """Appairage d'un téléviseur par code affiché à l'écran (flux « device code », RFC 8628).
+
+    Le téléviseur demande un code (`start`), l'affiche et interroge `poll` toutes les
+    `DEVICE_POLL_INTERVAL` secondes. L'utilisateur, connecté sur un autre appareil, saisit le
+    code (`approve`) : l'identité de son jeton est attachée à la demande, sans accès à la base
+    ni bcrypt. La demande vit `DEVICE_CODE_TTL` secondes dans Redis et n'est utilisable qu'une
+    fois ; le téléviseur reçoit alors un jeton de rafraîchissement valable
+    `DEVICE_REFRESH_TOKEN_EXPIRES` secondes.
+    """
+
+    def __init__(self):
+        self.code_ttl = 600
+        self.poll_interval = 5
+        self.refresh_expires = 86400
+        self.started = 0
+        self.approved = 0
+        self.completed = 0
+
+    def init_app(self, app):
+        self.code_ttl = app.config["DEVICE_CODE_TTL"]
+        self.poll_interval = app.config["DEVICE_POLL_INTERVAL"]
+        self.refresh_expires = app.config["DEVICE_REFRESH_TOKEN_EXPIRES"]
+
+    def start(self):
+        """Créer une demande d'appairage : (code de l'appareil, code à saisir par l'utilisateur)."""
+        device_code = secrets.token_urlsafe(32)
+        client = redis_pool.client
+        while True:
+            user_code = "".join(secrets.choice(USER_CODE_ALPHABET) for _ in range(8))
+            user_code = f"{user_code[:4]}-{user_code[4:]}"
+            if client.set(self._user_key(user_code), device_code, ex=self.code_ttl, nx=True):
+                break
+        client.set(self._device_key(device_code), json.dumps({"status": "pending"}), ex=self.code_ttl)
+        self.started += 1
+        return device_code, user_code
+
+    def approve(self, user_code, identity):
+        """Attacher `identity` (id, name, role, email) à la demande du code saisi."""
+        user_code = user_code.strip().upper().replace(" ", "")
+        if len(user_code) == 8:
+            user_code = f"{user_code[:4]}-{user_code[4:]}"
+        client = redis_pool.client
+        device_code = client.get(self._user_key(user_code))
+        if device_code is None:
+            raise PairingError("invalid_grant", "Code inconnu ou expiré", 404)
+        device_code = device_code.decode() if isinstance(device_code, bytes) else device_code
+        key = self._device_key(device_code)
+        ttl = client.ttl(key)
+        if ttl is None or ttl <= 0:
+            raise PairingError("expired_token", "Code expiré", 404)
+        client.set(key, json.dumps({"status": "approved", "identity": identity}), ex=ttl)
+        client.delete(self._user_key(user_code))
+        self.approved += 1
+
+    def poll(self, device_code):
+        """Identité approuvée pour `device_code`, consommée au premier appel qui la trouve."""
+        client = redis_pool.client
+        key = self._device_key(device_code)
+        raw = client.get(key)
+        if raw is None:
+            raise PairingError("expired_token", "Demande d'appairage inconnue ou expirée")
+        request = json.loads(raw)
+        if request["status"] == "approved":
+            # Usage unique : seul le premier appel qui supprime la clé obtient les jetons
+            if not client.delete(key):
+                raise PairingError("expired_token", "Demande d'appairage déjà utilisée")
+            self.completed += 1
+            return request["identity"]
+
+        # Clé témoin de l'intervalle : la demande n'est jamais réécrite ici, une approbation concurrente n'est pas perdue
+        if not client.set(self._poll_key(device_code), 1, ex=self.poll_interval, nx=True):
+            raise PairingError("slow_down", f"Interroger au plus toutes les {self.poll_interval} secondes")
+        raise PairingError("authorization_pending", "En attente de la saisie du code")
+
+    def stats(self):
+        return {"started": self.started, "approved": self.approved, "completed": self.completed}
+
+    @staticmethod
+    def _device_key(device_code):
+        return f"device_code:{device_code}"
+
+    @staticmethod
+    def _poll_key(device_code):
+        return f"device_poll:{device_code}"
+
+    @staticmethod
+    def _user_key(user_code):
+        return f"device_user_code:{user_code}"
+
+
+device_pairing = DevicePairing()
@@ -0,0 +1,322 @@
+import threading
+import time
+from datetime import datetime, timezone
+from app import db
+from app.models.hand_request import HandRequest, HandStatus
+from app.services.write_behind import WriteBehindBuffer
+from app.services.redis_pool import redis_pool
+
+# Échange atomique main accordée / file d'attente : retire l'utilisateur demandé
+# (ou le premier de la file si ARGV[1] est vide) et retourne {accordé, précédent}
+GRANT_SCRIPT = """
+local previous = redis.call('GET', KEYS[2]) or ''
+local user_id = ARGV[1]
+if user_id == '' then
+    local first = redis.call('ZPOPMIN', KEYS[1])
+    if #first == 0 then return {'', previous} end
+    user_id = first[1]
+elseif redis.call('ZREM', KEYS[1], user_id) == 0 then
+    return {'', previous}
+end
+redis.call('SET', KEYS[2], user_id)
+return {user_id, previous}
+"""
+
+REVOKE_SCRIPT = """
+local granted = redis.call('GET', KEYS[1])
+if not granted or (ARGV[1] ~= '' and granted ~= ARGV[1]) then return '' end
+redis.call('DEL', KEYS[1])
+return granted
+"""
+
+
+class HandAuditLog(WriteBehindBuffer):
+    """Journal asynchrone des levées de main : la table `hand_requests` n'est plus sur le chemin critique.
+
+    Chaque lot est appliqué dans une seule transaction, y compris l'échange révocation/attribution.
+    """
+
+    def _write(self, batch):
+        for op in batch:
+            if op["op"] == "raise":
+                db.session.add(HandRequest(
+                    session_id=op["session_id"],
+                    user_id=op["user_id"],
+                    status=HandStatus.PENDING,
+                    requested_at=op["at"]
+                ))
+            elif op["op"] == "grant":
+                HandRequest.query.filter_by(session_id=op["session_id"], status=HandStatus.GRANTED) \
+                    .update({"status": HandStatus.REVOKED})
+                HandRequest.query.filter_by(session_id=op["session_id"], user_id=op["user_id"], status=HandStatus.PENDING) \
+                    .update({"status": HandStatus.GRANTED, "granted_at": op["at"]})
+            elif op["op"] == "revoke":
+                HandRequest.query.filter_by(session_id=op["session_id"], user_id=op["user_id"], status=HandStatus.GRANTED) \
+                    .update({"status": HandStatus.REVOKED})
+            db.session.flush()
+
+
+class _LocalQueue:
+    """File des demandes dans l'ordre d'arrivée : ajout, retrait et position en O(log n).
+
+    Chaque demande reçoit un numéro d'arrivée ; un arbre de Fenwick compte les demandes
+    encore en file jusqu'à chaque numéro. Un retrait laisse un emplacement vide, les vides
+    sont compactés quand ils dépassent le nombre de demandes en file.
+    """
+
+    __slots__ = ("entries", "index", "tree", "size", "last", "granted")
+
+    def __init__(self):
+        self.entries = []
+        self.index = {}
+        self.tree = [0]
+        self.size = 0
+        self.last = float("-inf")
+        self.granted = None
+
+    def __contains__(self, user_id):
+        return user_id in self.index
+
+    def add(self, user_id, score):
+        # L'ordre d'arrivée fait foi : un horodatage en arrière (horloge recalée) est aligné sur le précédent
+        score = self.last = max(score, self.last)
+        self.entries.append((score, user_id))
+        position = len(self.entries)
+        self.tree.append(self._prefix(position - 1) - self._prefix(position - (position & -position)) + 1)
+        self.index[user_id] = position
+        self.size += 1
+
+    def rank(self, user_id):
+        position = self.index.get(user_id)
+        if position is None:
+            return None
+        return self._prefix(position) - 1
+
+    def remove(self, user_id):
+        position = self.index.pop(user_id, None)
+        if position is None:
+            return False
+        self.entries[position - 1] = None
+        self.size -= 1
+        while position < len(self.tree):
+            self.tree[position] -= 1
+            position += position & -position
+        if len(self.entries) > 2 * self.size + 32:
+            self._compact()
+        return True
+
+    def first(self):
+        """Premier utilisateur de la file, ou None."""
+        if not self.size:
+            return None
+        # Descente dans l'arbre : plus grand numéro dont le préfixe est encore nul
+        position, step = 0, 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if position + step < len(self.tree) and self.tree[position + step] == 0:
+                position += step
+            step >>= 1
+        return self.entries[position][1]
+
+    def items(self):
+        """Demandes en file dans l'ordre : liste de (horodatage, user_id)."""
+        return [entry for entry in self.entries if entry is not None]
+
+    def _prefix(self, position):
+        total = 0
+        while position:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+    def _compact(self):
+        self.entries = self.items()
+        self.index = {user_id: position for position, (_, user_id) in enumerate(self.entries, 1)}
+        # Construction en O(n) : chaque nœud reporte son total sur son parent
+        self.tree = [0] + [1] * len(self.entries)
+        for position in range(1, len(self.tree)):
+            parent = position + (position & -position)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[position]
+
+
+class HandQueue:
+    """File des mains levées par session, ordonnée par `requested_at`.
+
+    Backend Redis (`HAND_QUEUE_BACKEND=redis`) : un sorted set par session et une clé pour
+    la main accordée, l'attribution passant par un script Lua atomique. Backend mémoire :
+    une file locale reconstruite depuis `hand_requests` au premier accès.
+    """
+
+    def __init__(self):
+        self.redis_url = None
+        self._redis = None
+        self._grant = None
+        self._revoke = None
+        self._queues = {}
+        self._lock = threading.Lock()
+        self.audit = HandAuditLog(HandRequest, "HAND_AUDIT")
+
+    def init_app(self, app):
+        if app.config["HAND_QUEUE_BACKEND"] == "redis":
+            self.redis_url = app.config["REDIS_URL"]
+        self.audit.init_app(app)
+
+    @property
+    def redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = redis_pool.client
+            self._grant = self._redis.register_script(GRANT_SCRIPT)
+            self._revoke = self._redis.register_script(REVOKE_SCRIPT)
+        return self._redis
+
+    def enqueue(self, session_id, user_id):
+        """Ajouter une demande. Retourne (ajoutée, position) ; une demande existante n'est pas dupliquée."""
+        session_id, user_id = int(session_id), int(user_id)
+        now = time.time()
+        if self.redis is not None:
+            if self.redis.get(self._granted_key(session_id)) == str(user_id).encode():
+                return False, 0
+            added = self.redis.zadd(self._queue_key(session_id), {user_id: now}, nx=True)
+            position = self.position(session_id, user_id)
+        else:
+            queue = self._local(session_id)
+            with self._lock:
+                added = user_id not in queue and queue.granted != user_id
+                if added:
+                    queue.add(user_id, now)
+                rank = queue.rank(user_id)
+                position = 0 if rank is None else rank + 1
+        if added:
+            self.audit.submit({"op": "raise", "session_id": session_id, "user_id": user_id,
+                               "at": datetime.utcfromtimestamp(now)})
+        return bool(added), position
+
+    def position(self, session_id, user_id):
+        """Position 1-indexée dans la file, 0 si la main est accordée, None si aucune demande."""
+        session_id, user_id = int(session_id), int(user_id)
+        if self.redis is not None:
+            rank = self.redis.zrank(self._queue_key(session_id), user_id)
+            if rank is not None:
+                return rank + 1
+            return 0 if self.redis.get(self._granted_key(session_id)) == str(user_id).encode() else None
+        queue = self._local(session_id)
+        with self._lock:
+            rank = queue.rank(user_id)
+            if rank is not None:
+                return rank + 1
+            return 0 if queue.granted == user_id else None
+
+    def pending(self, session_id):
+        """Demandes en attente dans l'ordre : liste de (user_id, horodatage)."""
+        session_id = int(session_id)
+        if self.redis is not None:
+            return [(int(member), score) for member, score in
+                    self.redis.zrange(self._queue_key(session_id), 0, -1, withscores=True)]
+        queue = self._local(session_id)
+        with self._lock:
+            return [(user_id, score) for score, user_id in queue.items()]
+
+    def granted(self, session_id):
+        session_id = int(session_id)
+        if self.redis is not None:
+            value = self.redis.get(self._granted_key(session_id))
+            return int(value) if value else None
+        queue = self._local(session_id)
+        with self._lock:
+            return queue.granted
+
+    def grant(self, session_id, user_id=None):
+        """Accorder la main à `user_id` (ou au premier de la file) en révoquant la main courante.
+
+        Retourne (utilisateur accordé, utilisateur révoqué) ; le premier vaut None si la demande n'existe pas.
+        """
+        session_id = int(session_id)
+        if self.redis is not None:
+            granted, previous = self._grant(
+                keys=[self._queue_key(session_id), self._granted_key(session_id)],
+                args=["" if user_id is None else int(user_id)]
+            )
+            granted = int(granted) if granted else None
+            previous = int(previous) if previous else None
+        else:
+            queue = self._local(session_id)
+            with self._lock:
+                previous = queue.granted
+                if user_id is None:
+                    granted = queue.first()
+                else:
+                    granted = int(user_id) if int(user_id) in queue else None
+                if granted is not None:
+                    queue.remove(granted)
+                    queue.granted = granted
+        if granted is None:
+            return None, previous
+        self.audit.submit({"op": "grant", "session_id": session_id, "user_id": granted, "at": datetime.utcnow()})
+        return granted, previous
+
+    def revoke(self, session_id, user_id=None):
+        """Révoquer la main accordée (seulement si elle appartient à `user_id` quand il est fourni)."""
+        session_id = int(session_id)
+        if self.redis is not None:
+            revoked = self._revoke(keys=[self._granted_key(session_id)], args=["" if user_id is None else int(user_id)])
+            revoked = int(revoked) if revoked else None
+        else:
+            queue = self._local(session_id)
+            with self._lock:
+                revoked = queue.granted
+                if revoked is None or (user_id is not None and revoked != int(user_id)):
+                    return None
+                queue.granted = None
+        if revoked is not None:
+            self.audit.submit({"op": "revoke", "session_id": session_id, "user_id": revoked, "at": datetime.utcnow()})
+        return revoked
+
+    def clear(self, session_id):
+        """Vider la file d'une session terminée."""
+        session_id = int(session_id)
+        if self.redis is not None:
+            self.redis.delete(self._queue_key(session_id), self._granted_key(session_id))
+        with self._lock:
+            self._queues.pop(session_id, None)
+        self.audit.flush()
+
+    @staticmethod
+    def requested_user(session_id, data):
+        """Utilisateur visé : `user_id`, ou l'auteur d'un `request_id` historique (-1 s'il est introuvable), sinon None."""
+        if data.get("user_id") is not None:
+            return int(data["user_id"])
+        if data.get("request_id") is not None:
+            hand_request = HandRequest.query.filter_by(id=data["request_id"], session_id=session_id).first()
+            return hand_request.user_id if hand_request else -1
+        return None
+
+    def _local(self, session_id):
+        """File locale de la session, à obtenir avant de prendre le verrou."""
+        queue = self._queues.get(session_id)
+        if queue is None:
+            # Premier accès sur ce worker : reprendre l'état depuis le journal SQL, hors verrou
+            loaded = _LocalQueue()
+            rows = HandRequest.query.filter(
+                HandRequest.session_id == session_id,
+                HandRequest.status.in_([HandStatus.PENDING, HandStatus.GRANTED])
+            ).order_by(HandRequest.requested_at).all()
+            for row in rows:
+                if row.status == HandStatus.GRANTED:
+                    loaded.granted = row.user_id
+                elif row.user_id not in loaded:
+                    loaded.add(row.user_id, row.requested_at.replace(tzinfo=timezone.utc).timestamp())
+            with self._lock:
+                # Chargement concurrent : la première file enregistrée est gardée
+                queue = self._queues.setdefault(session_id, loaded)
+        return queue
+
+    @staticmethod
+    def _queue_key(session_id):
+        return f"hands:{session_id}:queue"
+
+    @staticmethod
+    def _granted_key(session_id):
+        return f"hands:{session_id}:granted"
+
+
+hand_queue = HandQueue()
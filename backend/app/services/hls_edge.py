@@ -0,0 +1,158 @@
+import hashlib
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin
+
+TARGET_DURATION = re.compile(rb"^#EXT-X-TARGETDURATION:(\d+(?:\.\d+)?)", re.M)
+URI_ATTRIBUTE = re.compile(rb'URI="([^"]+)"')
+
+
+class OriginError(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "fetched_at", "expires", "fetching", "error")
+
+    def __init__(self):
+        self.body = None
+        self.etag = None
+        self.fetched_at = 0
+        self.expires = 0
+        self.fetching = None
+        self.error = None
+
+
+class HlsEdge:
+    """Relais des playlists HLS : chaque playlist est demandée à l'origine au plus une fois par segment.
+
+    Les requêtes simultanées sur une playlist expirée attendent le même appel à l'origine
+    (regroupement). Les URI de segments sont réécrites en absolu, vers `HLS_CDN_PREFIX` s'il
+    est défini. Si l'origine échoue, la dernière copie est servie tant qu'elle a moins de
+    `HLS_STALE_MAX_AGE` secondes.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = "http://localhost:8080/hls"
+        self.cdn_prefix = None
+        self.ttl = 0
+        self.timeout = 2
+        self.stale_max_age = 10
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.origin_fetches = 0
+        self.hits = 0
+        self.collapsed = 0
+        self.stale = 0
+
+    def init_app(self, app):
+        self.enabled = app.config["HLS_EDGE_ENABLED"]
+        self.origin = app.config["HLS_ORIGIN_URL"]
+        self.cdn_prefix = app.config["HLS_CDN_PREFIX"]
+        self.ttl = app.config["HLS_PLAYLIST_TTL"]
+        self.timeout = app.config["HLS_ORIGIN_TIMEOUT"]
+        self.stale_max_age = app.config["HLS_STALE_MAX_AGE"]
+
+    def origin_url(self, session_id):
+        return f"{self.origin}/live/session_{int(session_id)}.m3u8"
+
+    def get(self, session_id):
+        """Retourner (playlist, ETag, max-age restant). Lève `OriginError` sans copie utilisable."""
+        session_id = int(session_id)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = self._entries[session_id] = _Entry()
+            now = time.monotonic()
+            if now < entry.expires:
+                if entry.error is None:
+                    self.hits += 1
+                    return entry.body, entry.etag, entry.expires - now
+                # Échec récent : pas de nouvel appel à l'origine avant la fin du délai
+                return self._stale(entry, now)
+            waiter = entry.fetching
+            if waiter is None:
+                entry.fetching = threading.Event()
+            else:
+                self.collapsed += 1
+
+        if waiter is not None:
+            waiter.wait(self.timeout * 2)
+        else:
+            self._refresh(session_id, entry)
+
+        now = time.monotonic()
+        if entry.body is not None and entry.error is None and now < entry.expires:
+            return entry.body, entry.etag, entry.expires - now
+        return self._stale(entry, now)
+
+    def evict(self, session_id):
+        with self._lock:
+            self._entries.pop(int(session_id), None)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "playlists": len(self._entries),
+            "origin_fetches": self.origin_fetches,
+            "hits": self.hits,
+            "collapsed": self.collapsed,
+            "stale": self.stale
+        }
+
+    def rewrite(self, body, playlist_url):
+        """Rendre absolues les URI de la playlist (segments, clés, init) et les faire pointer vers le CDN."""
+        def absolute(uri):
+            url = urljoin(playlist_url, uri.decode())
+            if self.cdn_prefix and url.startswith(self.origin + "/"):
+                url = self.cdn_prefix.rstrip("/") + url[len(self.origin):]
+            return url.encode()
+
+        lines = []
+        for line in body.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith(b"#"):
+                line = URI_ATTRIBUTE.sub(lambda match: b'URI="' + absolute(match.group(1)) + b'"', stripped)
+            else:
+                line = absolute(stripped)
+            lines.append(line)
+        return b"\n".join(lines) + b"\n"
+
+    def _stale(self, entry, now):
+        if entry.body is not None and now - entry.fetched_at < self.stale_max_age:
+            self.stale += 1
+            return entry.body, entry.etag, 0
+        raise OriginError(entry.error or "Playlist indisponible")
+
+    def _refresh(self, session_id, entry):
+        url = self.origin_url(session_id)
+        try:
+            self.origin_fetches += 1
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                raw = response.read()
+            body = self.rewrite(raw, url)
+            match = TARGET_DURATION.search(raw)
+            ttl = self.ttl or (float(match.group(1)) if match else 2)
+            now = time.monotonic()
+            entry.body = body
+            entry.etag = hashlib.sha1(body).hexdigest()
+            entry.fetched_at = now
+            entry.expires = now + ttl
+            entry.error = None
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            # Mémoriser l'échec une seconde : une origine en panne ne reçoit pas une requête par téléviseur
+            entry.error = str(e)
+            entry.expires = time.monotonic() + 1
+        finally:
+            with self._lock:
+                event, entry.fetching = entry.fetching, None
+            event.set()
+
+
+hls_edge = HlsEdge()
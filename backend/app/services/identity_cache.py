@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict, namedtuple
+from flask_jwt_extended import get_jwt
+from app import db
+from app.models.user import User, UserRole
+
+Identity = namedtuple("Identity", ["id", "name", "role"])
+
+
+class IdentityCache:
+    """Cache LRU borné des identités (nom, rôle) utilisées dans les événements diffusés.
+
+    Alimenté à la connexion et à chaque décodage de JWT : les jetons émis par `auth.login`
+    portent le nom de l'utilisateur, le chemin critique n'interroge donc plus la table `users`.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config["IDENTITY_CACHE_SIZE"]
+
+    def put(self, user_id, name, role):
+        identity = Identity(int(user_id), name, role)
+        with self._lock:
+            self._entries[identity.id] = identity
+            self._entries.move_to_end(identity.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+    def get(self, user_id):
+        """Retourner l'identité d'un utilisateur, chargée depuis la base en cas d'absence."""
+        user_id = int(user_id)
+        with self._lock:
+            identity = self._entries.get(user_id)
+            if identity is not None:
+                self._entries.move_to_end(user_id)
+        if identity is not None:
+            self.hits += 1
+            return identity
+
+        self.misses += 1
+        row = db.session.query(User.id, User.name, User.role).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        return self.put(row.id, row.name, row.role)
+
+    def name(self, user_id):
+        """Nom affiché d'un utilisateur, None s'il n'existe plus."""
+        identity = self.get(user_id)
+        return identity.name if identity is not None else None
+
+    def from_claims(self, claims):
+        """Construire l'identité à partir des claims d'un JWT décodé (sans accès base si `name` est présent)."""
+        if "name" in claims and "role" in claims:
+            return self.put(claims["sub"], claims["name"], UserRole(claims["role"]))
+        return self.get(claims["sub"])
+
+    def current(self):
+        """Identité associée au JWT de la requête en cours, ou None pour un appel anonyme."""
+        claims = get_jwt()
+        if not claims:
+            return None
+        return self.from_claims(claims)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+identity_cache = IdentityCache()
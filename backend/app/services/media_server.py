@@ -0,0 +1,175 @@
+import http.client
+import json
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+# Une connexion gardée ouverte peut avoir été fermée par SRS entre deux appels : on la remplace
+RETRYABLE_ERRORS = (http.client.HTTPException, OSError)
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+class MediaServerError(Exception):
+    pass
+
+
+class MediaServer:
+    """Client de l'API HTTP de SRS, sur un pool de connexions keep-alive borné.
+
+    Au plus `MEDIA_SERVER_POOL_SIZE` appels sont en cours à la fois ; les suivants attendent
+    qu'une connexion se libère (comme le pool Redis). Chaque appel a un délai (`MEDIA_SERVER_TIMEOUT`) et les requêtes idempotentes sont
+    rejouées jusqu'à `MEDIA_SERVER_RETRIES` fois sur une nouvelle connexion. Le client
+    repose sur `http.client` : avec `eventlet.monkey_patch()` (voir run.py), une réponse
+    lente de SRS suspend le greenlet de la requête, pas le worker.
+    """
+
+    def __init__(self):
+        self.url = "http://localhost:1985"
+        self.timeout = 2
+        self.retries = 2
+        self.pool_size = 10
+        self.verify = True
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self.requests = 0
+        self.retried = 0
+        self.errors = 0
+        self.connections = 0
+
+    def init_app(self, app):
+        self.url = app.config["MEDIA_SERVER_URL"]
+        self.timeout = app.config["MEDIA_SERVER_TIMEOUT"]
+        self.retries = app.config["MEDIA_SERVER_RETRIES"]
+        self.pool_size = app.config["MEDIA_SERVER_POOL_SIZE"]
+        self.verify = app.config["MEDIA_SERVER_VERIFY"]
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self.close()
+
+    @property
+    def publish_url(self):
+        return f"{self.url}/rtc/v1/publish/"
+
+    def stream_name(self, session_id):
+        return f"session_{int(session_id)}"
+
+    def ping(self):
+        """Vérifier que l'API de SRS répond : (disponible, détails)."""
+        start = time.perf_counter()
+        try:
+            data = self.request("GET", "/api/v1/versions")
+        except MediaServerError as e:
+            return False, {"error": str(e)}
+        return True, {
+            "version": (data.get("data") or {}).get("version"),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def stream(self, session_id):
+        """Statistiques SRS du flux de la session, ou None si SRS ne le connaît pas."""
+        name = self.stream_name(session_id)
+        for stream in self.request("GET", "/api/v1/streams/?count=1000").get("streams", []):
+            if stream.get("name") == name and stream.get("app") == "live":
+                publish = stream.get("publish") or {}
+                kbps = stream.get("kbps") or {}
+                return {
+                    "id": stream.get("id"),
+                    "publishing": bool(publish.get("active")),
+                    "publisher_cid": publish.get("cid"),
+                    "clients": stream.get("clients", 0),
+                    "recv_kbps": kbps.get("recv_30s", 0),
+                    "send_kbps": kbps.get("send_30s", 0),
+                    "video": stream.get("video"),
+                    "audio": stream.get("audio")
+                }
+        return None
+
+    def kick(self, client_id):
+        """Déconnecter un client SRS (le diffuseur d'un flux pour l'arrêter)."""
+        self.request("DELETE", f"/api/v1/clients/{client_id}")
+
+    def request(self, method, path, body=None):
+        """Appeler l'API de SRS et retourner le JSON décodé. Lève `MediaServerError`."""
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        # Un POST (publication) n'est pas rejoué : SRS pourrait l'avoir déjà traité
+        attempts = 1 + (self.retries if method in ("GET", "DELETE") else 0)
+        self.requests += 1
+        error = None
+        for attempt in range(attempts):
+            if attempt:
+                self.retried += 1
+                time.sleep(min(0.05 * 2 ** (attempt - 1), 0.5))
+            if not self._slots.acquire(timeout=self.timeout):
+                self.errors += 1
+                raise MediaServerError(f"Aucune connexion SRS libre en {self.timeout} s")
+            connection = self._acquire()
+            reusable = False
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                raw = response.read()
+                reusable = not response.will_close
+            except TimeoutError:
+                # Un SRS qui ne répond pas dans le délai n'est pas relancé : l'appelant n'attend qu'une fois
+                self.errors += 1
+                raise MediaServerError(f"Pas de réponse de SRS en {self.timeout} s")
+            except RETRYABLE_ERRORS as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            finally:
+                self._release(connection, reusable)
+            if response.status in RETRYABLE_STATUS:
+                error = f"HTTP {response.status}"
+                continue
+            if response.status >= 400:
+                self.errors += 1
+                raise MediaServerError(f"HTTP {response.status}")
+            try:
+                data = json.loads(raw or b"{}")
+            except ValueError:
+                self.errors += 1
+                raise MediaServerError("Réponse SRS illisible")
+            if isinstance(data, dict) and data.get("code", 0) != 0:
+                self.errors += 1
+                raise MediaServerError(f"Code SRS {data['code']}")
+            return data
+        self.errors += 1
+        raise MediaServerError(error)
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "requests": self.requests,
+            "retried": self.retried,
+            "errors": self.errors,
+            "connections": self.connections,
+            "idle": len(self._idle)
+        }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection in idle:
+            connection.close()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self.connections += 1
+        parts = urlsplit(self.url)
+        factory = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        return factory(parts.hostname, parts.port, timeout=self.timeout)
+
+    def _release(self, connection, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+
+media_server = MediaServer()
@@ -0,0 +1,237 @@
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+# Taille JSON d'un événement mesurée sur une émission sur EMIT_SIZE_SAMPLE_EVERY, puis réutilisée
+EMIT_SIZE_SAMPLE_EVERY = 32
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def room_kind(room):
+    """Réduire une salle à son type : les libellés restent en nombre borné."""
+    if room is None:
+        return "all"
+    room = str(room)
+    if room.isdigit():
+        return "session"
+    if ":" in room:
+        return room.split(":", 1)[0]
+    return "client"
+
+
+class Metrics:
+    """Compteurs et histogrammes exposés au format texte de Prometheus sur `/metrics`.
+
+    Les routes HTTP sont instrumentées par `before_request`/`after_request`, les gestionnaires
+    Socket.IO par un enveloppement de `socketio.on` (installé avant leur enregistrement), et
+    les requêtes SQL par un écouteur SQLAlchemy qui les attribue à la requête ou à l'événement
+    en cours. Les octets émis sont estimés par type de salle (taille du JSON × destinataires
+    locaux), la taille de chaque événement n'étant sérialisée qu'une émission sur
+    `EMIT_SIZE_SAMPLE_EVERY`. Sur le chemin chaud : une horloge, une recherche dichotomique et
+    des incréments.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._socketio = None
+        self._emit_sizes = {}
+
+    def init_app(self, app, socketio):
+        self.enabled = app.config["METRICS_ENABLED"]
+        self.token = app.config["METRICS_TOKEN"]
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, "before_cursor_execute", self._on_query):
+            event.listen(Engine, "before_cursor_execute", self._on_query)
+        if self._socketio is None:
+            self._socketio = socketio
+            self._wrap_socketio(socketio)
+
+    def gauge(self, name, callback, help_text):
+        """Déclarer une jauge lue au moment de l'exposition (aucun coût sur le chemin chaud)."""
+        self._gauges[name] = (callback, help_text)
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        """Texte d'exposition Prometheus (version 0.0.4)."""
+        with self._lock:
+            histograms = sorted((key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for name, (callback, help_text) in sorted(self._gauges.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {callback()}")
+        return "\n".join(lines) + "\n"
+
+    # --- HTTP ---
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        self._local.queries = 0
+
+    def _after_request(self, response):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        elapsed = time.perf_counter() - start
+        queries = getattr(self._local, "queries", 0)
+        self._local.queries = None
+        self.observe("http_request_duration_seconds", (("method", request.method), ("route", route)), elapsed)
+        self.observe("http_request_db_queries", (("route", route),), queries, QUERY_BUCKETS)
+        self.inc("http_requests_total", (("method", request.method), ("route", route), ("status", str(response.status_code))))
+        return response
+
+    # --- Socket.IO ---
+
+    def _wrap_socketio(self, socketio):
+        on, emit = socketio.on, socketio.emit
+
+        def instrumented_on(message, namespace=None):
+            register = on(message, namespace)
+
+            def decorator(handler):
+                register(self._wrap_handler(message, handler))
+                return handler
+            return decorator
+
+        @functools.wraps(emit)
+        def instrumented_emit(event_name, *args, **kwargs):
+            room = kwargs.get("to") or kwargs.get("room")
+            kind = room_kind(room)
+            self.inc("socketio_emits_total", (("event", event_name), ("room", kind)))
+            size = self._emit_size(event_name, args)
+            if size:
+                rooms = socketio.server.manager.rooms.get(kwargs.get("namespace") or "/", {}) if socketio.server else {}
+                recipients = len(rooms.get(room, ())) if room is not None else len(socketio.server.environ or ())
+                self.inc("socketio_emitted_bytes_total", (("room", kind),), size * max(recipients, 1))
+            return emit(event_name, *args, **kwargs)
+
+        socketio.on = instrumented_on
+        socketio.emit = instrumented_emit
+
+    def _emit_size(self, event_name, args):
+        """Taille JSON estimée de l'événement : dernière mesure, renouvelée périodiquement."""
+        sample = self._emit_sizes.get(event_name)
+        if sample is not None and sample[0] % EMIT_SIZE_SAMPLE_EVERY:
+            sample[0] += 1
+            return sample[1]
+        try:
+            size = len(json.dumps(args[0] if len(args) == 1 else list(args), separators=(",", ":"), default=str))
+        except (TypeError, ValueError):
+            size = 0
+        self._emit_sizes[event_name] = [1, size]
+        return size
+
+    def _wrap_handler(self, message, handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, "queries", None)
+            self._local.queries = 0
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = handler(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                self.observe("socketio_event_duration_seconds", (("event", message),), elapsed)
+                self.observe("socketio_event_db_queries", (("event", message),), self._local.queries, QUERY_BUCKETS)
+                self.inc("socketio_events_total", (("event", message), ("outcome", outcome)))
+                self._local.queries = previous
+        return wrapper
+
+    # --- SQLAlchemy ---
+
+    def _on_query(self, *args):
+        self.inc("db_queries_total", ())
+        if getattr(self._local, "queries", None) is not None:
+            self._local.queries += 1
+
+
+HELP = {
+    "http_request_duration_seconds": "Durée des requêtes HTTP par route",
+    "http_request_db_queries": "Requêtes SQL par requête HTTP",
+    "http_requests_total": "Requêtes HTTP par route et statut",
+    "socketio_event_duration_seconds": "Durée des gestionnaires d'événements Socket.IO",
+    "socketio_event_db_queries": "Requêtes SQL par événement Socket.IO",
+    "socketio_events_total": "Événements Socket.IO reçus",
+    "socketio_emits_total": "Événements émis par type de salle",
+    "socketio_emitted_bytes_total": "Octets émis estimés (taille JSON échantillonnée × destinataires locaux) par type de salle",
+    "db_queries_total": "Requêtes SQL exécutées"
+}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = Metrics()
@@ -0,0 +1,65 @@
+import bcrypt
+from eventlet import patcher, tpool
+
+
+class PasswordHasher:
+    """Hachage bcrypt hors de la boucle eventlet.
+
+    bcrypt occupe le processeur plusieurs dizaines de millisecondes par appel : exécuté dans
+    le greenlet de la requête, il bloquerait toutes les connexions Socket.IO du worker. Quand
+    les threads sont monkey-patchés (run.py), `hash` et `verify` passent par `eventlet.tpool`,
+    un pool de vrais threads (`PASSWORD_HASH_THREADS`) ; bcrypt y libère le GIL. Le coût est
+    `BCRYPT_ROUNDS` ; un mot de passe haché avec un autre coût est rehaché à la connexion.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.offload = True
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+
+    def init_app(self, app):
+        self.rounds = app.config["BCRYPT_ROUNDS"]
+        self.offload = app.config["PASSWORD_HASH_OFFLOAD"]
+        tpool.set_num_threads(app.config["PASSWORD_HASH_THREADS"])
+
+    def hash(self, password):
+        self.hashed += 1
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds)).decode("utf-8")
+
+    def verify(self, password, hashed):
+        self.verified += 1
+        try:
+            return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            # Valeur stockée qui n'est pas un hachage bcrypt
+            return False
+
+    def needs_rehash(self, hashed):
+        """Le hachage a-t-il été produit avec un autre coût que `BCRYPT_ROUNDS` ?"""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "offload": self.offloading,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed
+        }
+
+    @property
+    def offloading(self):
+        return self.offload and patcher.is_monkey_patched("thread")
+
+    def _run(self, function, *args):
+        if self.offloading:
+            return tpool.execute(function, *args)
+        return function(*args)
+
+
+passwords = PasswordHasher()
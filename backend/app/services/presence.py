@@ -0,0 +1,184 @@
+import threading
+import time
+from app import socketio
+from app.services.broadcast import broadcast
+from app.services.redis_pool import redis_pool
+
+SESSIONS_KEY = "presence:sessions"
+
+
+class Presence:
+    """Spectateurs connectés à chaque session : nombre, membres et événements `presence_update`.
+
+    Chaque worker connaît ses propres connexions (sid -> utilisateur), retirées à la
+    déconnexion : la mémoire reste proportionnelle aux connexions ouvertes. Avec
+    `PRESENCE_BACKEND=redis`, les connexions de tous les workers sont réunies dans un
+    sorted set par session (score = dernier battement de cœur du worker) ; les entrées
+    d'un worker arrêté sans déconnexion expirent après `PRESENCE_TIMEOUT` secondes.
+    Le nombre de spectateurs est diffusé à la salle au plus une fois par intervalle.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.update_interval = 1.0
+        self.heartbeat_interval = 15
+        self.timeout = 45
+        self.members_limit = 500
+        self.redis_url = None
+        self._redis = None
+        self._rooms = {}
+        self._joined = {}
+        self._dirty = set()
+        self._present = {}
+        self._lock = threading.Lock()
+        self._task_started = False
+
+    def init_app(self, app):
+        self.app = app
+        self.update_interval = app.config["PRESENCE_UPDATE_INTERVAL_MS"] / 1000
+        self.heartbeat_interval = app.config["PRESENCE_HEARTBEAT_INTERVAL"]
+        self.timeout = app.config["PRESENCE_TIMEOUT"]
+        self.members_limit = app.config["PRESENCE_MEMBERS_LIMIT"]
+        if app.config["PRESENCE_BACKEND"] == "redis":
+            self.redis_url = app.config["REDIS_URL"]
+
+    @property
+    def redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = redis_pool.client
+        return self._redis
+
+    def join(self, sid, session_id, user_id):
+        """Enregistrer la connexion `sid` d'un spectateur dans la session."""
+        session_id, user_id = int(session_id), int(user_id)
+        with self._lock:
+            self._rooms.setdefault(session_id, {})[sid] = user_id
+            self._joined.setdefault(sid, set()).add(session_id)
+            self._dirty.add(session_id)
+            self._present.pop(session_id, None)
+            start_task = not self._task_started
+            self._task_started = True
+        if self.redis is not None:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(self._key(session_id), {sid: time.time()})
+            pipe.hset(self._users_key(session_id), sid, user_id)
+            pipe.sadd(SESSIONS_KEY, session_id)
+            pipe.execute()
+        if start_task:
+            socketio.start_background_task(self._run)
+
+    def leave(self, sid, session_id):
+        session_id = int(session_id)
+        with self._lock:
+            room = self._rooms.get(session_id)
+            if room is None or room.pop(sid, None) is None:
+                return
+            if not room:
+                del self._rooms[session_id]
+                self._present.pop(session_id, None)
+            joined = self._joined.get(sid)
+            if joined is not None:
+                joined.discard(session_id)
+                if not joined:
+                    del self._joined[sid]
+            self._dirty.add(session_id)
+        if self.redis is not None:
+            self._remove_remote(session_id, [sid])
+
+    def disconnect(self, sid):
+        """Retirer la connexion de toutes les sessions rejointes."""
+        for session_id in list(self._joined.get(sid, ())):
+            self.leave(sid, session_id)
+
+    def count(self, session_id):
+        """Nombre de connexions de spectateurs dans la session (tous workers en mode Redis)."""
+        session_id = int(session_id)
+        if self.redis is not None:
+            return self.redis.zcard(self._key(session_id))
+        return len(self._rooms.get(session_id, ()))
+
+    def members(self, session_id):
+        """Identifiants distincts des spectateurs présents, limités à `PRESENCE_MEMBERS_LIMIT`."""
+        return sorted(self._user_ids(int(session_id)))[:self.members_limit]
+
+    def is_present(self, session_id, user_id):
+        """L'utilisateur a-t-il une connexion dans la session ?
+
+        L'ensemble des présents est gardé un intervalle de publication et relu à chaque
+        absence : un départ peut être vu en retard, une arrivée jamais.
+        """
+        session_id, user_id = int(session_id), int(user_id)
+        now = time.monotonic()
+        cached = self._present.get(session_id)
+        if cached is not None and cached[0] > now and user_id in cached[1]:
+            return True
+        user_ids = self._user_ids(session_id)
+        self._present[session_id] = (now + self.update_interval, user_ids)
+        return user_id in user_ids
+
+    def _user_ids(self, session_id):
+        if self.redis is not None:
+            return {int(value) for value in self.redis.hvals(self._users_key(session_id))}
+        with self._lock:
+            return set(self._rooms.get(session_id, {}).values())
+
+    def publish(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for session_id in dirty:
+            broadcast.emit("presence_update", {"session_id": session_id, "viewers": self.count(session_id)},
+                           str(session_id))
+
+    def heartbeat(self):
+        """Rafraîchir les connexions de ce worker et purger celles des workers disparus."""
+        if self.redis is None:
+            return
+        now = time.time()
+        with self._lock:
+            rooms = {session_id: list(room) for session_id, room in self._rooms.items()}
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id, sids in rooms.items():
+            pipe.zadd(self._key(session_id), dict.fromkeys(sids, now))
+        pipe.execute()
+        for session_id in self.redis.smembers(SESSIONS_KEY):
+            session_id = int(session_id)
+            stale = self.redis.zrangebyscore(self._key(session_id), 0, now - self.timeout)
+            if stale:
+                self._remove_remote(session_id, stale)
+                with self._lock:
+                    self._dirty.add(session_id)
+
+    def stats(self):
+        return {"sessions": len(self._rooms), "connections": len(self._joined)}
+
+    def _remove_remote(self, session_id, sids):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(self._key(session_id), *sids)
+        pipe.hdel(self._users_key(session_id), *sids)
+        pipe.zcard(self._key(session_id))
+        if pipe.execute()[-1] == 0:
+            self.redis.srem(SESSIONS_KEY, session_id)
+
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+        while True:
+            socketio.sleep(self.update_interval)
+            try:
+                self.publish()
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+                    self.heartbeat()
+            except Exception:
+                # Redis injoignable : la présence reprendra au prochain intervalle
+                self.app.logger.exception("Échec de la publication de la présence")
+
+    @staticmethod
+    def _key(session_id):
+        return f"presence:{session_id}"
+
+    @staticmethod
+    def _users_key(session_id):
+        return f"presence:{session_id}:users"
+
+
+presence = Presence()
@@ -0,0 +1,186 @@
+import threading
+from collections import OrderedDict, namedtuple
+from flask import abort
+from sqlalchemy import func
+from app import db, socketio
+from app.models.quiz import Quiz
+from app.models.quiz_response import QuizResponse
+from app.models.session import Session
+from app.services.broadcast import broadcast
+from app.services.presence import presence
+from app.services.redis_pool import redis_pool
+
+QuizMeta = namedtuple("QuizMeta", ["id", "session_id", "professor_id", "options", "correct_answer"])
+
+
+def professor_room(session_id):
+    """Salle ne contenant que le professeur d'une session (rejointe dans `join_session`)."""
+    return f"professor:{session_id}"
+
+
+class QuizTally:
+    """Comptage en direct des réponses aux quiz : O(1) par réponse, instantanés agrégés limités en fréquence.
+
+    Les compteurs par option vivent en mémoire ou dans un hash Redis (`QUIZ_TALLY_BACKEND=redis`)
+    pour être partagés entre les workers. Toutes les `QUIZ_SNAPSHOT_INTERVAL_MS` millisecondes,
+    un instantané `quiz_results` est envoyé au professeur pour chaque quiz ayant reçu des réponses.
+    Chaque utilisateur ne peut répondre qu'une fois par quiz (voir `claim`).
+    """
+
+    def __init__(self, max_quizzes=1000):
+        self.app = None
+        self.max_quizzes = max_quizzes
+        self.interval = 0.25
+        self.redis_url = None
+        self._redis = None
+        self._quizzes = OrderedDict()
+        self._counts = {}
+        self._claims = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._task_started = False
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config["QUIZ_SNAPSHOT_INTERVAL_MS"] / 1000
+        if app.config["QUIZ_TALLY_BACKEND"] == "redis":
+            self.redis_url = app.config["REDIS_URL"]
+
+    @property
+    def redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = redis_pool.client
+        return self._redis
+
+    def register(self, quiz, professor_id):
+        """Déclarer un quiz nouvellement créé (évite toute lecture de la table `quizzes` ensuite)."""
+        meta = QuizMeta(quiz.id, quiz.session_id, professor_id, list(quiz.options), quiz.correct_answer)
+        with self._lock:
+            self._quizzes[quiz.id] = meta
+            self._counts.setdefault(quiz.id, {})
+            self._claims.setdefault(quiz.id, {})
+            while len(self._quizzes) > self.max_quizzes:
+                old_id, _ = self._quizzes.popitem(last=False)
+                self._counts.pop(old_id, None)
+                self._claims.pop(old_id, None)
+                self._dirty.discard(old_id)
+        return meta
+
+    def get_or_404(self, session_id, quiz_id):
+        meta = self._quizzes.get(quiz_id)
+        if meta is None:
+            row = db.session.query(Quiz, Session.professor_id).join(Session, Quiz.session_id == Session.id) \
+                .filter(Quiz.id == quiz_id).first()
+            if row is None:
+                abort(404)
+            meta = self.register(row[0], row[1])
+            self._seed(meta)
+        if meta.session_id != session_id:
+            abort(404)
+        return meta
+
+    def claim(self, quiz_id, user_id, idempotency_key):
+        """Réserver la réponse d'un utilisateur à un quiz.
+
+        Retourne "new" pour une première réponse, "replay" si la même clé d'idempotence
+        a déjà été acceptée (nouvel essai du client) et "duplicate" sinon.
+        """
+        if self.redis is not None:
+            key = f"quiz_claims:{quiz_id}"
+            if self.redis.hsetnx(key, user_id, idempotency_key):
+                self.redis.expire(key, 86400)
+                return "new"
+            stored = self.redis.hget(key, user_id)
+            return "replay" if idempotency_key and stored is not None and stored.decode() == idempotency_key else "duplicate"
+
+        with self._lock:
+            claims = self._claims.setdefault(quiz_id, {})
+            stored = claims.get(user_id)
+            if stored is None:
+                claims[user_id] = idempotency_key
+                return "new"
+        return "replay" if idempotency_key and stored == idempotency_key else "duplicate"
+
+    def release(self, quiz_id, user_id):
+        """Annuler une réservation lorsque la réponse n'a pas pu être mise en file."""
+        if self.redis is not None:
+            self.redis.hdel(f"quiz_claims:{quiz_id}", user_id)
+        else:
+            with self._lock:
+                self._claims.get(quiz_id, {}).pop(user_id, None)
+
+    def record(self, quiz_id, answer):
+        """Comptabiliser une réponse ; l'instantané sera publié au prochain tick."""
+        if self.redis is not None:
+            self.redis.hincrby(f"quiz_tally:{quiz_id}", answer, 1)
+        else:
+            with self._lock:
+                counts = self._counts.setdefault(quiz_id, {})
+                counts[answer] = counts.get(answer, 0) + 1
+        with self._lock:
+            self._dirty.add(quiz_id)
+            start_task = not self._task_started
+            self._task_started = True
+        if start_task:
+            socketio.start_background_task(self._run)
+
+    def snapshot(self, quiz_id):
+        meta = self._quizzes[quiz_id]
+        counts = {option: 0 for option in meta.options}
+        counts.update(self._read_counts(quiz_id))
+        total = sum(counts.values())
+        correct = counts.get(meta.correct_answer, 0)
+        audience = presence.count(meta.session_id)
+        return {
+            "quiz_id": quiz_id,
+            "counts": counts,
+            "total": total,
+            "correct": correct,
+            "percent_correct": round(100.0 * correct / total, 1) if total else 0.0,
+            "audience": audience,
+            "response_rate": round(100.0 * total / audience, 1) if audience else None
+        }
+
+    def publish(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for quiz_id in dirty:
+            meta = self._quizzes.get(quiz_id)
+            if meta is not None:
+                broadcast.emit("quiz_results", self.snapshot(quiz_id), professor_room(meta.session_id))
+
+    def _read_counts(self, quiz_id):
+        if self.redis is not None:
+            return {k.decode(): int(v) for k, v in self.redis.hgetall(f"quiz_tally:{quiz_id}").items()}
+        return dict(self._counts.get(quiz_id, {}))
+
+    def _seed(self, meta):
+        # Démarrage à froid (redémarrage du worker) : reconstruire les compteurs une seule fois
+        if self.redis is not None and self.redis.exists(f"quiz_tally:{meta.id}"):
+            return
+        rows = db.session.query(QuizResponse.answer, func.count(QuizResponse.id)) \
+            .filter_by(quiz_id=meta.id).group_by(QuizResponse.answer).all()
+        counts = {answer: count for answer, count in rows}
+        # Les réponses déjà en base comptent comme réservées (clé d'idempotence inconnue)
+        claims = {user_id: "" for (user_id,) in db.session.query(QuizResponse.user_id).filter_by(quiz_id=meta.id)}
+        if self.redis is not None:
+            if counts:
+                self.redis.hset(f"quiz_tally:{meta.id}", mapping=counts)
+            if claims:
+                self.redis.hset(f"quiz_claims:{meta.id}", mapping=claims)
+        else:
+            with self._lock:
+                self._counts[meta.id] = counts
+                self._claims[meta.id] = claims
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception:
+                # Une erreur ponctuelle (Redis, base) ne doit pas arrêter la boucle
+                self.app.logger.exception("Échec de la publication des résultats de quiz")
+
+
+quiz_tally = QuizTally()
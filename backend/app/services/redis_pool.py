@@ -0,0 +1,391 @@
+import bisect
+import fnmatch
+import threading
+import time
+import redis
+
+try:
+    import fakeredis
+except ImportError:  # dépendance optionnelle : fakeredis[lua] permet aussi d'exécuter les scripts Lua
+    fakeredis = None
+
+
+class RedisPool:
+    """Client Redis unique de l'application, créé au premier usage sur un pool de connexions borné.
+
+    Le pool est bloquant (`REDIS_MAX_CONNECTIONS`) : sous eventlet, un greenlet attend qu'une
+    connexion se libère au lieu d'en ouvrir une nouvelle. Sans `REDIS_URL` (ou avec
+    `REDIS_URL=memory://`), un client en mémoire est utilisé : fakeredis s'il est installé,
+    sinon `MemoryRedis`, ce qui permet de démarrer l'application sans serveur Redis.
+    """
+
+    def __init__(self):
+        self.url = None
+        self.max_connections = 50
+        self.socket_timeout = 2
+        self.pool_timeout = 5
+        self.health_check_interval = 30
+        self._client = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.url = app.config["REDIS_URL"]
+        self.max_connections = app.config["REDIS_MAX_CONNECTIONS"]
+        self.socket_timeout = app.config["REDIS_SOCKET_TIMEOUT"]
+        self.pool_timeout = app.config["REDIS_POOL_TIMEOUT"]
+        self.health_check_interval = app.config["REDIS_HEALTH_CHECK_INTERVAL"]
+        self._client = None
+
+    @property
+    def in_memory(self):
+        return not self.url or self.url.startswith("memory://")
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    def pipeline(self):
+        return self.client.pipeline(transaction=False)
+
+    def health(self):
+        """Vérifier la disponibilité de Redis : (disponible, détails)."""
+        backend = "memory" if self.in_memory else "redis"
+        start = time.perf_counter()
+        try:
+            self.client.ping()
+        except redis.RedisError as e:
+            return False, {"backend": backend, "error": str(e)}
+        details = {"backend": backend, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        pool = getattr(self.client, "connection_pool", None)
+        if not self.in_memory and pool is not None:
+            details["max_connections"] = pool.max_connections
+        return True, details
+
+    def _connect(self):
+        if self.in_memory:
+            return fakeredis.FakeRedis() if fakeredis is not None else MemoryRedis()
+        pool = redis.BlockingConnectionPool.from_url(
+            self.url,
+            max_connections=self.max_connections,
+            timeout=self.pool_timeout,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.socket_timeout,
+            health_check_interval=self.health_check_interval
+        )
+        return redis.Redis(connection_pool=pool)
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).encode()
+
+
+class MemoryRedis:
+    """Sous-ensemble des commandes Redis utilisées par l'application, en mémoire et pour un seul processus.
+
+    Les valeurs sont rendues en `bytes` comme avec redis-py. Les scripts Lua ne sont pas
+    pris en charge : les services qui en dépendent ont leur propre backend mémoire.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    # --- généralités ---
+
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return _MemoryPipeline(self)
+
+    def register_script(self, script):
+        raise redis.RedisError("Scripts Lua non pris en charge en mémoire : configurez REDIS_URL ou installez fakeredis[lua]")
+
+    def _get(self, key, kind=None):
+        key = _encode(key)
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        value = self._data.get(key)
+        if value is not None and kind is not None and type(value) is not kind:
+            raise redis.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _create(self, key, kind):
+        value = self._get(key, kind)
+        if value is None:
+            value = self._data[_encode(key)] = kind()
+        return value
+
+    def _cleanup(self, key):
+        key = _encode(key)
+        if key in self._data and not self._data[key]:
+            self._data.pop(key)
+            self._expires.pop(key, None)
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._get(key) is not None:
+                    removed += 1
+                self._data.pop(_encode(key), None)
+                self._expires.pop(_encode(key), None)
+            return removed
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._get(key) is not None)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expires[_encode(key)] = time.monotonic() + seconds
+            return True
+
+    def ttl(self, key):
+        with self._lock:
+            if self._get(key) is None:
+                return -2
+            expires = self._expires.get(_encode(key))
+            return -1 if expires is None else max(0, round(expires - time.monotonic()))
+
+    def keys(self, pattern="*"):
+        with self._lock:
+            return [key for key in list(self._data) if self._get(key) is not None
+                    and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def flushall(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+        return True
+
+    # --- chaînes ---
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, bytes)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self._data[_encode(key)] = _encode(value)
+            self._expires.pop(_encode(key), None)
+            if ex is not None:
+                self._expires[_encode(key)] = time.monotonic() + ex
+            return True
+
+    def setex(self, key, seconds, value):
+        return self.set(key, value, ex=seconds)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._get(key, bytes) or 0) + amount
+            self._data[_encode(key)] = _encode(value)
+            return value
+
+    # --- hashes ---
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._lock:
+            hash_ = self._create(key, dict)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = 0
+            for item_field, item_value in items.items():
+                added += _encode(item_field) not in hash_
+                hash_[_encode(item_field)] = _encode(item_value)
+            return added
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            hash_ = self._create(key, dict)
+            if _encode(field) in hash_:
+                return False
+            hash_[_encode(field)] = _encode(value)
+            return True
+
+    def hget(self, key, field):
+        with self._lock:
+            return (self._get(key, dict) or {}).get(_encode(field))
+
+    def hmget(self, key, *fields):
+        if len(fields) == 1 and isinstance(fields[0], (list, tuple)):
+            fields = fields[0]
+        with self._lock:
+            hash_ = self._get(key, dict) or {}
+            return [hash_.get(_encode(field)) for field in fields]
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key, dict) or {})
+
+    def hvals(self, key):
+        with self._lock:
+            return list((self._get(key, dict) or {}).values())
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            hash_ = self._get(key, dict) or {}
+            removed = sum(1 for field in fields if hash_.pop(_encode(field), None) is not None)
+            self._cleanup(key)
+            return removed
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            hash_ = self._create(key, dict)
+            value = int(hash_.get(_encode(field), 0)) + amount
+            hash_[_encode(field)] = _encode(value)
+            return value
+
+    # --- ensembles ---
+
+    def sadd(self, key, *members):
+        with self._lock:
+            set_ = self._create(key, set)
+            before = len(set_)
+            set_.update(_encode(member) for member in members)
+            return len(set_) - before
+
+    def srem(self, key, *members):
+        with self._lock:
+            set_ = self._get(key, set) or set()
+            before = len(set_)
+            set_.difference_update(_encode(member) for member in members)
+            self._cleanup(key)
+            return before - len(set_)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._get(key, set) or ())
+
+    def scard(self, key):
+        with self._lock:
+            return len(self._get(key, set) or ())
+
+    # --- ensembles triés (ordre : score puis membre, comme Redis) ---
+
+    def zadd(self, key, mapping, nx=False):
+        with self._lock:
+            zset = self._create(key, _ZSet)
+            added = 0
+            for member, score in mapping.items():
+                member = _encode(member)
+                if member in zset:
+                    if nx:
+                        continue
+                    zset.discard(member)
+                else:
+                    added += 1
+                zset.insert(member, float(score))
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._get(key, _ZSet) or _ZSet()
+            removed = sum(1 for member in members if zset.discard(_encode(member)))
+            self._cleanup(key)
+            return removed
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._get(key, _ZSet) or ())
+
+    def zscore(self, key, member):
+        with self._lock:
+            return (self._get(key, _ZSet) or {}).get(_encode(member))
+
+    def zrank(self, key, member):
+        with self._lock:
+            zset = self._get(key, _ZSet) or _ZSet()
+            member = _encode(member)
+            if member not in zset:
+                return None
+            return bisect.bisect_left(zset.order, (zset[member], member))
+
+    def zrange(self, key, start, end, withscores=False):
+        with self._lock:
+            order = (self._get(key, _ZSet) or _ZSet()).order
+            end = len(order) if end == -1 else end + 1
+            items = [(member, score) for score, member in order[start:end]]
+            return items if withscores else [member for member, _ in items]
+
+    def zrangebyscore(self, key, min, max, withscores=False):
+        with self._lock:
+            order = (self._get(key, _ZSet) or _ZSet()).order
+            low = bisect.bisect_left(order, float(min), key=lambda item: item[0])
+            high = bisect.bisect_right(order, float(max), key=lambda item: item[0])
+            items = [(member, score) for score, member in order[low:high]]
+            return items if withscores else [member for member, _ in items]
+
+    def zpopmin(self, key, count=1):
+        with self._lock:
+            zset = self._get(key, _ZSet) or _ZSet()
+            items = [(member, score) for score, member in zset.order[:count]]
+            for member, _ in items:
+                zset.discard(member)
+            self._cleanup(key)
+            return items
+
+
+class _ZSet(dict):
+    """Membre -> score, avec la liste (score, membre) triée tenue à jour à chaque écriture."""
+
+    def __init__(self):
+        super().__init__()
+        self.order = []
+
+    def insert(self, member, score):
+        self[member] = score
+        bisect.insort(self.order, (score, member))
+
+    def discard(self, member):
+        score = self.pop(member, None)
+        if score is None:
+            return False
+        del self.order[bisect.bisect_left(self.order, (score, member))]
+        return True
+
+
+class _MemoryPipeline:
+    """Pipeline de `MemoryRedis` : les commandes sont rejouées dans l'ordre à `execute()`."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            commands, self._commands = self._commands, []
+            return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands = []
+
+
+redis_pool = RedisPool()
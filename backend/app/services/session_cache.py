@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import namedtuple
+from flask import abort
+from app import db
+from app.models.session import Session, SessionStatus
+from app.services.redis_pool import redis_pool
+
+# Sous-ensemble d'une session suffisant pour les contrôles d'accès et de statut
+SessionState = namedtuple("SessionState", ["id", "professor_id", "status"])
+
+
+class SessionStateCache:
+    """Cache de l'état des sessions (statut, professeur) partagé par les routes et les sockets.
+
+    Les entrées expirent après `SESSION_CACHE_TTL` secondes et sont invalidées explicitement
+    à chaque modification de la session. Avec `SESSION_CACHE_BACKEND=redis`, Redis sert de
+    niveau partagé entre les workers et le cache local est limité à `SESSION_CACHE_LOCAL_TTL`.
+    """
+
+    def __init__(self):
+        self.ttl = 30
+        self.local_ttl = 30
+        self.redis_url = None
+        self._redis = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.ttl = app.config["SESSION_CACHE_TTL"]
+        self.local_ttl = self.ttl
+        if app.config["SESSION_CACHE_BACKEND"] == "redis":
+            self.redis_url = app.config["REDIS_URL"]
+            self.local_ttl = min(self.ttl, app.config["SESSION_CACHE_LOCAL_TTL"])
+
+    @property
+    def redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = redis_pool.client
+        return self._redis
+
+    def get(self, session_id):
+        """Retourner l'état de la session ou None si elle n'existe pas."""
+        try:
+            session_id = int(session_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        entry = self._entries.get(session_id)
+        if entry and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+
+        state = self._get_shared(session_id)
+        if state is not None:
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+            row = db.session.query(Session.id, Session.professor_id, Session.status).filter_by(id=session_id).first()
+            if row is None:
+                return None
+            state = SessionState(row.id, row.professor_id, row.status)
+            self._set_shared(state)
+
+        with self._lock:
+            if len(self._entries) > 1024:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            self._entries[session_id] = (now + self.local_ttl, state)
+        return state
+
+    def get_or_404(self, session_id):
+        state = self.get(session_id)
+        if state is None:
+            abort(404)
+        return state
+
+    def invalidate(self, session_id):
+        """Oublier l'état d'une session après une modification (statut, fin, streaming)."""
+        session_id = int(session_id)
+        with self._lock:
+            self._entries.pop(session_id, None)
+        self.invalidations += 1
+        if self.redis is not None:
+            self.redis.delete(f"session_state:{session_id}")
+
+    def stats(self):
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "backend": "redis" if self.redis_url else "memory"
+        }
+
+    def _get_shared(self, session_id):
+        if self.redis is None:
+            return None
+        data = self.redis.hgetall(f"session_state:{session_id}")
+        if not data:
+            return None
+        return SessionState(session_id, int(data[b"professor_id"]), SessionStatus(data[b"status"].decode()))
+
+    def _set_shared(self, state):
+        if self.redis is None:
+            return
+        key = f"session_state:{state.id}"
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={"professor_id": state.professor_id, "status": state.status.value})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+
+session_cache = SessionStateCache()
@@ -0,0 +1,323 @@
+import atexit
+import heapq
+import json
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import timezone
+from eventlet import patcher, tpool
+from app import db, socketio
+from app.models.session import Session
+from app.services.broadcast import broadcast
+
+# Fermeture des fichiers d'une session sans écriture depuis IDLE_CLOSE_AFTER secondes
+IDLE_SWEEP_INTERVAL = 60
+IDLE_CLOSE_AFTER = 300
+# Index de workers gardés en mémoire pour la relecture (les plus récemment lus)
+INDEX_CACHE_SIZE = 256
+
+# Événements de salle conservés pour la relecture (la présence et les résultats partiels n'y figurent pas)
+JOURNAL_EVENTS = frozenset({
+    "new_comment", "new_hand_request", "hand_granted", "hand_revoked", "stream_switch",
+    "stream_started", "stream_stopped", "new_quiz", "slow_mode", "session_ended"
+})
+
+
+def parse_position(position):
+    """Curseur « offset_ms-n » : n-ième événement (à partir de 0) de l'instant offset_ms."""
+    offset, _, rank = str(position).partition("-")
+    return int(offset), int(rank or 0)
+
+
+class _Writer:
+    """Segments et index d'un worker pour une session : un seul fichier ouvert à la fois.
+
+    Utilisé uniquement sous le verrou de vidage du journal, éventuellement depuis un thread de `tpool`.
+    """
+
+    def __init__(self, directory, segment_bytes, index_interval):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.file = None
+        self.size = 0
+        self.next_index = 0
+        self.last_offset = 0
+        self.last_write = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self.index = open(os.path.join(directory, "index"), "a", encoding="utf-8")
+
+    def write(self, records):
+        """Écrire des (offset, événement, données) puis vider les tampons une seule fois."""
+        if self.index.closed:
+            # Rouvert après une fermeture pour inactivité
+            self.index = open(self.index.name, "a", encoding="utf-8")
+        for offset, event, data in records:
+            # Offsets croissants dans un segment : des greenlets concurrents peuvent arriver dans le désordre
+            offset = max(offset, self.last_offset)
+            line = json.dumps([offset, event, data], separators=(",", ":"), ensure_ascii=False, default=str) + "\n"
+            if self.file is None or self.size >= self.segment_bytes:
+                self._rotate(offset)
+            if offset >= self.next_index:
+                # Entrée d'index clairsemée : (instant, segment, position) toutes les `index_interval` ms
+                self.file.flush()
+                self.index.write(f"{offset} {os.path.basename(self.file.name)} {self.size}\n")
+                self.next_index = offset - offset % self.index_interval + self.index_interval
+            self.file.write(line)
+            self.size += len(line.encode("utf-8"))
+            self.last_offset = offset
+        # Segment avant index : une entrée d'index ne désigne jamais une position pas encore écrite
+        self.file.flush()
+        self.index.flush()
+        self.last_write = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.index.close()
+
+    def _rotate(self, offset):
+        if self.file is not None:
+            self.file.close()
+        # L'ordre des segments est celui de l'index ; le suffixe évite deux segments du même instant
+        path = os.path.join(self.directory, f"{offset:012d}.jsonl")
+        suffix = 0
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(self.directory, f"{offset:012d}.{suffix}.jsonl")
+        self.file = open(path, "a", encoding="utf-8")
+        self.size = 0
+        self.next_index = 0
+
+
+class SessionJournal:
+    """Journal chronologique des événements d'une session, relu par position temporelle.
+
+    Chaque événement de `JOURNAL_EVENTS` diffusé à la salle d'une session (via `broadcast`)
+    est ajouté au journal : une ligne JSON `[offset_ms, événement, données]`, l'offset étant
+    compté depuis `sessions.start_time`. Les lignes s'accumulent dans des segments d'au plus
+    `JOURNAL_SEGMENT_BYTES` octets, et un index clairsemé associe toutes les
+    `JOURNAL_INDEX_INTERVAL_MS` millisecondes un instant à (segment, position). Relire depuis
+    la minute 42 = une recherche dichotomique dans l'index puis une lecture séquentielle.
+
+    `append` ne fait que mettre l'événement en file : les écritures sont groupées toutes les
+    `JOURNAL_FLUSH_INTERVAL_MS` millisecondes par une tâche de fond, dans un thread de
+    `eventlet.tpool` quand les threads sont monkey-patchés (run.py), et jamais dans `broadcast.emit`.
+    Au-delà de `JOURNAL_QUEUE_MAXSIZE` événements en attente, les nouveaux sont abandonnés.
+
+    Chaque worker écrit dans son propre sous-répertoire (`JOURNAL_DIR/<session>/<hôte-pid>`) :
+    la relecture fusionne ces flux déjà triés. Avec plusieurs machines, `JOURNAL_DIR` doit être
+    un volume partagé.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.segment_bytes = 1 << 20
+        self.index_interval = 5000
+        self.flush_interval = 0.2
+        self.max_size = 10000
+        self.writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.app = None
+        self._queue = deque()
+        self._writers = {}
+        self._starts = {}
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task_started = False
+        self._last_sweep = time.monotonic()
+        self.appended = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config["JOURNAL_ENABLED"]
+        self.directory = os.path.join(app.instance_path, app.config["JOURNAL_DIR"])
+        self.segment_bytes = app.config["JOURNAL_SEGMENT_BYTES"]
+        self.index_interval = app.config["JOURNAL_INDEX_INTERVAL_MS"]
+        self.flush_interval = app.config["JOURNAL_FLUSH_INTERVAL_MS"] / 1000
+        self.max_size = app.config["JOURNAL_QUEUE_MAXSIZE"]
+        if self.enabled and self.record not in broadcast.listeners:
+            broadcast.listeners.append(self.record)
+            atexit.register(self.flush, False)
+
+    def record(self, event, data, room):
+        """Écouteur de `broadcast` : ne garde que les événements de salle de session."""
+        if event in JOURNAL_EVENTS and str(room).isdigit():
+            self.append(int(room), event, data)
+
+    def append(self, session_id, event, data, offset_ms=None):
+        """Mettre en file un événement, daté de maintenant ou de `offset_ms` (reprise d'un historique)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_size:
+                # Le journal ne doit jamais ralentir ni empêcher une diffusion
+                self.dropped += 1
+                return
+            self._queue.append((int(session_id), time.time(), offset_ms, event, data))
+            start_task = not self._task_started
+            self._task_started = True
+        if start_task:
+            socketio.start_background_task(self._run)
+
+    def flush(self, offload=True):
+        """Écrire les événements en attente, regroupés par session (un vidage de fichier par session)."""
+        if self.app is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                pending, self._queue = self._queue, deque()
+            batches = {}
+            for session_id, timestamp, offset_ms, event, data in pending:
+                try:
+                    offset = offset_ms if offset_ms is not None else max(0, int((timestamp - self._start_time(session_id)) * 1000))
+                except Exception as e:
+                    self.errors += 1
+                    self.app.logger.warning("Journal de la session %s : %s", session_id, e)
+                    continue
+                batches.setdefault(session_id, []).append((offset, event, data))
+            if batches:
+                if offload and patcher.is_monkey_patched("thread"):
+                    tpool.execute(self._write, batches)
+                else:
+                    self._write(batches)
+            if time.monotonic() - self._last_sweep > IDLE_SWEEP_INTERVAL:
+                self._close_idle()
+
+    def close(self, session_id):
+        """Fin de session : écrire les événements en attente puis fermer les fichiers de ce worker."""
+        self.flush()
+        with self._flush_lock:
+            writer = self._writers.pop(int(session_id), None)
+            self._starts.pop(int(session_id), None)
+            if writer is not None:
+                writer.close()
+
+    def exists(self, session_id):
+        return os.path.isdir(self._session_dir(session_id))
+
+    def replay(self, session_id, start_ms=0, after=None):
+        """Événements (position, offset_ms, événement, données) à partir de `start_ms` ou après le curseur `after`."""
+        # Les événements encore en file font partie de la page demandée
+        self.flush()
+        skip = 0
+        if after is not None:
+            start_ms, rank = parse_position(after)
+            skip = rank + 1
+        session_dir = self._session_dir(session_id)
+        writers = sorted(os.listdir(session_dir)) if os.path.isdir(session_dir) else []
+        streams = [self._read_from(os.path.join(session_dir, writer), start_ms) for writer in writers]
+        current, rank = None, 0
+        for offset, event, data in heapq.merge(*streams, key=lambda record: record[0]):
+            rank = rank + 1 if offset == current else 0
+            current = offset
+            if offset == start_ms and rank < skip:
+                continue
+            yield f"{offset}-{rank}", offset, event, data
+
+    def stats(self):
+        return {
+            "appended": self.appended,
+            "pending": len(self._queue),
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "open_sessions": len(self._writers)
+        }
+
+    def _write(self, batches):
+        for session_id, records in batches.items():
+            try:
+                self._writer(session_id).write(records)
+                self.appended += len(records)
+            except (OSError, TypeError, ValueError) as e:
+                self.errors += len(records)
+                self.app.logger.warning("Journal de la session %s : %s", session_id, e)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Échec de l'écriture du journal des sessions")
+
+    def _read_from(self, directory, start_ms):
+        """Lignes d'un worker dont l'offset est ≥ `start_ms`, en partant de l'entrée d'index qui précède."""
+        offsets, positions = self._index(os.path.join(directory, "index"))
+        if not offsets:
+            return
+        # Dernière entrée strictement antérieure : aucun événement de l'instant `start_ms` n'est sauté
+        entry = max(bisect_left(offsets, start_ms) - 1, 0)
+        segment, position = positions[entry]
+        segments = list(dict.fromkeys(name for name, _ in positions))
+        for name in segments[segments.index(segment):]:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                if name == segment:
+                    f.seek(position)
+                for line in f:
+                    if not line.endswith("\n"):
+                        # Ligne en cours d'écriture par un autre worker
+                        return
+                    offset, event, data = json.loads(line)
+                    if offset >= start_ms:
+                        yield offset, event, data
+
+    def _index(self, path):
+        """Index d'un worker, relu seulement si le fichier a grandi depuis la dernière lecture."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return [], []
+        cached = self._indexes.get(path)
+        if cached is not None and cached[0] == size:
+            self._indexes.move_to_end(path)
+            return cached[1], cached[2]
+        offsets, positions = [], []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3:
+                    offsets.append(int(parts[0]))
+                    positions.append((parts[1], int(parts[2])))
+        self._indexes[path] = (size, offsets, positions)
+        self._indexes.move_to_end(path)
+        while len(self._indexes) > INDEX_CACHE_SIZE:
+            self._indexes.popitem(last=False)
+        return offsets, positions
+
+    def _close_idle(self):
+        """Fermer les fichiers des sessions silencieuses (terminées sur un autre worker, par exemple)."""
+        self._last_sweep = now = time.monotonic()
+        idle = [session_id for session_id, writer in self._writers.items() if now - writer.last_write > IDLE_CLOSE_AFTER]
+        for session_id in idle:
+            self._writers.pop(session_id).close()
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.directory, str(int(session_id)))
+
+    def _start_time(self, session_id):
+        start = self._starts.get(session_id)
+        if start is None:
+            with self.app.app_context():
+                start_time = db.session.query(Session.start_time).filter_by(id=session_id).scalar()
+            start = start_time.replace(tzinfo=timezone.utc).timestamp() if start_time else time.time()
+            self._starts[session_id] = start
+        return start
+
+    def _writer(self, session_id):
+        # Appelé sous le verrou de vidage
+        writer = self._writers.get(session_id)
+        if writer is None:
+            directory = os.path.join(self._session_dir(session_id), self.writer_id)
+            writer = self._writers[session_id] = _Writer(directory, self.segment_bytes, self.index_interval)
+        return writer
+
+
+session_journal = SessionJournal()
@@ -0,0 +1,129 @@
+import redis
+from app.models.session import SessionStatus
+from app.services.broadcast import broadcast
+from app.services.hand_queue import hand_queue
+from app.services.presence import presence
+from app.services.session_cache import session_cache
+from app.services.stream_state import stream_state
+
+MESSAGES = {
+    "offer": ("stream_offer", "Offre SDP invalide"),
+    "answer": ("stream_answer", "Réponse SDP invalide"),
+    "ice": ("ice_candidate", "Candidat ICE invalide")
+}
+# Plusieurs candidats en un seul message : événement distinct, `ice_candidate` garde sa forme historique
+ICE_BATCH_EVENT = "ice_candidates"
+
+
+def peer_room(user_id):
+    """Salle personnelle d'un utilisateur (rejointe à `connect`) : cible des messages WebRTC."""
+    return f"user:{user_id}"
+
+
+class SignalingError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Signaling:
+    """Relais de signalisation WebRTC commun aux routes REST et aux événements Socket.IO.
+
+    Les contrôles ne lisent que le cache d'état des sessions et la présence : aucun accès à
+    la base par message. Une offre vient du professeur ou de l'intervenant qui a la parole ;
+    un message ciblé (`to_user_id`) ne part que vers le professeur ou un présent. Tous les messages passent par la voie immédiate de `broadcast` : un candidat
+    isolé part en `ice_candidate {candidate}`, plusieurs candidats envoyés ensemble
+    (`candidates`, au plus `SIGNALING_MAX_CANDIDATES`) en un seul `ice_candidates`.
+    """
+
+    def __init__(self):
+        self.max_candidates = 50
+        self.relayed = {kind: 0 for kind in MESSAGES}
+        self.candidates = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        self.max_candidates = app.config["SIGNALING_MAX_CANDIDATES"]
+
+    def relay(self, kind, session_id, sender, payload):
+        """Relayer un message `offer`, `answer` ou `ice` de `sender`. Lève `SignalingError`."""
+        payload = payload or {}
+        try:
+            event, data = self._validate(kind, session_id, sender, payload)
+        except SignalingError:
+            self.rejected += 1
+            raise
+        to_user_id = payload.get("to_user_id")
+        room = peer_room(int(to_user_id)) if to_user_id is not None else str(session_id)
+        # Voie immédiate : la négociation ICE ne supporte pas le délai de regroupement
+        broadcast.emit(event, data, room, priority="control")
+        self.relayed[kind] += 1
+        return data
+
+    def stats(self):
+        return {"relayed": dict(self.relayed), "candidates": self.candidates, "rejected": self.rejected}
+
+    def _validate(self, kind, session_id, sender, payload):
+        event, invalid = MESSAGES[kind]
+        if sender is None:
+            raise SignalingError("Utilisateur non trouvé", 401)
+        session = session_cache.get(session_id)
+        if session is None:
+            raise SignalingError("Session non trouvée", 404)
+        if session.status != SessionStatus.ACTIVE:
+            raise SignalingError("Session non active")
+        if payload.get("type", kind) != kind and kind != "ice":
+            raise SignalingError(invalid)
+
+        to_user_id = payload.get("to_user_id")
+        try:
+            to_user_id = int(to_user_id) if to_user_id is not None else None
+        except (TypeError, ValueError):
+            raise SignalingError(invalid)
+        is_professor = sender.id == session.professor_id
+        if to_user_id is None and (kind != "offer" or not is_professor):
+            # Seule l'offre du professeur est diffusée à toute la salle
+            raise SignalingError(invalid if kind != "offer" else "Seul le professeur peut diffuser via WebRTC",
+                                 400 if kind != "offer" else 403)
+        try:
+            if kind == "offer" and not is_professor and not self._has_floor(session.id, sender.id):
+                raise SignalingError("Seul le professeur peut diffuser via WebRTC", 403)
+            if to_user_id is not None and to_user_id != session.professor_id \
+                    and not presence.is_present(session.id, to_user_id):
+                raise SignalingError("Destinataire absent de la session", 404)
+        except redis.RedisError:
+            raise SignalingError("Signalisation indisponible", 503)
+
+        data = {"session_id": session.id, "user_id": sender.id}
+        if kind == "ice":
+            candidates = payload.get("candidates")
+            if candidates is None:
+                if not payload.get("candidate"):
+                    raise SignalingError(invalid)
+                self.candidates += 1
+                data["candidate"] = payload["candidate"]
+                return event, data
+            if not isinstance(candidates, list) or not candidates or len(candidates) > self.max_candidates:
+                raise SignalingError(invalid)
+            self.candidates += len(candidates)
+            data["candidates"] = candidates
+            return ICE_BATCH_EVENT, data
+        else:
+            if not payload.get("sdp"):
+                raise SignalingError(invalid)
+            data.update(sdp=payload["sdp"], type=kind)
+            if kind == "offer":
+                data["user_name"] = sender.name
+        return event, data
+
+    @staticmethod
+    def _has_floor(session_id, user_id):
+        """Main accordée ou intervenant courant du flux."""
+        if hand_queue.granted(session_id) == user_id:
+            return True
+        live = stream_state.get(session_id)
+        return live is not None and live.speaker_id == user_id
+
+
+signaling = Signaling()
@@ -0,0 +1,81 @@
+import functools
+import time
+from collections import namedtuple
+from flask import request
+from flask_jwt_extended import decode_token
+from flask_socketio import disconnect, emit
+from app import socketio
+from app.services.identity_cache import identity_cache
+
+Principal = namedtuple("Principal", ["id", "name", "role", "expires_at"])
+
+
+class SocketAuth:
+    """Principal authentifié par connexion Socket.IO, établi une seule fois à `connect`.
+
+    Les gestionnaires d'événements lisent le principal du `sid` courant au lieu de redécoder
+    le JWT. À l'approche de l'expiration, le client reçoit `token_expiring` et renvoie un
+    jeton via `reauthenticate` ; une fois le jeton expiré, la connexion est fermée.
+    """
+
+    def __init__(self):
+        self.refresh_margin = 60
+        self._principals = {}
+        self._warned = set()
+        self.decodes = 0
+
+    def init_app(self, app):
+        self.refresh_margin = app.config["SOCKET_AUTH_REFRESH_MARGIN"]
+
+    def authenticate(self, sid, token):
+        """Décoder le jeton et l'associer au `sid`. Lève une exception si le jeton est invalide."""
+        if token.startswith("Bearer "):
+            token = token[7:]
+        claims = decode_token(token)
+        self.decodes += 1
+        if claims.get("type") != "access":
+            # Un jeton de rafraîchissement ne sert qu'à /auth/refresh
+            raise ValueError("Jeton d'accès requis")
+        identity = identity_cache.from_claims(claims)
+        principal = Principal(identity.id, identity.name, identity.role, claims.get("exp"))
+        self._principals[sid] = principal
+        self._warned.discard(sid)
+        return principal
+
+    def get(self, sid):
+        """Principal du `sid`, ou None s'il est inconnu ou si son jeton a expiré."""
+        principal = self._principals.get(sid)
+        if principal is None or principal.expires_at is None:
+            return principal
+        remaining = principal.expires_at - time.time()
+        if remaining <= 0:
+            self.evict(sid)
+            return None
+        if remaining <= self.refresh_margin and sid not in self._warned:
+            self._warned.add(sid)
+            socketio.emit("token_expiring", {"expires_in": int(remaining)}, to=sid)
+        return principal
+
+    def current(self):
+        return self.get(request.sid)
+
+    def evict(self, sid):
+        self._principals.pop(sid, None)
+        self._warned.discard(sid)
+
+    def required(self, handler):
+        """Décorateur d'événement : refuser et déconnecter un client sans principal valide."""
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            if self.current() is None:
+                emit("error", {"message": "Authentification requise"})
+                disconnect()
+                return None
+            return handler(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        return {"connections": len(self._principals), "decodes": self.decodes}
+
+
+socket_auth = SocketAuth()
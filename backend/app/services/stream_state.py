@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import namedtuple
+from app import socketio
+from app.models.session import SessionStatus
+from app.services.redis_pool import redis_pool
+from app.services.session_cache import session_cache
+
+ACTIVE_STREAMS_KEY = "streams:active"
+
+
+class StreamState(namedtuple("StreamState", ["session_id", "url", "webrtc_url", "publisher_id", "started_at", "speaker_id"])):
+    __slots__ = ()
+
+    def to_dict(self):
+        # `stream_url` et `m3u8_url` désignent le même flux HLS (noms attendus par les clients existants)
+        return {
+            "session_id": self.session_id,
+            "stream_url": self.url,
+            "m3u8_url": self.url,
+            "webrtc_url": self.webrtc_url,
+            "publisher_id": self.publisher_id,
+            "speaker_id": self.speaker_id,
+            "started_at": self.started_at
+        }
+
+
+class StreamStateStore:
+    """État des diffusions en direct, dont Redis est la source de référence.
+
+    Un hash par session (`stream_state:{id}` : URL HLS, URL WebRTC, diffuseur, début,
+    intervenant courant) est lu en un seul HGETALL à chaque `join_session`, au lieu de
+    relire `sessions.stream_url`. La colonne reste écrite au démarrage et à l'arrêt comme
+    trace durable. Tant que la session est active, le TTL est prolongé toutes les
+    `STREAM_STATE_TTL / 3` secondes ; une diffusion jamais arrêtée expire donc d'elle-même.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.ttl = 3600
+        self._lock = threading.Lock()
+        self._task_started = False
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config["STREAM_STATE_TTL"]
+
+    def start(self, session_id, url, webrtc_url, publisher_id):
+        session_id = int(session_id)
+        started_at = time.time()
+        pipe = redis_pool.pipeline()
+        pipe.hset(self._key(session_id), mapping={
+            "url": url,
+            "webrtc_url": webrtc_url,
+            "publisher_id": publisher_id,
+            "started_at": started_at,
+            "speaker_id": publisher_id
+        })
+        pipe.expire(self._key(session_id), self.ttl)
+        pipe.sadd(ACTIVE_STREAMS_KEY, session_id)
+        pipe.execute()
+        with self._lock:
+            start_task = not self._task_started
+            self._task_started = True
+        if start_task:
+            socketio.start_background_task(self._run)
+        return StreamState(session_id, url, webrtc_url, int(publisher_id), started_at, int(publisher_id))
+
+    def get(self, session_id):
+        """État de la diffusion en un seul aller-retour, ou None si aucun flux n'est en direct."""
+        values = redis_pool.client.hgetall(self._key(int(session_id)))
+        if not values:
+            return None
+        values = {key.decode(): value.decode() for key, value in values.items()}
+        return StreamState(
+            int(session_id),
+            values.get("url"),
+            values.get("webrtc_url"),
+            int(values["publisher_id"]),
+            float(values["started_at"]),
+            int(values["speaker_id"])
+        )
+
+    def set_speaker(self, session_id, user_id):
+        """Enregistrer l'intervenant courant après un `stream_switch` (sans effet hors diffusion)."""
+        key = self._key(int(session_id))
+        if not redis_pool.client.exists(key):
+            return False
+        pipe = redis_pool.pipeline()
+        pipe.hset(key, "speaker_id", int(user_id))
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return True
+
+    def stop(self, session_id):
+        pipe = redis_pool.pipeline()
+        pipe.delete(self._key(int(session_id)))
+        pipe.srem(ACTIVE_STREAMS_KEY, int(session_id))
+        pipe.execute()
+
+    def refresh(self):
+        """Prolonger le TTL des diffusions dont la session est encore active, arrêter les autres."""
+        live, ended = [], []
+        for member in redis_pool.client.smembers(ACTIVE_STREAMS_KEY):
+            session_id = int(member)
+            state = session_cache.get(session_id)
+            (live if state and state.status == SessionStatus.ACTIVE else ended).append(session_id)
+        pipe = redis_pool.pipeline()
+        for session_id in live:
+            pipe.expire(self._key(session_id), self.ttl)
+        for session_id in ended:
+            pipe.delete(self._key(session_id))
+            pipe.srem(ACTIVE_STREAMS_KEY, session_id)
+        pipe.execute()
+        return len(live), len(ended)
+
+    def _run(self):
+        while True:
+            socketio.sleep(max(1, self.ttl / 3))
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception:
+                # Le TTL laisse une marge de deux intervalles : la prochaine prolongation rattrape celle-ci
+                self.app.logger.exception("Échec de la prolongation des diffusions en direct")
+
+    @staticmethod
+    def _key(session_id):
+        return f"stream_state:{session_id}"
+
+
+stream_state = StreamStateStore()
@@ -0,0 +1,53 @@
+import time
+import redis
+from flask import current_app
+from app import jwt
+from app.services.redis_pool import redis_pool
+
+
+class TokenBlocklist:
+    """Jetons de rafraîchissement révoqués (déconnexion), partagés par tous les workers.
+
+    Le `jti` d'un jeton révoqué est gardé dans Redis jusqu'à l'expiration du jeton, après
+    laquelle il serait de toute façon refusé. Seuls les jetons de rafraîchissement sont
+    vérifiés : les jetons d'accès, courts (`JWT_ACCESS_TOKEN_EXPIRES`), restent sans aller-retour
+    Redis sur les routes et à la connexion Socket.IO.
+    """
+
+    def __init__(self):
+        self.revoked = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        jwt.token_in_blocklist_loader(self._is_blocklisted)
+
+    def revoke(self, claims):
+        """Révoquer le jeton décodé `claims` pour sa durée de validité restante."""
+        ttl = int(claims["exp"] - time.time()) + 1 if claims.get("exp") else None
+        if ttl is not None and ttl <= 0:
+            return
+        redis_pool.client.set(self._key(claims["jti"]), 1, ex=ttl)
+        self.revoked += 1
+
+    def stats(self):
+        return {"revoked": self.revoked, "rejected": self.rejected}
+
+    def _is_blocklisted(self, jwt_header, jwt_payload):
+        if jwt_payload.get("type") != "refresh":
+            return False
+        try:
+            blocked = redis_pool.client.exists(self._key(jwt_payload["jti"])) > 0
+        except redis.RedisError as e:
+            # Révocation invérifiable : refuser, le client se reconnecte par mot de passe
+            current_app.logger.warning("Liste de révocation indisponible : %s", e)
+            blocked = True
+        if blocked:
+            self.rejected += 1
+        return blocked
+
+    @staticmethod
+    def _key(jti):
+        return f"revoked_token:{jti}"
+
+
+token_blocklist = TokenBlocklist()
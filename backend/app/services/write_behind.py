@@ -0,0 +1,152 @@
+import atexit
+import threading
+from collections import deque
+from sqlalchemy import func
+from sqlalchemy.exc import DataError, IntegrityError
+from app import db, socketio
+from app.models.comment import Comment
+from app.models.quiz_response import QuizResponse
+from app.services.redis_pool import redis_pool
+
+# Séquence d'identifiants partagée par les workers, amorcée sur le plus grand id en base
+ID_SEQUENCE_KEY = "id_seq:{}"
+
+
+class WriteBehindBuffer:
+    """Tampon d'écriture différée : les lignes sont acceptées immédiatement puis insérées par lots.
+
+    Le vidage a lieu toutes les `<PREFIX>_FLUSH_INTERVAL_MS` millisecondes ou dès que
+    `<PREFIX>_FLUSH_BATCH_SIZE` lignes sont en attente. Au-delà de `<PREFIX>_QUEUE_MAXSIZE`
+    lignes, `submit` refuse les nouvelles entrées (contre-pression).
+    """
+
+    def __init__(self, model, config_prefix):
+        self.model = model
+        self.config_prefix = config_prefix
+        self.app = None
+        self.flush_interval = 0.2
+        self.batch_size = 500
+        self.max_size = 10000
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task_started = False
+        self._flush_scheduled = False
+        self.flushed = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config[f"{self.config_prefix}_FLUSH_INTERVAL_MS"] / 1000
+        self.batch_size = app.config[f"{self.config_prefix}_FLUSH_BATCH_SIZE"]
+        self.max_size = app.config[f"{self.config_prefix}_QUEUE_MAXSIZE"]
+        atexit.register(self.flush)
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def reserve_id(self):
+        """Réserver l'identifiant d'une ligne avant son insertion, pour le diffuser tout de suite."""
+        client = redis_pool.client
+        key = ID_SEQUENCE_KEY.format(self.model.__tablename__)
+        if not client.exists(key):
+            # Clé absente (premier usage ou Redis vidé) : partir du plus grand id écrit ou encore en file
+            last = db.session.query(func.max(self.model.id)).scalar() or 0
+            with self._lock:
+                pending = max((row.get("id") or 0 for row in self._queue), default=0)
+            client.set(key, max(last, pending), nx=True)
+        return client.incr(key)
+
+    def submit(self, row):
+        """Mettre une ligne en file. Retourne False si la file est pleine."""
+        with self._lock:
+            if len(self._queue) >= self.max_size:
+                self.rejected += 1
+                return False
+            self._queue.append(row)
+            size = len(self._queue)
+            start_task = not self._task_started
+            self._task_started = True
+            schedule_flush = size >= self.batch_size and not self._flush_scheduled
+            if schedule_flush:
+                self._flush_scheduled = True
+
+        if start_task:
+            socketio.start_background_task(self._run)
+        if schedule_flush:
+            socketio.start_background_task(self._scheduled_flush)
+        return True
+
+    def flush(self):
+        """Écrire toutes les lignes en attente (appelé aussi à la fin d'une session)."""
+        if self.app is None:
+            return
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return
+                with self.app.app_context():
+                    try:
+                        self._write(batch)
+                        db.session.commit()
+                        self.flushed += len(batch)
+                    except (IntegrityError, DataError):
+                        # Lot invalide : insérer ligne par ligne pour ne perdre que les lignes fautives
+                        db.session.rollback()
+                        if not self._insert_one_by_one(batch):
+                            return
+                    except Exception:
+                        # Erreur transitoire : remettre le lot en tête de file pour le prochain passage
+                        db.session.rollback()
+                        self._requeue(batch)
+                        self.app.logger.exception("Échec du vidage de %s", self.model.__tablename__)
+                        return
+
+    def _write(self, batch):
+        db.session.bulk_insert_mappings(self.model, batch)
+
+    def _insert_one_by_one(self, batch):
+        """Insérer ligne par ligne. Retourne False si une erreur transitoire a interrompu le lot."""
+        for index, row in enumerate(batch):
+            try:
+                self._write([row])
+                db.session.commit()
+                self.flushed += 1
+            except (IntegrityError, DataError):
+                db.session.rollback()
+                self.dropped += 1
+                self.app.logger.warning("Ligne %s rejetée par la base : %r", self.model.__tablename__, row)
+            except Exception:
+                # Erreur transitoire : les lignes non écrites repartent en tête de file
+                db.session.rollback()
+                self._requeue(batch[index:])
+                self.app.logger.exception("Échec du vidage de %s", self.model.__tablename__)
+                return False
+        return True
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._queue.extendleft(reversed(rows))
+
+    def _scheduled_flush(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flush_scheduled = False
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Échec de la boucle de vidage de %s", self.model.__tablename__)
+
+
+comment_buffer = WriteBehindBuffer(Comment, "COMMENT")
+quiz_response_buffer = WriteBehindBuffer(QuizResponse, "QUIZ_RESPONSE")
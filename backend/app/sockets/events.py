@@ -1,177 +1,284 @@
+import redis
 from datetime import datetime
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import disconnect, emit, join_room, leave_room
 from app import socketio, db
 from app.models.user import User, UserRole
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import current_app, request
 from app.models.session import Session, SessionStatus
-from app.models.hand_request import HandRequest, HandStatus
-from app.models.comment import Comment
+from app.services.active_sessions import active_sessions
+from app.services.broadcast import broadcast
+from app.services.chat_limiter import chat_limiter
+from app.services.compact_events import SCHEMA_VERSION, compact_events
+from app.services.hand_queue import hand_queue
+from app.services.identity_cache import identity_cache
+from app.services.presence import presence
+from app.services.quiz_tally import professor_room
+from app.services.session_cache import session_cache
+from app.services.session_journal import session_journal
+from app.services.signaling import SignalingError, peer_room, signaling
+from app.services.socket_auth import socket_auth
+from app.services.stream_state import stream_state
+from app.services.write_behind import comment_buffer, quiz_response_buffer
 
 @socketio.on("connect")
-@jwt_required()
-def handle_connect():
-    """Gérer la connexion d’un client WebSocket."""
-    current_user = get_jwt_identity()
-    emit("connection_response", {"message": f"User {current_user} connected"})
+def handle_connect(auth):
+    """Gérer la connexion d’un client WebSocket : le jeton n'est décodé qu'une fois, ici."""
+    if not auth or "token" not in auth:
+        raise ConnectionRefusedError("Missing token")
+    try:
+        principal = socket_auth.authenticate(request.sid, auth["token"])
+    except Exception:
+        raise ConnectionRefusedError("Invalid token")
+    join_room(peer_room(principal.id))
+    emit("connection_response", {"message": f"User {principal.id} connected"})
+    if compact_events.negotiate(request.sid, auth) == "compact":
+        emit("schema", {"schema": "compact", "version": SCHEMA_VERSION})
+
+@socketio.on("reauthenticate")
+def handle_reauthenticate(data):
+    """Remplacer le jeton d'une connexion ouverte avant son expiration (`token_expiring`)."""
+    try:
+        principal = socket_auth.authenticate(request.sid, (data or {}).get("token") or "")
+    except Exception:
+        emit("error", {"message": "Jeton invalide"})
+        socket_auth.evict(request.sid)
+        disconnect()
+        return
+    emit("reauthenticated", {"expires_at": principal.expires_at})
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    """Libérer la présence et le principal de la connexion."""
+    presence.disconnect(request.sid)
+    socket_auth.evict(request.sid)
+    compact_events.forget(request.sid)
 
 @socketio.on("join_session")
-@jwt_required()
+@socket_auth.required
 def join_session(data):
     """Rejoindre une session pour recevoir des mises à jour en temps réel."""
     session_id = data.get("session_id")
-    session = Session.query.get_or_404(session_id)
-
-    join_room(str(session_id))
-    emit("session_joined", {
-        "message": f"Joined session {session_id}",
-        "stream_url": session.stream_url
-    }, to=request.sid)
+    if not session_id:
+        emit("error", {"message": "session_id manquant"})
+        return
+    principal = socket_auth.current()
+    join_room(compact_events.session_room(request.sid, session_id))
+    session = session_cache.get(session_id)
+    if session and session.professor_id == principal.id:
+        join_room(professor_room(session_id))
+    else:
+        presence.join(request.sid, session_id, principal.id)
+    # Une seule lecture Redis : l'état du flux n'est pas relu dans la table sessions
+    try:
+        live = stream_state.get(session_id)
+    except redis.RedisError as e:
+        # Redis injoignable : la session est rejointe sans l'état du flux (`stream_started` suivra)
+        current_app.logger.warning("État du flux de la session %s indisponible : %s", session_id, e)
+        live = None
+    if live:
+        emit("session_joined", live.to_dict(), to=request.sid)
 
 @socketio.on("leave_session")
-@jwt_required()
+@socket_auth.required
 def leave_session(data):
     """Quitter une session."""
     session_id = data.get("session_id")
-    leave_room(str(session_id))
-    emit("session_left", {"message": f"Left session {session_id}"}, to=str(session_id))
+    leave_room(compact_events.session_room(request.sid, session_id))
+    presence.leave(request.sid, session_id)
+    broadcast.emit("session_left", {"message": f"Left session {session_id}"}, str(session_id))
 
 @socketio.on("post_comment")
-@jwt_required()
+@socket_auth.required
 def handle_post_comment(data):
     """Émettre un commentaire en temps réel à tous les participants de la session."""
     session_id = data.get("session_id")
     content = data.get("content")
-    current_user = get_jwt_identity()
-    user = User.query.get(int(current_user))
-    session = Session.query.get_or_404(session_id)
+    if not session_id or not content:
+        return
+    user = socket_auth.current()
+    session = session_cache.get(session_id)
 
-    if session.status != SessionStatus.ACTIVE:
+    if not session or session.status != SessionStatus.ACTIVE:
         emit("error", {"message": "Session non active"})
         return
 
-    comment = Comment(session_id=session_id, user_id=user.id, content=content)
-    db.session.add(comment)
-    db.session.commit()
+    if user.id != session.professor_id:
+        rejected = chat_limiter.check(session_id, user.id)
+        if rejected:
+            emit("error", {
+                "message": "Trop de messages, veuillez patienter",
+                "reason": rejected,
+                "retry_after": chat_limiter.retry_after(session_id)
+            })
+            return
 
-    emit("new_comment", {
-        "id": comment.id,
-        "content": comment.content,
+    # Diffusion immédiate avec un id réservé, l'insertion en base est différée et groupée
+    try:
+        comment_id = comment_buffer.reserve_id()
+    except redis.RedisError:
+        current_app.logger.exception("Réservation d'un id de commentaire impossible")
+        emit("error", {"message": "Commentaire non envoyé, veuillez réessayer"})
+        return
+    created_at = datetime.utcnow()
+    if not comment_buffer.submit({
+        "id": comment_id,
+        "session_id": session.id,
+        "user_id": user.id,
+        "content": content,
+        "created_at": created_at
+    }):
+        emit("error", {"message": "Trop de messages, veuillez réessayer"})
+        return
+
+    broadcast.emit("new_comment", {
+        "id": comment_id,
+        "content": content,
         "user_name": user.name,
-        "created_at": comment.created_at.isoformat()
-    }, room=str(session_id))
+        "created_at": created_at.isoformat()
+    }, str(session_id))
 
 @socketio.on("raise_hand")
-@jwt_required()
+@socket_auth.required
 def handle_raise_hand(data):
     """Émettre une demande de main en temps réel au professeur."""
     session_id = data.get("session_id")
-    current_user = get_jwt_identity()
-    user = User.query.get(int(current_user))
-    session = Session.query.get_or_404(session_id)
+    user = socket_auth.current()
+    session = session_cache.get_or_404(session_id)
 
     if user.role == UserRole.PROFESSOR or session.status != SessionStatus.ACTIVE:
         emit("error", {"message": "Requête invalide"})
         return
 
-    hand_request = HandRequest(session_id=session_id, user_id=user.id, status=HandStatus.PENDING)
-    db.session.add(hand_request)
-    db.session.commit()
+    added, position = hand_queue.enqueue(session_id, user.id)
+    if not added:
+        emit("error", {"message": "Vous avez déjà levé la main", "position": position})
+        return
 
-    emit("new_hand_request", {
-        "id": hand_request.id,
+    emit("hand_position", {"session_id": session_id, "position": position})
+    broadcast.emit("new_hand_request", {
         "user_id": user.id,
         "user_name": user.name,
-        "requested_at": hand_request.requested_at.isoformat()
-    }, room=str(session_id), to=str(session.professor_id))
+        "requested_at": datetime.utcnow().isoformat(),
+        "position": position
+    }, professor_room(session_id))
 
 @socketio.on("grant_hand")
-@jwt_required()
+@socket_auth.required
 def handle_grant_hand(data):
-    """Émettre un événement lorsque la main est accordée et basculer le flux vidéo."""
+    """Émettre un événement lorsque la main est accordée et basculer le flux vidéo.
+
+    Sans `user_id` (ni `request_id` historique), la main revient au premier de la file.
+    """
     session_id = data.get("session_id")
-    request_id = data.get("request_id")
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    current_user = socket_auth.current()
+    session = session_cache.get_or_404(session_id)
 
-    if session.professor_id != int(current_user):
+    if session.professor_id != current_user.id:
         emit("error", {"message": "Seul le professeur peut accorder la main"})
         return
 
-    hand_request = HandRequest.query.get_or_404(request_id)
-    if hand_request.session_id != session_id or hand_request.status != HandStatus.PENDING:
+    granted, previous = hand_queue.grant(session_id, hand_queue.requested_user(session_id, data))
+    if granted is None:
         emit("error", {"message": "Requête invalide"})
         return
 
-    current_granted = HandRequest.query.filter_by(session_id=session_id, status=HandStatus.GRANTED).first()
-    if current_granted:
-        current_granted.status = HandStatus.REVOKED
-        db.session.commit()
-        emit("stream_switch", {"user_id": session.professor_id, "message": "Retour au flux du professeur"}, room=str(session_id))
-
-    hand_request.status = HandStatus.GRANTED
-    hand_request.granted_at = datetime.utcnow()
-    db.session.commit()
-
-    emit("hand_granted", {
-        "request_id": hand_request.id,
-        "user_id": hand_request.user_id,
-        "user_name": hand_request.user.name
-    }, room=str(session_id))
-    emit("stream_switch", {
-        "user_id": hand_request.user_id,
+    stream_state.set_speaker(session_id, granted)
+    if previous is not None:
+        broadcast.emit("stream_switch", {"user_id": session.professor_id, "message": "Retour au flux du professeur"}, str(session_id))
+    broadcast.emit("hand_granted", {
+        "user_id": granted,
+        "user_name": identity_cache.name(granted)
+    }, str(session_id))
+    broadcast.emit("stream_switch", {
+        "user_id": granted,
         "message": "Basculement vers le flux du spectateur"
-    }, room=str(session_id))
+    }, str(session_id))
 
 @socketio.on("revoke_hand")
-@jwt_required()
+@socket_auth.required
 def handle_revoke_hand(data):
     """Émettre un événement lorsque la main est révoquée et revenir au flux du professeur."""
     session_id = data.get("session_id")
-    request_id = data.get("request_id")
-    current_user = get_jwt_identity()
-    session = Session.query.get_or_404(session_id)
+    current_user = socket_auth.current()
+    session = session_cache.get_or_404(session_id)
 
-    if session.professor_id != int(current_user):
+    if session.professor_id != current_user.id:
         emit("error", {"message": "Seul le professeur peut révoquer la main"})
         return
 
-    hand_request = HandRequest.query.get_or_404(request_id)
-    if hand_request.session_id != session_id or hand_request.status != HandStatus.GRANTED:
+    revoked = hand_queue.revoke(session_id, hand_queue.requested_user(session_id, data))
+    if revoked is None:
         emit("error", {"message": "Requête invalide"})
         return
 
-    hand_request.status = HandStatus.REVOKED
-    db.session.commit()
-
-    emit("hand_revoked", {
-        "request_id": hand_request.id,
-        "user_id": hand_request.user_id,
-        "user_name": hand_request.user.name
-    }, room=str(session_id))
-    emit("stream_switch", {
+    stream_state.set_speaker(session_id, session.professor_id)
+    broadcast.emit("hand_revoked", {
+        "user_id": revoked,
+        "user_name": identity_cache.name(revoked)
+    }, str(session_id))
+    broadcast.emit("stream_switch", {
         "user_id": session.professor_id,
         "message": "Retour au flux du professeur"
-    }, room=str(session_id))
+    }, str(session_id))
 
 @socketio.on("end_session")
-@jwt_required()
+@socket_auth.required
 def handle_end_session(data):
     """Émettre un événement lorsque la session se termine et arrêter le streaming."""
     session_id = data.get("session_id")
-    current_user = get_jwt_identity()
+    current_user = socket_auth.current()
     session = Session.query.get_or_404(session_id)
 
-    if session.professor_id != int(current_user):
+    if session.professor_id != current_user.id:
         emit("error", {"message": "Seul le professeur peut terminer la session"})
         return
+    if session.status == SessionStatus.ENDED:
+        emit("error", {"message": "Session déjà terminée"})
+        return
+
+    # Garantir que tous les commentaires et réponses de la session sont persistés avant la clôture
+    comment_buffer.flush()
+    quiz_response_buffer.flush()
 
     session.status = SessionStatus.ENDED
     session.end_time = datetime.utcnow()
     session.stream_url = None
     db.session.commit()
+    session_cache.invalidate(session_id)
+    active_sessions.invalidate()
+    hand_queue.clear(session_id)
+    stream_state.stop(session_id)
 
-    emit("session_ended", {
+    broadcast.emit("session_ended", {
         "session_id": session_id,
         "title": session.title
-    }, room=str(session_id))
-    emit("stream_stopped", {"message": "Session terminée, streaming arrêté"}, room=str(session_id))
\ No newline at end of file
+    }, str(session_id))
+    broadcast.emit("stream_stopped", {"message": "Session terminée, streaming arrêté"}, str(session_id))
+    session_journal.close(session_id)
+
+def _relay_signal(kind, data):
+    """Relayer un message WebRTC ; l'accusé de réception indique le résultat à l'émetteur."""
+    try:
+        signaling.relay(kind, (data or {}).get("session_id"), socket_auth.current(), data)
+    except SignalingError as e:
+        emit("error", {"message": e.message})
+        return {"ok": False, "message": e.message}
+    return {"ok": True}
+
+@socketio.on("signal_offer")
+@socket_auth.required
+def handle_signal_offer(data):
+    """Offre SDP : à toute la salle (professeur) ou à un pair (`to_user_id`)."""
+    return _relay_signal("offer", data)
+
+@socketio.on("signal_answer")
+@socket_auth.required
+def handle_signal_answer(data):
+    """Réponse SDP, envoyée à la salle personnelle du pair."""
+    return _relay_signal("answer", data)
+
+@socketio.on("signal_ice")
+@socket_auth.required
+def handle_signal_ice(data):
+    """Candidats ICE groupés (`candidates`) ou isolé (`candidate`), envoyés au pair."""
+    return _relay_signal("ice", data)
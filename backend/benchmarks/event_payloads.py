@@ -0,0 +1,111 @@
+"""Taille et coût d'encodage des événements Socket.IO : JSON actuel contre schéma compact et msgpack.
+
+Chaque scénario reprend une diffusion réelle (lot de commentaires d'une salle chargée,
+commentaire seul, quiz, démarrage du flux, présence) et l'encode tel qu'il part sur le fil,
+avec les classes de paquets de python-socketio :
+
+* JSON : charge actuelle, paquet texte ;
+* JSON compact : `compact_events` (clés courtes, horodatages entiers, noms internés) ;
+* msgpack et msgpack compact : mêmes charges avec `SOCKETIO_SERIALIZER=msgpack`,
+  mesurés seulement si le paquet optionnel `msgpack` est installé.
+
+Le coût d'encodage compte la transformation compacte, faite une fois par salle et non par
+client. Le script échoue si le schéma compact n'est pas plus petit que le JSON actuel.
+
+    python benchmarks/event_payloads.py --batch 50 --users 20
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("REDIS_URL", "memory://")
+    from socketio import packet
+    from app.services.compact_events import encode_batch, encode_event, msgpack
+
+    packet_classes = {"json": packet.Packet}
+    if msgpack is not None:
+        from socketio.msgpack_packet import MsgPackPacket
+        packet_classes["msgpack"] = MsgPackPacket
+
+    now = datetime.utcnow()
+    comments = [
+        ("new_comment", {
+            "id": 1000 + i,
+            "user_name": f"Spectateur numéro {i % args.users}",
+            "content": "Est-ce que la formule s'applique aussi au cas discret ?",
+            "created_at": (now + timedelta(milliseconds=37 * i)).isoformat()
+        })
+        for i in range(args.batch)
+    ]
+    scenarios = {
+        f"lot de {args.batch} commentaires": ("batch", comments),
+        "commentaire seul": ("single", comments[:1]),
+        "nouveau quiz": ("single", [("new_quiz", {
+            "quiz_id": 4812, "session_id": 317, "question": "Quelle est la dérivée de x² ?",
+            "options": ["x", "2x", "x²", "2"], "created_at": now.isoformat()
+        })]),
+        "flux démarré": ("single", [("session_joined", {
+            "session_id": 317, "stream_url": "http://srs.example:8080/live/317.m3u8",
+            "m3u8_url": "http://srs.example:8080/live/317.m3u8",
+            "webrtc_url": "webrtc://srs.example/live/317", "publisher_id": 12,
+            "speaker_id": 12, "started_at": time.time()
+        })]),
+        "présence": ("single", [("presence_update", {"session_id": 317, "viewers": 1843})])
+    }
+
+    def full_frame(kind, events):
+        if kind == "batch":
+            return "batch", {"events": [{"event": event, "data": data} for event, data in events]}
+        return events[0]
+
+    def compact_frame(kind, events):
+        if kind == "batch":
+            return "batch", encode_batch([(event, encode_event(data)) for event, data in events])
+        return events[0][0], encode_event(events[0][1])
+
+    def measure(packet_class, build, kind, events):
+        """(octets, µs par trame) : construction de la charge puis encodage du paquet."""
+        def run():
+            event, data = build(kind, events)
+            return packet_class(packet.EVENT, data=[event, data], namespace="/").encode()
+        encoded = run()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run()
+        elapsed = (time.perf_counter() - start) / args.repeat * 1e6
+        return len(encoded.encode("utf-8") if isinstance(encoded, str) else encoded), elapsed
+
+    variants = [(f"{name}{' compact' if compact else ''}", packet_class, compact_frame if compact else full_frame)
+                for name, packet_class in packet_classes.items() for compact in (False, True)]
+    header = f"{'scénario':<28}" + "".join(f"{name:>24}" for name, _, _ in variants)
+    print(header)
+    print(f"{'':<28}" + "".join(f"{'octets':>12}{'µs':>12}" for _ in variants))
+    failures = []
+    for label, (kind, events) in scenarios.items():
+        results = [measure(packet_class, build, kind, events) for _, packet_class, build in variants]
+        print(f"{label:<28}" + "".join(f"{size:>12}{cost:>12.1f}" for size, cost in results))
+        if results[1][0] >= results[0][0]:
+            failures.append(f"{label} : compact {results[1][0]} octets contre {results[0][0]}")
+    if msgpack is None:
+        print("msgpack n'est pas installé : colonnes msgpack omises (pip install msgpack)")
+
+    if failures:
+        print("échec : " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
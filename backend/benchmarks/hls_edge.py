@@ -0,0 +1,139 @@
+"""Relais HLS face à une origine locale simulée : une requête à l'origine par segment.
+
+Une origine HLS minimale (http.server) publie une playlist glissante dont le segment
+avance toutes les `--target-duration` secondes et compte les requêtes reçues. `--clients`
+lecteurs interrogent ensuite `/sessions/<id>/playlist.m3u8` en boucle pendant `--duration`
+secondes. Le script échoue si l'origine reçoit plus d'une requête par intervalle de segment,
+si une réponse n'est pas servie, si les segments ne pointent pas vers le CDN ou si une
+requête conditionnelle ne renvoie pas 304.
+
+    python benchmarks/hls_edge.py --clients 200 --duration 10 --target-duration 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CDN_PREFIX = "https://cdn.example.test/hls"
+
+
+def start_origin(target_duration, latency):
+    """Démarrer l'origine simulée sur un port libre : (serveur, compteur de requêtes)."""
+    counter = {"requests": 0}
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    class Origin(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                counter["requests"] += 1
+            # Latence de l'origine : c'est pendant cet appel que les requêtes se regroupent
+            time.sleep(latency)
+            sequence = int((time.monotonic() - started) / target_duration)
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target_duration}",
+                     f"#EXT-X-MEDIA-SEQUENCE:{sequence}"]
+            for number in range(sequence, sequence + 3):
+                lines += [f"#EXTINF:{target_duration}.000,", f"session_1-{number}.ts"]
+            body = ("\n".join(lines) + "\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Origin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--target-duration", type=int, default=2)
+    parser.add_argument("--origin-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    origin, counter = start_origin(args.target_duration, args.origin_latency)
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        HLS_EDGE_ENABLED="1",
+        HLS_ORIGIN_URL=f"http://127.0.0.1:{origin.server_port}/hls",
+        HLS_CDN_PREFIX=CDN_PREFIX
+    )
+
+    from app import create_app, db
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.hls_edge import hls_edge
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        professor = User(email="prof@bench", password="-", name="Prof", role=UserRole.PROFESSOR)
+        db.session.add(professor)
+        db.session.commit()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+
+    url = f"/sessions/{session_id}/playlist.m3u8"
+    results = {"ok": 0, "errors": 0, "not_cdn": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def viewer():
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            response = client.get(url)
+            segments = [line for line in response.data.decode().splitlines() if line and not line.startswith("#")]
+            with lock:
+                if response.status_code != 200:
+                    results["errors"] += 1
+                else:
+                    results["ok"] += 1
+                    results["not_cdn"] += sum(1 for segment in segments if not segment.startswith(CDN_PREFIX))
+            # Un lecteur HLS relit la playlist environ deux fois par segment
+            time.sleep(args.target_duration / 2)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=viewer) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.test_client() as client:
+        first = client.get(url)
+        conditional = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    # Première lecture, puis au plus une relecture par segment (et une de marge pour la fin du test)
+    budget = int(elapsed / args.target_duration) + 2
+    print(f"{results['ok']} playlists servies à {args.clients} lecteurs en {elapsed:.1f} s")
+    print(f"requêtes à l'origine : {counter['requests']} (budget {budget}), statistiques : {hls_edge.stats()}")
+    print(f"Cache-Control : {first.headers['Cache-Control']}, requête conditionnelle : {conditional.status_code}")
+    origin.shutdown()
+    os.unlink(db_file)
+    if (results["errors"] or results["not_cdn"] or counter["requests"] > budget
+            or conditional.status_code != 304):
+        print(f"échec : {results}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
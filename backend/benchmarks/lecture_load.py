@@ -0,0 +1,236 @@
+"""Charge d'un cours en direct complet, rejouée sur l'application de run.py.
+
+L'application est celle de `run.py` (eventlet, tâches de fond actives), sur une base SQLite
+temporaire et le client Redis en mémoire. Les clients de test Flask et Flask-SocketIO la
+pilotent dans le processus :
+
+1. le professeur se connecte et appelle `/start` ;
+2. `--viewers` spectateurs font `connect` puis `join_session`, par vagues de `--ramp` ;
+3. chaque spectateur envoie `--comments` messages (`post_comment`) ;
+4. `--hands` spectateurs lèvent la main (`/hand-raise`), le professeur l'accorde (`/hand-grant`) ;
+5. le professeur publie `--quizzes` quiz (`/create`) et tous les spectateurs répondent (`/respond`).
+
+Le rapport donne, par opération, p50/p99/max de la durée de traitement côté serveur,
+le débit de requêtes SQL, la mémoire Python par connexion (tracemalloc) et les événements
+reçus par les spectateurs. `--json` enregistre le rapport ; `--compare` le confronte à un
+rapport précédent et échoue si un p99 dépasse l'ancien de plus de `--tolerance`.
+
+    python benchmarks/lecture_load.py --viewers 2000 --json lecture-2000.json
+    python benchmarks/lecture_load.py --viewers 2000 --compare lecture-2000.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+class Recorder:
+    """Durées par opération, en millisecondes."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def time(self, operation, call, ok=lambda result: True):
+        start = time.perf_counter()
+        result = call()
+        self.samples[operation].append((time.perf_counter() - start) * 1000)
+        if not ok(result):
+            self.failures[operation] += 1
+        return result
+
+    def report(self):
+        report = {}
+        for operation, samples in self.samples.items():
+            samples = sorted(samples)
+            report[operation] = {
+                "count": len(samples),
+                "failures": self.failures[operation],
+                "p50_ms": round(samples[len(samples) // 2], 3),
+                "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+                "max_ms": round(samples[-1], 3)
+            }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=1000)
+    parser.add_argument("--ramp", type=int, default=250)
+    parser.add_argument("--comments", type=int, default=2)
+    parser.add_argument("--hands", type=int, default=20)
+    parser.add_argument("--quizzes", type=int, default=2)
+    parser.add_argument("--json")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        MEDIA_SERVER_VERIFY="0",
+        SOCKETIO_MULTI_NODE="0"
+    )
+
+    # Comme en production : monkey patching eventlet puis création de l'application par run.py
+    import run
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from app import db, socketio
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.broadcast import broadcast
+    from app.services.chat_limiter import chat_limiter
+    from app.services.write_behind import comment_buffer, quiz_response_buffer
+
+    app = run.app
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(User, [
+            {"email": f"viewer{i}@bench", "password": "-", "name": f"Viewer {i}", "role": UserRole.VIEWER}
+            for i in range(args.viewers)
+        ] + [{"email": "prof@bench", "password": "-", "name": "Prof", "role": UserRole.PROFESSOR}])
+        db.session.commit()
+        professor = User.query.filter_by(email="prof@bench").first()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        professor_token = create_access_token(identity=str(professor.id), additional_claims={"role": "professor", "name": "Prof"})
+        viewers = [
+            (user.id, create_access_token(identity=str(user.id), additional_claims={"role": "viewer", "name": user.name}))
+            for user in User.query.filter_by(role=UserRole.VIEWER)
+        ]
+        queries = [0]
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    recorder = Recorder()
+    http = app.test_client()
+    professor_headers = {"Authorization": f"Bearer {professor_token}"}
+    received = defaultdict(int)
+
+    def drain(clients):
+        # Laisser tourner les tâches de fond (diffusion groupée, écriture différée) puis vider les files
+        socketio.sleep(broadcast.tick * 2)
+        for client in clients:
+            for packet in client.get_received():
+                events = packet["args"][0]["events"] if packet["name"] == "batch" else [{"event": packet["name"]}]
+                for item in events:
+                    received[item["event"]] += 1
+
+    start = time.perf_counter()
+    professor_socket = recorder.time("connect", lambda: socketio.test_client(app, auth={"token": professor_token}),
+                                     lambda client: client.is_connected())
+    professor_socket.emit("join_session", {"session_id": session_id})
+    recorder.time("start", lambda: http.post(f"/sessions/{session_id}/start", headers=professor_headers),
+                  lambda response: response.status_code == 200)
+
+    # Connexions par vagues ; la mémoire est mesurée une fois la salle remplie et les files vidées
+    tracemalloc.start()
+    drain([professor_socket])
+    memory_before = tracemalloc.get_traced_memory()[0]
+    sockets = []
+    for offset in range(0, len(viewers), args.ramp):
+        wave = []
+        for _, token in viewers[offset:offset + args.ramp]:
+            client = recorder.time("connect", lambda: socketio.test_client(app, auth={"token": token}),
+                                   lambda client: client.is_connected())
+            recorder.time("join_session", lambda: client.emit("join_session", {"session_id": session_id}))
+            wave.append(client)
+        sockets += wave
+        drain(wave + [professor_socket])
+    drain(sockets + [professor_socket])
+    memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / max(len(sockets), 1)
+    tracemalloc.stop()
+
+    for round_number in range(args.comments):
+        for client in sockets:
+            recorder.time("post_comment", lambda: client.emit("post_comment", {
+                "session_id": session_id, "content": f"Message {round_number}"
+            }))
+        drain(sockets + [professor_socket])
+
+    for user_id, token in viewers[:args.hands]:
+        recorder.time("hand_raise", lambda: http.post(f"/sessions/{session_id}/hand-raise",
+                                                      headers={"Authorization": f"Bearer {token}"}),
+                      lambda response: response.status_code in (200, 201))
+    for _ in range(min(args.hands, 5)):
+        recorder.time("grant_hand", lambda: http.put(f"/sessions/{session_id}/hand-grant", json={}, headers=professor_headers),
+                      lambda response: response.status_code == 200)
+    drain(sockets + [professor_socket])
+
+    for number in range(args.quizzes):
+        response = recorder.time("create_quiz", lambda: http.post(f"/sessions/{session_id}/create", json={
+            "question": f"Question {number}", "options": ["A", "B", "C"], "correct_answer": "A"
+        }, headers=professor_headers), lambda response: response.status_code == 201)
+        quiz_id = response.json["quiz_id"]
+        for index, (_, token) in enumerate(viewers):
+            recorder.time("respond", lambda: http.post(f"/sessions/{session_id}/{quiz_id}/respond", json={
+                "answer": "ABC"[index % 3]
+            }, headers={"Authorization": f"Bearer {token}", "Idempotency-Key": str(uuid.uuid4())}),
+                lambda response: response.status_code in (200, 202))
+        drain(sockets + [professor_socket])
+
+    comment_buffer.flush()
+    quiz_response_buffer.flush()
+    elapsed = time.perf_counter() - start
+    for client in sockets + [professor_socket]:
+        client.disconnect()
+
+    report = {
+        "viewers": args.viewers,
+        "elapsed_s": round(elapsed, 2),
+        "db_queries": queries[0],
+        "db_queries_per_s": round(queries[0] / elapsed, 1),
+        "memory_per_connection_kb": round(memory_per_connection / 1024, 2),
+        "events_received": dict(received),
+        "broadcast": broadcast.stats(),
+        "chat": chat_limiter.stats(),
+        "operations": recorder.report()
+    }
+    print(f"{'opération':<14}{'nombre':>8}{'échecs':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for operation, stats in report["operations"].items():
+        print(f"{operation:<14}{stats['count']:>8}{stats['failures']:>8}{stats['p50_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.2f}")
+    print(f"\n{args.viewers} spectateurs en {elapsed:.1f} s, {queries[0]} requêtes SQL ({report['db_queries_per_s']}/s), "
+          f"{report['memory_per_connection_kb']} Ko par connexion")
+    print(f"événements reçus : {report['events_received']}")
+    print(f"messages refusés par le limiteur (attendu en mode lent) : {report['chat']}")
+    os.unlink(db_file)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = []
+        print(f"\ncomparaison avec {args.compare} :")
+        for operation, stats in report["operations"].items():
+            previous = baseline["operations"].get(operation)
+            if not previous:
+                continue
+            ratio = stats["p99_ms"] / previous["p99_ms"] if previous["p99_ms"] else 1
+            print(f"  {operation:<14} p99 {previous['p99_ms']:.2f} -> {stats['p99_ms']:.2f} ms ({ratio - 1:+.0%})")
+            if ratio > 1 + args.tolerance:
+                regressions.append(operation)
+        if regressions:
+            print("régressions : " + ", ".join(regressions))
+            sys.exit(1)
+    if any(stats["failures"] for stats in report["operations"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Tempête de connexions : latence Socket.IO pendant `--logins` appels simultanés à /auth/login.
+
+L'application de `run.py` (eventlet monkey-patché) est pilotée dans le processus. Une sonde
+émet `join_session` toutes les `--probe-interval` millisecondes ; sa latence est le retard
+de réveil du greenlet plus la durée du gestionnaire, c'est-à-dire le temps pendant lequel
+la boucle eventlet n'a pas pu servir les websockets. Trois phases sont mesurées :
+
+* repos : aucune connexion en cours ;
+* bcrypt dans le greenlet (`PASSWORD_HASH_OFFLOAD=0`, comportement historique) ;
+* bcrypt dans `eventlet.tpool`.
+
+Le script vérifie aussi qu'un changement de `BCRYPT_ROUNDS` rehache le mot de passe à la
+connexion, et échoue si le p99 de la sonde dépasse `--max-p99-ms` avec le déport. Avec plus de
+threads que de cœurs (`PASSWORD_HASH_THREADS`), les hachages volent le processeur à la boucle
+et la sonde le montre aussitôt.
+
+    python benchmarks/login_storm.py --logins 500 --rounds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max": samples[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--probe-interval", type=float, default=10)
+    parser.add_argument("--idle-seconds", type=float, default=1)
+    parser.add_argument("--max-p99-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        MEDIA_SERVER_VERIFY="0",
+        BCRYPT_ROUNDS=str(args.rounds)
+    )
+
+    import eventlet
+    import run
+    from flask_jwt_extended import create_access_token
+    from app import db, socketio
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.passwords import passwords
+
+    app = run.app
+    with app.app_context():
+        db.create_all()
+        # Même mot de passe pour tous : un seul hachage à la préparation
+        hashed = passwords.hash("password")
+        db.session.bulk_insert_mappings(User, [
+            {"email": f"viewer{i}@bench", "password": hashed, "name": f"Viewer {i}", "role": UserRole.VIEWER}
+            for i in range(args.logins)
+        ] + [{"email": "prof@bench", "password": hashed, "name": "Prof", "role": UserRole.PROFESSOR}])
+        db.session.commit()
+        professor = User.query.filter_by(email="prof@bench").first()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        token = create_access_token(identity=str(professor.id), additional_claims={"role": "professor", "name": "Prof"})
+
+    probe = socketio.test_client(app, auth={"token": token})
+    probe.emit("join_session", {"session_id": session_id})
+    probe.get_received()
+    interval = args.probe_interval / 1000
+
+    def measure(workload):
+        """Latences de la sonde (ms) pendant `workload`, et durée de celle-ci."""
+        samples = []
+        done = eventlet.event.Event()
+
+        def run_probe():
+            while not done.ready():
+                start = time.perf_counter()
+                eventlet.sleep(interval)
+                probe.emit("join_session", {"session_id": session_id})
+                probe.get_received()
+                samples.append((time.perf_counter() - start - interval) * 1000)
+
+        prober = eventlet.spawn(run_probe)
+        start = time.perf_counter()
+        workload()
+        elapsed = time.perf_counter() - start
+        done.send()
+        prober.wait()
+        return percentiles(samples), elapsed
+
+    def storm():
+        failures = []
+
+        def login(index):
+            response = app.test_client().post("/auth/login", json={"email": f"viewer{index}@bench", "password": "password"})
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+        pool = eventlet.GreenPool(args.logins)
+        for index in range(args.logins):
+            pool.spawn(login, index)
+        pool.waitall()
+        if failures:
+            raise SystemExit(f"{len(failures)} connexions refusées : {set(failures)}")
+
+    results = {}
+    results["repos"] = measure(lambda: eventlet.sleep(args.idle_seconds))
+    passwords.offload = False
+    results["bcrypt inline"] = measure(storm)
+    passwords.offload = True
+    results["eventlet.tpool"] = measure(storm)
+
+    print(f"{args.logins} connexions simultanées, bcrypt coût {args.rounds}, sonde toutes les {args.probe_interval} ms")
+    print(f"{'phase':<16}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'durée s':>9}{'connexions/s':>14}")
+    for phase, (latency, elapsed) in results.items():
+        rate = f"{args.logins / elapsed:.0f}" if phase != "repos" else "-"
+        print(f"{phase:<16}{latency['p50']:>9.2f}{latency['p99']:>9.2f}{latency['max']:>9.2f}{elapsed:>9.2f}{rate:>14}")
+
+    # Changement de coût : le hachage est refait à la connexion suivante
+    passwords.rounds = args.rounds + 1
+    app.test_client().post("/auth/login", json={"email": "viewer0@bench", "password": "password"})
+    with app.app_context():
+        rehashed = User.query.filter_by(email="viewer0@bench").first().password
+    print(f"rehachage après BCRYPT_ROUNDS={passwords.rounds} : {rehashed[:7]} ({passwords.stats()})")
+
+    os.unlink(db_file)
+    failures = []
+    if results["eventlet.tpool"][0]["p99"] > args.max_p99_ms:
+        failures.append(f"p99 de la sonde {results['eventlet.tpool'][0]['p99']:.1f} ms avec le déport")
+    if not rehashed.startswith(f"$2b${passwords.rounds:02d}$"):
+        failures.append("mot de passe non rehaché")
+    if failures:
+        print("échec : " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
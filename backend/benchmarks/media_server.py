@@ -0,0 +1,240 @@
+"""Client SRS face à un SRS simulé : pool keep-alive, nouvelles tentatives, délais et routes de diffusion.
+
+Le SRS simulé (http.server, HTTP/1.1) répond à `/api/v1/versions`, `/api/v1/streams/`,
+`DELETE /api/v1/clients/<cid>` et `POST /rtc/v1/publish/`, compte les connexions TCP
+ouvertes et peut couper une connexion sur `--drop-every` requêtes. Le script vérifie que :
+
+* `--threads` appelants concurrents n'ouvrent pas plus de `--pool-size` connexions à la fois ;
+* les connexions coupées sont rejouées sans erreur visible ;
+* un SRS trop lent échoue en un seul délai (`MEDIA_SERVER_TIMEOUT`) ;
+* `/start`, `/stream/stats` et `/stop` vérifient la publication et coupent le diffuseur.
+
+    python benchmarks/media_server.py --threads 50 --calls 40
+    python benchmarks/media_server.py --serve --port 1985    # SRS simulé seul, pour le développement
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+class StubSrs(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, drop_every=0):
+        super().__init__(address, StubSrsHandler)
+        self.drop_every = drop_every
+        self.latency = 0
+        self.connections = 0
+        self.requests = 0
+        self.streams = {}  # nom du flux -> identifiant client du diffuseur
+        self.lock = threading.Lock()
+
+
+class StubSrsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # En-têtes et corps sont écrits séparément : sans cela, Nagle retarde chaque réponse keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.path.startswith("/api/v1/versions"):
+            self._reply({"code": 0, "data": {"version": "5.0.stub"}})
+        elif self.path.startswith("/api/v1/streams"):
+            time.sleep(self.server.latency)
+            with self.server.lock:
+                streams = [{
+                    "id": f"vid-{name}",
+                    "name": name,
+                    "app": "live",
+                    "clients": 1,
+                    "kbps": {"recv_30s": 2500, "send_30s": 0},
+                    "publish": {"active": True, "cid": cid},
+                    "video": {"codec": "H264"},
+                    "audio": {"codec": "opus"}
+                } for name, cid in self.server.streams.items()]
+            self._reply({"code": 0, "streams": streams})
+        else:
+            self._reply({"code": 404}, status=404)
+
+    def do_DELETE(self):
+        cid = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with self.server.lock:
+            for name, publisher in list(self.server.streams.items()):
+                if publisher == cid:
+                    del self.server.streams[name]
+        self._reply({"code": 0})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        name = body.get("streamurl", "").rsplit("/", 1)[-1]
+        with self.server.lock:
+            cid = f"cid-{len(self.server.streams) + 1}-{name}"
+            self.server.streams[name] = cid
+        self._reply({"code": 0, "sdp": "v=0\r\n", "sessionid": cid})
+
+    def _reply(self, data, status=200):
+        with self.server.lock:
+            self.server.requests += 1
+            drop = self.server.drop_every and self.server.requests % self.server.drop_every == 0
+        if drop:
+            # Connexion keep-alive fermée par le serveur sans réponse
+            self.close_connection = True
+            return
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(port=0, drop_every=0):
+    server = StubSrs(("127.0.0.1", port), drop_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--drop-every", type=int, default=25)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--port", type=int, default=1985)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = StubSrs(("127.0.0.1", args.port))
+        print(f"SRS simulé sur http://127.0.0.1:{args.port}")
+        server.serve_forever()
+        return
+
+    stub = start_stub(drop_every=args.drop_every)
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        MEDIA_SERVER_URL=f"http://127.0.0.1:{stub.server_port}",
+        MEDIA_SERVER_POOL_SIZE=str(args.pool_size),
+        MEDIA_SERVER_TIMEOUT=str(args.timeout)
+    )
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.media_server import MediaServerError, media_server
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        professor = User(email="prof@bench", password="-", name="Prof", role=UserRole.PROFESSOR)
+        db.session.add(professor)
+        db.session.commit()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        token = create_access_token(identity=str(professor.id), additional_claims={"role": "professor", "name": "Prof"})
+    failures = []
+
+    # 1. Appels concurrents : le pool borne les connexions, les coupures sont rejouées
+    errors = []
+
+    def caller():
+        for _ in range(args.calls):
+            try:
+                media_server.stream(session_id)
+            except MediaServerError as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = args.threads * args.calls
+    stats = media_server.stats()
+    print(f"{total} appels en {elapsed:.2f} s ({total / elapsed:.0f}/s), {len(errors)} erreurs")
+    print(f"connexions ouvertes côté SRS : {stub.connections}, client : {stats}")
+    if errors:
+        failures.append(f"{len(errors)} appels en erreur malgré les nouvelles tentatives")
+    if args.drop_every and not stats["retried"]:
+        failures.append("aucune nouvelle tentative après coupure")
+    # Chaque coupure ferme une connexion : elle est remplacée, les autres sont réutilisées
+    if stub.connections > args.pool_size + stats["retried"]:
+        failures.append("les connexions ne sont pas réutilisées")
+    if stats["idle"] > args.pool_size:
+        failures.append("le pool garde plus de connexions que --pool-size")
+
+    # 2. SRS trop lent : un seul délai, pas de nouvelle tentative
+    stub.drop_every = 0
+    stub.latency = args.timeout * 3
+    start = time.perf_counter()
+    try:
+        media_server.stream(session_id)
+        failures.append("un SRS trop lent n'a pas levé d'erreur")
+    except MediaServerError:
+        pass
+    waited = time.perf_counter() - start
+    print(f"SRS lent : échec après {waited:.2f} s (délai {args.timeout} s)")
+    if waited > args.timeout * 1.5:
+        failures.append("le délai a été attendu plusieurs fois")
+    stub.latency = 0
+
+    # 3. Routes : démarrage, publication (simulée comme le navigateur), statistiques, arrêt
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    started = client.post(f"/sessions/{session_id}/start", headers=headers)
+    media_server.request("POST", "/rtc/v1/publish/", {"sdp": "v=0", "streamurl": f"/live/session_{session_id}"})
+    live = client.get(f"/sessions/{session_id}/stream/stats", headers=headers)
+    stopped = client.post(f"/sessions/{session_id}/stop", headers=headers)
+    print(f"start {started.status_code} {started.json.get('webrtc_url')}, stats {live.status_code} {live.json}, "
+          f"stop {stopped.status_code}, flux restants côté SRS : {stub.streams}")
+    if started.status_code != 200 or started.json["webrtc_url"] != media_server.publish_url:
+        failures.append("démarrage refusé")
+    if live.status_code != 200 or not live.json["publishing"]:
+        failures.append("publication non vue par /stream/stats")
+    if stopped.status_code != 200 or stub.streams:
+        failures.append("le diffuseur n'a pas été coupé à l'arrêt")
+
+    # 4. SRS arrêté : le démarrage est refusé, l'arrêt aboutit quand même
+    stub.shutdown()
+    stub.server_close()
+    media_server.close()
+    refused = client.post(f"/sessions/{session_id}/start", headers=headers)
+    stopped = client.post(f"/sessions/{session_id}/stop", headers=headers)
+    print(f"SRS arrêté : start {refused.status_code}, stop {stopped.status_code}")
+    if refused.status_code != 503 or stopped.status_code != 200:
+        failures.append("mauvais comportement avec SRS arrêté")
+
+    os.unlink(db_file)
+    if failures:
+        print("échec : " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Couverture du client Redis en mémoire : chaque commande appelée par l'application existe dans `MemoryRedis`.
+
+Le script parcourt les modules de `app/` et relève les appels de méthode sur un client
+ou un pipeline Redis (`self.redis.hsetnx(...)`, `pipe.zadd(...)`, `redis_pool.client.get(...)`…).
+Une commande absente de `MemoryRedis` ne se voit qu'à l'exécution, en 500, quand
+l'application tourne sans serveur Redis (`REDIS_URL=memory://`) : le script échoue
+dans ce cas en listant les appels concernés.
+
+    python benchmarks/memory_redis_coverage.py
+"""
+import argparse
+import ast
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Noms sous lesquels les services tiennent un client ou un pipeline Redis
+RECEIVERS = {"client", "pipe", "redis", "self.redis", "self._redis", "self.client", "redis_pool.client"}
+
+
+def redis_calls(path):
+    """(méthode, ligne) de chaque appel sur un client ou un pipeline Redis du fichier."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        method = node.func.attr
+        # `redis.RedisError`, `redis.Redis(...)` : le module, pas un client
+        if ast.unparse(node.func.value) in RECEIVERS and method.islower():
+            yield method, node.lineno
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=os.path.join(BACKEND_DIR, "app"))
+    args = parser.parse_args()
+
+    from app.services.redis_pool import MemoryRedis, _MemoryPipeline
+    supported = {name for name in dir(MemoryRedis) if not name.startswith("_")}
+    supported |= {name for name in dir(_MemoryPipeline) if not name.startswith("_")}
+
+    used = {}
+    for root, _, files in os.walk(args.app_dir):
+        for name in sorted(files):
+            if not name.endswith(".py") or name == "redis_pool.py":
+                continue
+            path = os.path.join(root, name)
+            for method, line in redis_calls(path):
+                used.setdefault(method, []).append(f"{os.path.relpath(path, BACKEND_DIR)}:{line}")
+
+    missing = {method: places for method, places in used.items() if method not in supported}
+    print(f"{len(used)} commandes Redis appelées par l'application, {len(used) - len(missing)} couvertes par MemoryRedis")
+    for method in sorted(used):
+        print(f"  {method:<18}{'absente' if method in missing else 'ok':<10}{used[method][0]}")
+
+    if missing:
+        print("échec : " + "; ".join(f"{method} ({', '.join(places)})" for method, places in sorted(missing.items())))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
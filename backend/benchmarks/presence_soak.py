@@ -0,0 +1,107 @@
+"""Endurance de la présence : 50 000 connexions/déconnexions Socket.IO sur une session.
+
+Les clients se connectent par vagues (`--wave` connexions simultanées), rejoignent la
+session puis se déconnectent. Après chaque vague, les structures de présence et
+d'authentification doivent être revenues à leur taille initiale et la mémoire Python
+allouée (tracemalloc) ne doit pas croître au-delà de `--max-growth-kb`.
+
+    python benchmarks/presence_soak.py --connections 50000 --wave 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--wave", type=int, default=1000)
+    parser.add_argument("--max-growth-kb", type=int, default=4096)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        PRESENCE_UPDATE_INTERVAL_MS="3600000"
+    )
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db, socketio
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.presence import presence
+    from app.services.socket_auth import socket_auth
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(User, [
+            {"email": f"viewer{i}@bench", "password": "-", "name": f"Viewer {i}", "role": UserRole.VIEWER}
+            for i in range(args.wave)
+        ] + [{"email": "prof@bench", "password": "-", "name": "Prof", "role": UserRole.PROFESSOR}])
+        db.session.commit()
+        professor = User.query.filter_by(email="prof@bench").first()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        tokens = [
+            create_access_token(identity=str(user.id), additional_claims={"role": "viewer", "name": user.name})
+            for user in User.query.filter_by(role=UserRole.VIEWER)
+        ]
+
+    def sizes():
+        rooms = socketio.server.manager.rooms.get("/", {})
+        return {
+            "presence": presence.stats()["connections"],
+            "auth": socket_auth.stats()["connections"],
+            "environ": len(socketio.server.environ),
+            "room": len(rooms.get(str(session_id), {}))
+        }
+
+    def wave():
+        clients = [socketio.test_client(app, auth={"token": token}) for token in tokens[:args.wave]]
+        for client in clients:
+            client.emit("join_session", {"session_id": session_id})
+        peak = (presence.count(session_id), sizes())
+        for client in clients:
+            client.disconnect()
+            # Le client de test ne ferme que l'espace de noms : simuler la fermeture du transport
+            # et l'oublier dans son propre registre pour ne mesurer que le serveur
+            socketio.server._handle_eio_disconnect(client.eio_sid, "client disconnect")
+            client.clients.pop(client.eio_sid, None)
+        return peak
+
+    # Une première vague remplit les caches (identités, pools) avant la mesure de référence
+    wave()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    done = args.wave
+    start = time.perf_counter()
+    growth = 0
+    while done < args.connections:
+        viewers, peak = wave()
+        done += args.wave
+        growth = (tracemalloc.get_traced_memory()[0] - baseline) / 1024
+        print(f"{done:>7} connexions  pic {viewers} spectateurs {peak}  après {sizes()}  +{growth:.0f} Ko")
+    elapsed = time.perf_counter() - start
+
+    final = sizes()
+    print(f"\n{done} connexions en {elapsed:.1f} s ({(done - args.wave) / elapsed:.0f} cycles/s)")
+    print(f"structures finales : {final}, croissance mémoire : {growth:.0f} Ko")
+    os.unlink(db_file)
+    if any(final.values()) or growth > args.max_growth_kb:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Plans d'exécution et temps de réponse des filtres critiques quand les tables grossissent.
+
+Pour chaque taille (par défaut 10k, 100k puis 1M lignes par table), le script remplit
+une base, affiche le plan de chaque requête utilisée par les routes et mesure son
+temps moyen. Avec les index des modèles, les plans utilisent un index et les temps
+restent stables ; sans eux, ils croissent linéairement (parcours complet).
+
+    python benchmarks/query_plans.py --sizes 10000,100000,1000000
+    DATABASE_URL=mysql+pymysql://... python benchmarks/query_plans.py --sizes 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CHUNK = 50000
+
+
+def fill(db, model, count, make_row):
+    for start in range(0, count, CHUNK):
+        db.session.execute(db.insert(model), [make_row(i) for i in range(start, min(count, start + CHUNK))])
+        db.session.commit()
+
+
+def hot_queries(db, models, size):
+    Comment, HandRequest, HandStatus, QuizResponse, Session, SessionStatus = models
+    session_id = random.randint(1, max(1, size // 1000))
+    return {
+        "hand: demande en attente d'un utilisateur": HandRequest.query.filter_by(
+            session_id=session_id, user_id=42, status=HandStatus.PENDING).limit(1),
+        "hand: main accordée de la session": HandRequest.query.filter_by(
+            session_id=session_id, status=HandStatus.GRANTED).limit(1),
+        "comments: page après un curseur": db.session.query(Comment.id, Comment.content).filter(
+            Comment.session_id == session_id, Comment.id > size // 2).order_by(Comment.id).limit(100),
+        "sessions: sessions actives": Session.query.filter_by(status=SessionStatus.ACTIVE),
+        "sessions: sessions actives d'un professeur": Session.query.filter_by(
+            professor_id=7, status=SessionStatus.ACTIVE),
+        "quiz: réponse d'un utilisateur": QuizResponse.query.filter_by(quiz_id=session_id, user_id=42).limit(1),
+    }
+
+
+def explain(db, query):
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.session.execute(db.text(prefix + sql)).fetchall()
+    return " | ".join(str(row[-1]) if dialect.name == "sqlite" else str(tuple(row)) for row in rows)
+
+
+def timed(query, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        query.all()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    db_file = None
+    if "DATABASE_URL" not in os.environ:
+        db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+
+    from app import create_app, db
+    from app.models.comment import Comment
+    from app.models.hand_request import HandRequest, HandStatus
+    from app.models.quiz_response import QuizResponse
+    from app.models.session import Session, SessionStatus
+    models = (Comment, HandRequest, HandStatus, QuizResponse, Session, SessionStatus)
+
+    app = create_app()
+    now = datetime.utcnow()
+    with app.app_context():
+        for size in (int(s) for s in args.sizes.split(",")):
+            db.drop_all()
+            db.create_all()
+            sessions = max(1, size // 1000)
+            hand_statuses = list(HandStatus)
+            # Comme en production : l'immense majorité des sessions sont terminées
+            fill(db, Session, size, lambda i: {
+                "title": f"s{i}", "professor_id": i % 500, "start_time": now,
+                "status": SessionStatus.ACTIVE if i % 1000 == 0 else SessionStatus.ENDED})
+            fill(db, Comment, size, lambda i: {
+                "session_id": 1 + i % sessions, "user_id": i % 5000, "content": "x" * 40,
+                "created_at": now, "is_hidden": False})
+            fill(db, HandRequest, size, lambda i: {
+                "session_id": 1 + i % sessions, "user_id": i % 5000,
+                "status": hand_statuses[i % 3], "requested_at": now})
+            fill(db, QuizResponse, size, lambda i: {
+                "quiz_id": 1 + i // 5000, "user_id": i % 5000, "answer": "A", "submitted_at": now})
+
+            print(f"\n=== {size} lignes par table ===")
+            for label, query in hot_queries(db, models, size).items():
+                print(f"{label:<45} {timed(query, args.runs):>8.3f} ms   {explain(db, query)}")
+
+    if db_file:
+        os.unlink(db_file)
+
+
+if __name__ == "__main__":
+    main()
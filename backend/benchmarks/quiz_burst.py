@@ -0,0 +1,117 @@
+"""Rafale de réponses à un quiz : 5 000 spectateurs répondent en même temps.
+
+Le script crée une base SQLite temporaire, un professeur, une session, un quiz et
+N spectateurs, puis envoie leurs réponses à `/sessions/<id>/<quiz_id>/respond`.
+Une partie des clients rejoue la même requête (même clé d'idempotence) et une autre
+tente une seconde réponse : on vérifie qu'il n'y a au final qu'une ligne par spectateur.
+
+    python benchmarks/quiz_burst.py --answers 5000 --retries 0.1 --doubles 0.05
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=5000)
+    parser.add_argument("--retries", type=float, default=0.1, help="part des clients qui rejouent leur requête")
+    parser.add_argument("--doubles", type=float, default=0.05, help="part des clients qui répondent deux fois")
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret")
+    )
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models.quiz_response import QuizResponse
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.quiz_tally import quiz_tally
+    from app.services.write_behind import quiz_response_buffer
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(User, [
+            {"email": f"viewer{i}@bench", "password": "-", "name": f"Viewer {i}", "role": UserRole.VIEWER}
+            for i in range(args.answers)
+        ] + [{"email": "prof@bench", "password": "-", "name": "Prof", "role": UserRole.PROFESSOR}])
+        db.session.commit()
+        professor = User.query.filter_by(email="prof@bench").first()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        professor_token = create_access_token(identity=str(professor.id), additional_claims={"role": "professor"})
+        viewer_tokens = [
+            create_access_token(identity=str(user.id), additional_claims={"role": "viewer", "name": user.name})
+            for user in User.query.filter_by(role=UserRole.VIEWER)
+        ]
+
+    client = app.test_client()
+    options = ["A", "B", "C", "D"]
+    quiz_id = client.post(
+        f"/sessions/{session_id}/create",
+        json={"question": "Bench ?", "options": options, "correct_answer": "A"},
+        headers={"Authorization": f"Bearer {professor_token}"}
+    ).json["quiz_id"]
+
+    requests = []
+    for i, token in enumerate(viewer_tokens):
+        headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": f"bench-{i}"}
+        requests.append((headers, random.choice(options)))
+        if random.random() < args.retries:
+            requests.append((headers, requests[-1][1]))
+        if random.random() < args.doubles:
+            requests.append(({"Authorization": f"Bearer {token}"}, random.choice(options)))
+    random.shuffle(requests)
+
+    url = f"/sessions/{session_id}/{quiz_id}/respond"
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    for headers, answer in requests:
+        t0 = time.perf_counter()
+        status = client.post(url, json={"answer": answer}, headers=headers).status_code
+        latencies.append((time.perf_counter() - t0) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+    accept_seconds = time.perf_counter() - start
+
+    t0 = time.perf_counter()
+    quiz_response_buffer.flush()
+    flush_seconds = time.perf_counter() - t0
+
+    with app.app_context():
+        rows = QuizResponse.query.filter_by(quiz_id=quiz_id).count()
+    snapshot = quiz_tally.snapshot(quiz_id)
+
+    print(f"requêtes envoyées     : {len(requests)} ({statuses})")
+    print(f"débit d'acceptation   : {len(requests) / accept_seconds:.0f} req/s")
+    print(f"latence p50 / p99     : {statistics.median(latencies):.2f} ms / {percentile(latencies, 99):.2f} ms")
+    print(f"vidage final          : {flush_seconds * 1000:.0f} ms")
+    print(f"lignes quiz_responses : {rows} (attendu {args.answers})")
+    print(f"total compté          : {snapshot['total']}")
+    os.unlink(db_file)
+    if rows != args.answers or snapshot["total"] != args.answers:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
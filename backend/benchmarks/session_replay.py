@@ -0,0 +1,149 @@
+"""Relecture d'une session terminée : journal indexé contre requêtes ORDER BY sur les tables.
+
+Une session de `--minutes` minutes est générée deux fois : `--events` commentaires (plus une
+main levée et un quiz toutes les 5 minutes) dans les tables `comments`, `hand_requests`,
+`quizzes`, et les mêmes événements dans le journal de session. Pour plusieurs positions
+(début, minute 42, fin), le script mesure le temps d'obtention d'une page de `--page`
+événements :
+
+* tables : une requête triée par table à partir de l'instant, puis fusion ;
+* journal : recherche dans l'index puis lecture séquentielle (`session_journal.replay`).
+
+Il vérifie que les deux chemins renvoient les mêmes événements et donne la taille du journal.
+
+    python benchmarks/session_replay.py --events 200000 --minutes 120
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--minutes", type=int, default=120)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    journal_dir = tempfile.mkdtemp(prefix="journal-")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        JOURNAL_DIR=journal_dir
+    )
+
+    from app import create_app, db
+    from app.models.comment import Comment
+    from app.models.hand_request import HandRequest, HandStatus
+    from app.models.quiz import Quiz
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.session_journal import session_journal
+
+    app = create_app()
+    duration_ms = args.minutes * 60 * 1000
+    with app.app_context():
+        db.create_all()
+        professor = User(email="prof@bench", password="-", name="Prof", role=UserRole.PROFESSOR)
+        viewer = User(email="viewer@bench", password="-", name="Viewer", role=UserRole.VIEWER)
+        db.session.add_all([professor, viewer])
+        db.session.commit()
+        start = datetime(2024, 1, 1, 8, 0)
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ENDED, start_time=start)
+        db.session.add(session)
+        db.session.commit()
+        session_id, viewer_id = session.id, viewer.id
+
+        # Événements triés par instant : (offset_ms, événement, données, table, ligne)
+        events = []
+        for i in range(args.events):
+            offset = i * duration_ms // args.events
+            events.append((offset, "new_comment", {"user_name": "Viewer", "content": f"Message {i}"}, Comment, {
+                "session_id": session_id, "user_id": viewer_id, "content": f"Message {i}",
+                "created_at": start + timedelta(milliseconds=offset)
+            }))
+        for offset in range(0, duration_ms, 5 * 60 * 1000):
+            events.append((offset + 1, "new_hand_request", {"user_id": viewer_id}, HandRequest, {
+                "session_id": session_id, "user_id": viewer_id, "status": HandStatus.GRANTED,
+                "requested_at": start + timedelta(milliseconds=offset + 1)
+            }))
+            events.append((offset + 2, "new_quiz", {"question": "Q", "options": ["A", "B"]}, Quiz, {
+                "session_id": session_id, "question": "Q", "options": ["A", "B"], "correct_answer": "A",
+                "created_at": start + timedelta(milliseconds=offset + 2)
+            }))
+        events.sort(key=lambda item: item[0])
+        for model in (Comment, HandRequest, Quiz):
+            db.session.bulk_insert_mappings(model, [row for *_, table, row in events if table is model])
+        db.session.commit()
+
+        load_start = time.perf_counter()
+        for i, (offset, event, data, _, _) in enumerate(events):
+            session_journal.append(session_id, event, data, offset_ms=offset)
+            if i % 5000 == 4999:
+                # Vidage explicite : la file d'attente du journal est bornée
+                session_journal.flush()
+        session_journal.close(session_id)
+        load_elapsed = time.perf_counter() - load_start
+        journal_bytes = sum(os.path.getsize(os.path.join(root, name))
+                            for root, _, names in os.walk(journal_dir) for name in names)
+
+        def from_tables(offset):
+            since = start + timedelta(milliseconds=offset)
+            comments = db.session.query(Comment.created_at, Comment.content).filter(
+                Comment.session_id == session_id, Comment.created_at >= since
+            ).order_by(Comment.created_at).limit(args.page).all()
+            hands = db.session.query(HandRequest.requested_at).filter(
+                HandRequest.session_id == session_id, HandRequest.requested_at >= since
+            ).order_by(HandRequest.requested_at).limit(args.page).all()
+            quizzes = db.session.query(Quiz.created_at, Quiz.question).filter(
+                Quiz.session_id == session_id, Quiz.created_at >= since
+            ).order_by(Quiz.created_at).limit(args.page).all()
+            merged = sorted(
+                [(row.created_at, "new_comment") for row in comments]
+                + [(row.requested_at, "new_hand_request") for row in hands]
+                + [(row.created_at, "new_quiz") for row in quizzes]
+            )
+            return [event for _, event in merged[:args.page]]
+
+        def from_journal(offset):
+            return [event for _, _, event, _ in islice(session_journal.replay(session_id, offset), args.page)]
+
+        print(f"{len(events)} événements sur {args.minutes} min, journal chargé en {load_elapsed:.2f} s "
+              f"({journal_bytes / len(events):.0f} octets/événement)")
+        print(f"{'position':<12}{'tables ms':>11}{'journal ms':>12}")
+        failures = []
+        for label, offset in (("début", 0), ("minute 42", 42 * 60 * 1000), ("fin", duration_ms - 60 * 1000)):
+            timings = {}
+            for name, read in (("tables", from_tables), ("journal", from_journal)):
+                durations = []
+                for _ in range(args.repeat):
+                    begin = time.perf_counter()
+                    page = read(offset)
+                    durations.append((time.perf_counter() - begin) * 1000)
+                timings[name] = (statistics.median(durations), page)
+            print(f"{label:<12}{timings['tables'][0]:>11.2f}{timings['journal'][0]:>12.2f}")
+            if timings["tables"][1] != timings["journal"][1]:
+                failures.append(f"{label} : pages différentes")
+
+    os.unlink(db_file)
+    shutil.rmtree(journal_dir)
+    if failures:
+        print("échec : " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
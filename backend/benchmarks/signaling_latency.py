@@ -0,0 +1,136 @@
+"""Signalisation WebRTC : routes REST contre événements Socket.IO (latence et requêtes SQL).
+
+Le même échange (une offre, une réponse, `--candidates` candidats ICE) est joué `--rounds`
+fois par trois chemins :
+
+* REST : POST /offer, /answer puis un POST /ice-candidate par candidat ;
+* socket : `signal_offer`, `signal_answer` puis un `signal_ice` par candidat ;
+* socket groupé : `signal_ice` avec tous les candidats dans `candidates`.
+
+Les clients de test de Flask et Flask-SocketIO tournent dans le processus : la latence
+mesurée est celle du serveur (authentification, contrôles, relais), sans le réseau. Le
+script vérifie que le spectateur reçoit tous les candidats et qu'aucun message ne touche
+la base une fois le cache des sessions chaud.
+
+    python benchmarks/signaling_latency.py --rounds 50 --candidates 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret-bench-secret-bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        REDIS_URL="memory://",
+        SIGNALING_MAX_CANDIDATES=str(max(args.candidates, 50))
+    )
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from app import create_app, db, socketio
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    from app.services.broadcast import broadcast
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        professor = User(email="prof@bench", password="-", name="Prof", role=UserRole.PROFESSOR)
+        viewer = User(email="viewer@bench", password="-", name="Viewer", role=UserRole.VIEWER)
+        db.session.add_all([professor, viewer])
+        db.session.commit()
+        session = Session(title="Bench", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        session_id, professor_id, viewer_id = session.id, professor.id, viewer.id
+        professor_token = create_access_token(identity=str(professor_id), additional_claims={"role": "professor", "name": "Prof"})
+        viewer_token = create_access_token(identity=str(viewer_id), additional_claims={"role": "viewer", "name": "Viewer"})
+        queries = [0]
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    http = app.test_client()
+    headers = {"Authorization": f"Bearer {professor_token}"}
+    professor_socket = socketio.test_client(app, auth={"token": professor_token})
+    viewer_socket = socketio.test_client(app, auth={"token": viewer_token})
+    # Les messages ciblés ne partent que vers un présent de la session
+    viewer_socket.emit("join_session", {"session_id": session_id})
+    candidates = [f"candidate:{i} 1 UDP 2122260223 192.0.2.1 {50000 + i} typ host" for i in range(args.candidates)]
+
+    def rest_round():
+        http.post(f"/sessions/{session_id}/offer", json={"sdp": "v=0", "type": "offer", "to_user_id": viewer_id}, headers=headers)
+        http.post(f"/sessions/{session_id}/answer", json={"sdp": "v=0", "type": "answer", "to_user_id": viewer_id}, headers=headers)
+        for candidate in candidates:
+            http.post(f"/sessions/{session_id}/ice-candidate", json={"candidate": candidate, "to_user_id": viewer_id}, headers=headers)
+        return 2 + len(candidates)
+
+    def socket_round():
+        professor_socket.emit("signal_offer", {"session_id": session_id, "sdp": "v=0", "to_user_id": viewer_id}, callback=True)
+        professor_socket.emit("signal_answer", {"session_id": session_id, "sdp": "v=0", "to_user_id": viewer_id}, callback=True)
+        for candidate in candidates:
+            professor_socket.emit("signal_ice", {"session_id": session_id, "candidate": candidate, "to_user_id": viewer_id}, callback=True)
+        return 2 + len(candidates)
+
+    def batched_round():
+        professor_socket.emit("signal_offer", {"session_id": session_id, "sdp": "v=0", "to_user_id": viewer_id}, callback=True)
+        professor_socket.emit("signal_answer", {"session_id": session_id, "sdp": "v=0", "to_user_id": viewer_id}, callback=True)
+        professor_socket.emit("signal_ice", {"session_id": session_id, "candidates": candidates, "to_user_id": viewer_id}, callback=True)
+        return 3
+
+    def received():
+        """Trames reçues par le spectateur et nombre de candidats qu'elles contiennent."""
+        broadcast.flush()
+        packets = viewer_socket.get_received()
+        count = 0
+        for packet in packets:
+            events = packet["args"][0]["events"] if packet["name"] == "batch" else [{"event": packet["name"], "data": packet["args"][0]}]
+            count += sum(len(item["data"]["candidates"]) if item["event"] == "ice_candidates" else 1
+                         for item in events if item["event"] in ("ice_candidate", "ice_candidates"))
+        return len(packets), count
+
+    failures = []
+    print(f"{'chemin':<14}{'messages':>9}{'ms/échange':>12}{'p95 ms':>9}{'SQL/échange':>13}{'trames reçues':>15}")
+    for name, play in (("REST", rest_round), ("socket", socket_round), ("socket groupé", batched_round)):
+        play()
+        received()
+        durations = []
+        frames = 0
+        queries[0] = 0
+        delivered = 0
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            messages = play()
+            durations.append((time.perf_counter() - start) * 1000)
+            round_frames, round_candidates = received()
+            frames += round_frames
+            delivered += round_candidates
+        p95 = sorted(durations)[int(len(durations) * 0.95) - 1]
+        print(f"{name:<14}{messages:>9}{statistics.mean(durations):>12.2f}{p95:>9.2f}"
+              f"{queries[0] / args.rounds:>13.1f}{frames / args.rounds:>15.1f}")
+        if delivered != args.rounds * args.candidates:
+            failures.append(f"{name} : {delivered} candidats reçus sur {args.rounds * args.candidates}")
+        if queries[0]:
+            failures.append(f"{name} : {queries[0]} requêtes SQL")
+
+    os.unlink(db_file)
+    if failures:
+        print("échec : " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
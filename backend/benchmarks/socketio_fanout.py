@@ -0,0 +1,157 @@
+"""Débit de diffusion Socket.IO avec 1, 2 puis 4 workers reliés par Redis.
+
+Chaque worker est un processus eventlet indépendant (SOCKETIO_MULTI_NODE=1).
+Les clients sont répartis équitablement entre les workers et rejoignent la
+même salle ; un émetteur externe publie ensuite des messages dans Redis et on
+mesure le temps nécessaire pour que chaque client les ait tous reçus.
+
+Prérequis : un serveur Redis joignable via REDIS_URL et le client Socket.IO
+Python (`pip install "python-socketio[client]"`).
+
+    python benchmarks/socketio_fanout.py --clients 200 --messages 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKER_BOOTSTRAP = """
+import eventlet
+eventlet.monkey_patch()
+import os
+from app import create_app, socketio
+app = create_app()
+socketio.run(app, host="127.0.0.1", port=int(os.environ["PORT"]), log_output=False)
+"""
+
+
+def start_workers(count, base_port, env):
+    workers = []
+    for i in range(count):
+        worker_env = dict(env, PORT=str(base_port + i))
+        workers.append(subprocess.Popen(
+            [sys.executable, "-c", WORKER_BOOTSTRAP],
+            cwd=BACKEND_DIR,
+            env=worker_env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        ))
+    time.sleep(2)
+    return workers
+
+
+def prepare(env):
+    """Créer les tables, un professeur, un spectateur et une session active ; retourne (jeton, session)."""
+    os.environ.update(env)
+    from app import create_app, db
+    from flask_jwt_extended import create_access_token
+    from app.models.session import Session, SessionStatus
+    from app.models.user import User, UserRole
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        professor = User(email="prof@fanout.bench", password="-", name="Prof", role=UserRole.PROFESSOR)
+        viewer = User(email="viewer@fanout.bench", password="-", name="Viewer", role=UserRole.VIEWER)
+        db.session.add_all([professor, viewer])
+        db.session.commit()
+        session = Session(title="Fanout", professor_id=professor.id, status=SessionStatus.ACTIVE)
+        db.session.add(session)
+        db.session.commit()
+        token = create_access_token(identity=str(viewer.id), additional_claims={"role": "viewer", "name": viewer.name})
+        return token, session.id
+
+
+def run_round(worker_count, args, env, token, session_id):
+    import socketio as sio_client
+    from flask_socketio import SocketIO
+
+    workers = start_workers(worker_count, args.base_port, env)
+    clients = []
+    received = [0] * args.clients
+    done = threading.Event()
+    lock = threading.Lock()
+    finished = [0]
+
+    try:
+        for i in range(args.clients):
+            client = sio_client.Client(reconnection=False)
+
+            def on_tick(data, index=i):
+                received[index] += 1
+                if received[index] == args.messages:
+                    with lock:
+                        finished[0] += 1
+                        if finished[0] == args.clients:
+                            done.set()
+
+            client.on("bench_tick", on_tick)
+            port = args.base_port + (i % worker_count)
+            client.connect(f"http://127.0.0.1:{port}", auth={"token": token}, transports=["websocket"])
+            client.emit("join_session", {"session_id": session_id})
+            clients.append(client)
+        time.sleep(1)
+
+        emitter = SocketIO(message_queue=env["SOCKETIO_MESSAGE_QUEUE"], channel=env["SOCKETIO_CHANNEL"])
+        start = time.perf_counter()
+        for seq in range(args.messages):
+            emitter.emit("bench_tick", {"seq": seq}, room=str(session_id))
+        completed = done.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+
+        deliveries = sum(received)
+        return {
+            "workers": worker_count,
+            "completed": completed,
+            "deliveries": deliveries,
+            "seconds": elapsed,
+            "deliveries_per_s": deliveries / elapsed if elapsed else 0.0
+        }
+    finally:
+        for client in clients:
+            client.disconnect()
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--base-port", type=int, default=5101)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Base partagée par les workers : une base sqlite en mémoire serait propre à chaque processus
+    db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+    env = dict(
+        os.environ,
+        REDIS_URL=redis_url,
+        DATABASE_URL=f"sqlite:///{db_file}",
+        JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", "bench-secret"),
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench-secret"),
+        SOCKETIO_MULTI_NODE="1",
+        SOCKETIO_MESSAGE_QUEUE=redis_url,
+        SOCKETIO_CHANNEL="flask-socketio-bench"
+    )
+    token, session_id = prepare(env)
+
+    print(f"{'workers':>8} {'livraisons':>12} {'durée (s)':>10} {'livraisons/s':>14}")
+    for worker_count in (int(w) for w in args.workers.split(",")):
+        result = run_round(worker_count, args, env, token, session_id)
+        flag = "" if result["completed"] else "  (timeout)"
+        print(f"{result['workers']:>8} {result['deliveries']:>12} {result['seconds']:>10.2f} "
+              f"{result['deliveries_per_s']:>14.0f}{flag}")
+    os.unlink(db_file)
+
+
+if __name__ == "__main__":
+    main()
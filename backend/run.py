@@ -1,6 +1,12 @@
+import eventlet
+
+# Indispensable avec la file de messages Redis : le thread d'écoute pub/sub doit céder la main au hub eventlet
+eventlet.monkey_patch()
+
+import os
 from app import create_app, socketio
 
 app = create_app()
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
+    socketio.run(app, debug=True, host="0.0.0.0", port=int(os.getenv("PORT", 5001)))